@@ -0,0 +1 @@
+"""Helpers shared by the notebooks and scripts in this repository."""
@@ -0,0 +1,177 @@
+"""
+Amberdata market and on-chain history, fetched concurrently and cached.
+
+The backtest scripts and the market data template each carried a copy of the
+same helpers, which fetched OHLCV a year at a time, appended every year's CSV
+to one growing string and parsed it at the end. Here the yearly windows are
+fetched on a thread pool and each is parsed into typed columns on its own, and
+every response goes through a `ResponseCache`, so historical windows are only
+downloaded once across runs.
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+from dateutil.relativedelta import relativedelta
+
+from amberdata_common.response_cache import ResponseCache, window_ttl
+
+API_URL = "https://web3api.io/api/v2"
+MAX_WORKERS = 4
+OHLCV_FIELDS = ["timestamp", "open", "high", "low", "close", "volume"]
+WINDOW_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# the stock-to-flow model price, as (metrics path, column) per endpoint
+STF_MODELS = {
+    "valuations": ("valuations/historical", "stockToFlow_price"),
+    "stock-to-flow": ("historical/stock-to-flow", "price"),
+}
+
+
+def yearly_windows(start_date: str, end_date: str) -> list[tuple[datetime, datetime]]:
+    """`(start, end)` of each year from `start_date` to `end_date` (`%Y-%m-%d`)."""
+    current = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    windows = []
+    while current < end:
+        following = min(current + relativedelta(years=1), end)
+        windows.append((current, following))
+        current = following
+    return windows
+
+
+def read_csv(text: str, names: Optional[list[str]] = None) -> pd.DataFrame:
+    """
+    A CSV response indexed by its parsed `timestamp`, with every other column
+    of `names` as float64. Without `names` the first line is the header.
+    """
+    if not text.strip():
+        columns = [name for name in names or [] if name != "timestamp"]
+        return pd.DataFrame(
+            columns=columns, index=pd.DatetimeIndex([], name="timestamp")
+        ).astype(np.float64)
+
+    return pd.read_csv(
+        io.StringIO(text),
+        header=None if names else "infer",
+        names=names,
+        index_col="timestamp",
+        parse_dates=True,
+        dtype={name: np.float64 for name in names or [] if name != "timestamp"},
+    )
+
+
+class AmberdataLoader:
+    """
+    Amberdata requests for one API key, served from `cache` (a
+    `ResponseCache` at its default path unless given) when already fetched.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        cache: Optional[ResponseCache] = None,
+        max_workers: int = MAX_WORKERS,
+        api_url: str = API_URL,
+    ):
+        self.api_key = api_key
+        self.cache = ResponseCache() if cache is None else cache
+        self.max_workers = max_workers
+        self.api_url = api_url
+
+    def get(self, path: str, params: dict[str, Any]) -> str:
+        """The text of `path` under the API with `params`."""
+        url = f"{self.api_url}/{path}"
+        cached = self.cache.get(url, params)
+        if cached is not None:
+            return cached
+
+        response = requests.get(url, headers={"x-api-key": self.api_key}, params=params)
+        response.raise_for_status()
+        self.cache.put(url, params, response.text, window_ttl(url, params))
+        return response.text
+
+    def ohlcv(
+        self,
+        exchange: str,
+        symbol: str,
+        start_date: str,
+        end_date: str,
+        time_interval: str = "days",
+    ) -> pd.DataFrame:
+        """OHLCV bars of `symbol` on `exchange`, one request per year."""
+
+        def window(bounds: tuple[datetime, datetime]) -> pd.DataFrame:
+            start, end = bounds
+            print("Retrieving OHLCV between", start, " and ", end)
+            text = self.get(
+                f"market/ohlcv/{symbol}/historical",
+                {
+                    "exchange": exchange,
+                    "timeInterval": time_interval,
+                    "timeFormat": "iso",
+                    "format": "raw_csv",
+                    "fields": ",".join(OHLCV_FIELDS),
+                    "startDate": start.strftime(WINDOW_FORMAT),
+                    "endDate": end.strftime(WINDOW_FORMAT),
+                },
+            )
+            return read_csv(text, OHLCV_FIELDS)
+
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            frames = list(pool.map(window, yearly_windows(start_date, end_date)))
+
+        if not frames:
+            return read_csv("", OHLCV_FIELDS)
+        bars = pd.concat(frames)
+        # a bar on the boundary of two windows can come back in both
+        return bars[~bars.index.duplicated()].sort_index()
+
+    def metrics(
+        self, symbol: str, path: str, start_date: str, end_date: str
+    ) -> pd.DataFrame:
+        """Daily on-chain metrics of `symbol` from `market/metrics/{symbol}/{path}`."""
+        print("Retrieving", path, "between", start_date, " and ", end_date)
+        return read_csv(
+            self.get(
+                f"market/metrics/{symbol}/{path}",
+                {
+                    "format": "csv",
+                    "timeFrame": "day",
+                    "startDate": start_date,
+                    "endDate": end_date,
+                },
+            )
+        )
+
+    def stock_to_flow(
+        self, symbol: str, start_date: str, end_date: str, model: str = "valuations"
+    ) -> pd.DataFrame:
+        """The stock-to-flow model of `symbol` from one of `STF_MODELS`."""
+        return self.metrics(symbol, STF_MODELS[model][0], start_date, end_date)
+
+    def ohlcv_stf(
+        self,
+        exchange: str,
+        symbol: str,
+        asset: str,
+        start_date: str,
+        end_date: str,
+        model: str = "valuations",
+    ) -> pd.DataFrame:
+        """
+        OHLCV bars of `symbol` with the stock-to-flow model price of `asset` as
+        an `stf` column on the same timestamps, the OHLCV and the model fetched
+        at the same time.
+        """
+        with ThreadPoolExecutor(2) as pool:
+            bars = pool.submit(self.ohlcv, exchange, symbol, start_date, end_date)
+            stf = pool.submit(self.stock_to_flow, asset, start_date, end_date, model)
+            bars = bars.result()
+            bars["stf"] = stf.result()[STF_MODELS[model][1]]
+        return bars
@@ -0,0 +1,378 @@
+"""
+Headless reports of the backtrader scripts' runs.
+
+The scripts used to print their analyzers with `printTradeAnalysis`, a
+`pretty_print` per line and per transaction, and then block on the window of
+`cerebro.plot()`, so none of them could run unattended. Here a run becomes a
+`BacktestReport`: its params and flattened analyzer metrics as dicts, and its
+transactions and broker value at every bar as typed frames. `save_report`
+writes the metrics as JSON and the frames as Parquet, named after the run and
+a hash of its params and date range, with an optional static HTML page whose
+charts matplotlib draws as SVG without a display, and `load_results` reads a
+directory of saved runs back as one table.
+"""
+
+import base64
+import glob
+import hashlib
+import html
+import io
+import json
+import os
+from typing import Iterable, NamedTuple
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+REPORT_DIR = "reports"
+
+METRIC_COLUMNS = [
+    "initial_value",
+    "open_trades",
+    "closed_trades",
+    "won",
+    "lost",
+    "strike_rate",
+    "longest_win_streak",
+    "longest_loss_streak",
+    "net_pnl",
+    "average_pnl",
+    "final_value",
+    "drawdown",
+    "max_drawdown",
+    "sharpe",
+    "vwr",
+    "sqn",
+]
+
+# `format_report` labels, as `printTradeAnalysis` printed them
+LABELS = {
+    "open_trades": "Open Positions",
+    "closed_trades": "Closed Trades",
+    "won": "Winning Trades",
+    "lost": "Losing Trades",
+    "longest_win_streak": "Longest Winning Streak",
+    "longest_loss_streak": "Longest Losing Streak",
+    "strike_rate": "Strike Rate (Win/closed)",
+    "initial_value": "Initial Portfolio Value",
+    "final_value": "Final Portfolio Value",
+    "net_pnl": "Net P/L",
+    "average_pnl": "P/L Average per trade",
+    "drawdown": "Drawdown",
+    "max_drawdown": "Max Drawdown",
+    "sharpe": "Sharpe Ratio",
+    "vwr": "VWR",
+    "sqn": "SQN",
+}
+SECTIONS = [
+    ["open_trades", "closed_trades", "won", "lost"],
+    ["longest_win_streak", "longest_loss_streak", "strike_rate"],
+    ["initial_value", "final_value", "net_pnl", "average_pnl"],
+    ["drawdown", "max_drawdown", "sharpe", "vwr", "sqn"],
+]
+
+TRANSACTION_COLUMNS = ["amount", "price", "sid", "symbol", "value"]
+
+
+class Value(bt.Analyzer):
+    """The broker value at the close of every bar, as a Series."""
+
+    def start(self):
+        self.dates = []
+        self.values = []
+
+    def next(self):
+        self.dates.append(self.datas[0].datetime.datetime(0))
+        self.values.append(self.strategy.broker.getvalue())
+
+    def get_analysis(self) -> pd.Series:
+        return pd.Series(
+            self.values,
+            index=pd.DatetimeIndex(self.dates, name="date"),
+            name="value",
+            dtype=np.float64,
+        )
+
+
+class BacktestReport(NamedTuple):
+    name: str
+    # the `Strategy` params of the run
+    params: dict
+    # `METRIC_COLUMNS`, None where an analyzer had nothing to measure
+    metrics: dict
+    # one row per execution, indexed by date
+    transactions: pd.DataFrame
+    # broker value at each bar's close
+    value: pd.Series
+
+
+def add_analyzers(cerebro: bt.Cerebro, detail: bool = True):
+    """
+    The analyzers the scripts report, and with `detail` the transactions and
+    the value at every bar too.
+    """
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="ta")
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
+    cerebro.addanalyzer(
+        bt.analyzers.SharpeRatio,
+        _name="sharpe",
+        riskfreerate=0.0,
+        annualize=True,
+        timeframe=bt.TimeFrame.Days,
+    )
+    cerebro.addanalyzer(bt.analyzers.VWR, _name="vwr")
+    cerebro.addanalyzer(bt.analyzers.SQN, _name="sqn")
+    if detail:
+        cerebro.addanalyzer(bt.analyzers.Transactions, _name="txn")
+        cerebro.addanalyzer(Value, _name="value")
+
+
+def _value(analysis, *keys):
+    for key in keys:
+        if analysis is None or key not in analysis:
+            return None
+        analysis = analysis[key]
+    return analysis
+
+
+def metrics(cerebro: bt.Cerebro, analyzers) -> dict:
+    """A run's `add_analyzers` analyzers flattened into `METRIC_COLUMNS`."""
+    ta = analyzers.ta.get_analysis()
+    drawdown = analyzers.drawdown.get_analysis()
+    won = _value(ta, "won", "total")
+    closed = _value(ta, "total", "closed")
+    return {
+        "initial_value": cerebro.broker.startingcash,
+        "open_trades": _value(ta, "total", "open"),
+        "closed_trades": closed,
+        "won": won,
+        "lost": _value(ta, "lost", "total"),
+        "strike_rate": won / closed * 100 if won is not None and closed else None,
+        "longest_win_streak": _value(ta, "streak", "won", "longest"),
+        "longest_loss_streak": _value(ta, "streak", "lost", "longest"),
+        "net_pnl": _value(ta, "pnl", "net", "total"),
+        "average_pnl": _value(ta, "pnl", "net", "average"),
+        "final_value": cerebro.broker.getvalue(),
+        "drawdown": _value(drawdown, "drawdown"),
+        "max_drawdown": _value(drawdown, "max", "drawdown"),
+        "sharpe": _value(analyzers.sharpe.get_analysis(), "sharperatio"),
+        "vwr": _value(analyzers.vwr.get_analysis(), "vwr"),
+        "sqn": _value(analyzers.sqn.get_analysis(), "sqn"),
+    }
+
+
+def transactions(analyzers) -> pd.DataFrame:
+    """The `Transactions` analyzer's executions, one row each."""
+    dates, rows = [], []
+    for date, executions in analyzers.txn.get_analysis().items():
+        dates.extend([date] * len(executions))
+        rows.extend(executions)
+    columns = list(zip(*rows)) if rows else [[]] * len(TRANSACTION_COLUMNS)
+    frame = pd.DataFrame(
+        dict(zip(TRANSACTION_COLUMNS, columns)),
+        index=pd.DatetimeIndex(dates, name="date"),
+    )
+    return frame.astype(
+        {
+            "amount": np.float64,
+            "price": np.float64,
+            "sid": np.int64,
+            "value": np.float64,
+        }
+    )
+
+
+def backtest_report(
+    cerebro: bt.Cerebro, strategy: bt.Strategy, name: str
+) -> BacktestReport:
+    """The report of a run of `cerebro` set up with `add_analyzers`."""
+    return BacktestReport(
+        name,
+        {key: getattr(strategy.params, key) for key in strategy.params._getkeys()},
+        metrics(cerebro, strategy.analyzers),
+        transactions(strategy.analyzers),
+        strategy.analyzers.value.get_analysis(),
+    )
+
+
+def _display(name: str, value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "-"
+    if name in ("initial_value", "final_value", "net_pnl", "average_pnl"):
+        return f"{'-' if value < 0 else ''}${abs(value):,.2f}"
+    if name in ("drawdown", "max_drawdown", "strike_rate"):
+        return f"{value:.2f}%"
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return str(value)
+
+
+def format_report(report: BacktestReport) -> str:
+    """The report as text, as `printTradeAnalysis` printed it."""
+    lines = [f"Backtesting Results: {report.name}"]
+    for section in SECTIONS:
+        lines.extend(
+            f"  {LABELS[name]:<24} : {_display(name, report.metrics[name])}"
+            for name in section
+        )
+        lines.append("")
+    lines.append("Transactions")
+    lines.append(report.transactions.to_string() if len(report.transactions) else "  -")
+    return "\n".join(lines)
+
+
+def _slug(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+def _json_value(value):
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def report_record(report: BacktestReport) -> dict:
+    """The name, params and metrics of a report, as JSON-safe values."""
+    return {
+        "name": report.name,
+        "start": report.value.index[0].isoformat() if len(report.value) else None,
+        "end": report.value.index[-1].isoformat() if len(report.value) else None,
+        "params": {key: _json_value(value) for key, value in report.params.items()},
+        "metrics": {key: _json_value(value) for key, value in report.metrics.items()},
+    }
+
+
+def _chart(value: pd.Series) -> str:
+    """The value and its drawdown as an inline SVG."""
+    fig = Figure(figsize=(12, 6))
+    top, bottom = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]})
+    if len(value):
+        top.plot(value.index, value.to_numpy(), color="#2c7fb8", linewidth=1)
+        drawdown = (value / value.cummax() - 1) * 100
+        bottom.fill_between(drawdown.index, drawdown.to_numpy(), color="#e74c3c")
+    top.set_ylabel("Portfolio Value ($)")
+    bottom.set_ylabel("Drawdown (%)")
+    fig.autofmt_xdate()
+    svg = io.StringIO()
+    fig.savefig(svg, format="svg", bbox_inches="tight")
+    return svg.getvalue()
+
+
+def report_html(report: BacktestReport) -> str:
+    """A static page of the report: metrics, params, chart and transactions."""
+    rows = "".join(
+        f"<tr><th>{html.escape(LABELS[name])}</th>"
+        f"<td>{html.escape(_display(name, report.metrics[name]))}</td></tr>"
+        for section in SECTIONS
+        for name in section
+    )
+    params = "".join(
+        f"<tr><th>{html.escape(str(key))}</th><td>{html.escape(str(value))}</td></tr>"
+        for key, value in report.params.items()
+    )
+    # the SVG goes in as a data URI so the page has no other files
+    chart = base64.b64encode(_chart(report.value).encode()).decode()
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(report.name)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 2em; }}
+th, td {{ padding: 2px 12px; text-align: right; border-bottom: 1px solid #ddd; }}
+img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(report.name)}</h1>
+<h2>Results</h2>
+<table>{rows}</table>
+<h2>Params</h2>
+<table>{params}</table>
+<h2>Value</h2>
+<img src="data:image/svg+xml;base64,{chart}" alt="Portfolio value and drawdown">
+<h2>Transactions</h2>
+{report.transactions.to_html(float_format=lambda x: f"{x:.6g}")}
+</body>
+</html>
+"""
+
+
+def run_id(report: BacktestReport) -> str:
+    """
+    A short hash of the report's params and date range, so runs of one script
+    with different settings are saved side by side, while a rerun of the same
+    settings replaces its own files.
+    """
+    record = report_record(report)
+    key = json.dumps([record["params"], record["start"], record["end"]], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+
+def save_report(
+    report: BacktestReport, directory: str = REPORT_DIR, html_page: bool = True
+) -> str:
+    """
+    Writes `<name>-<run>.json` (`report_record` and the `run_id`),
+    `<name>-<run>.transactions.parquet`, `<name>-<run>.value.parquet` and, with
+    `html_page`, `<name>-<run>.html` to `directory`, and returns the path of the
+    JSON.
+    """
+    os.makedirs(directory, exist_ok=True)
+    run = run_id(report)
+    base = os.path.join(directory, f"{_slug(report.name)}-{run}")
+    report.transactions.to_parquet(f"{base}.transactions.parquet")
+    report.value.to_frame().to_parquet(f"{base}.value.parquet")
+    if html_page:
+        with open(f"{base}.html", "w") as f:
+            f.write(report_html(report))
+    with open(f"{base}.json", "w") as f:
+        json.dump({"run": run, **report_record(report)}, f, indent=1)
+    return f"{base}.json"
+
+
+def results_table(records: Iterable[dict]) -> pd.DataFrame:
+    """One row per `report_record`, with its params and `METRIC_COLUMNS`."""
+    rows = [
+        {
+            "name": record["name"],
+            "run": record.get("run"),
+            "start": record["start"],
+            "end": record["end"],
+            **record["params"],
+            **record["metrics"],
+        }
+        for record in records
+    ]
+    table = pd.DataFrame(rows)
+    present = [name for name in METRIC_COLUMNS if name in table]
+    table[present] = table[present].astype(np.float64)
+    return table
+
+
+def load_results(directory: str = REPORT_DIR) -> pd.DataFrame:
+    """`results_table` of every report saved in `directory`."""
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path) as f:
+            records.append(json.load(f))
+    return results_table(records)
+
+
+def load_report(path: str) -> BacktestReport:
+    """A report from the JSON `save_report` wrote and the Parquet beside it."""
+    with open(path) as f:
+        record = json.load(f)
+    base = path[: -len(".json")]
+    return BacktestReport(
+        record["name"],
+        record["params"],
+        record["metrics"],
+        pd.read_parquet(f"{base}.transactions.parquet"),
+        pd.read_parquet(f"{base}.value.parquet")["value"],
+    )
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "AMBERDATA_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "amberdata", "responses.sqlite"),
+)
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# Windows ending within this many seconds of now can still change upstream.
+RECENT_WINDOW = 24 * 60 * 60
+RECENT_TTL = 60 * 60
+
+END_PARAMS = ("endDate", "endTime", "endTimestamp", "end")
+
+# Lookups by id that never change once they exist.
+IMMUTABLE_PATHS = ("/blockchains/transactions/",)
+
+
+def split_url(url: str, params: Optional[dict[str, Any]]) -> tuple[str, dict[str, str]]:
+    """Separate a URL from its query string and merge it with `params`."""
+    parts = urlsplit(url)
+    base = parts._replace(query="", fragment="").geturl()
+    merged = dict(parse_qsl(parts.query, keep_blank_values=True))
+    merged.update({key: str(value) for key, value in (params or {}).items()})
+    return base, merged
+
+
+def cache_key(url: str, params: Optional[dict[str, Any]] = None) -> str:
+    """Content address of a request: the URL plus its query params in sorted order,
+    so the same request spelled two different ways shares one entry.
+    """
+    base, merged = split_url(url, params)
+    normalized = json.dumps([base, sorted(merged.items())], separators=(",", ":"))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def parse_time(value: str) -> Optional[datetime]:
+    value = value.strip()
+    if value.lstrip("-").isdigit():
+        number = int(value)
+        # Amberdata accepts both seconds and milliseconds
+        if abs(number) > 10**11:
+            number //= 1000
+        return datetime.fromtimestamp(number, tz=timezone.utc)
+
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def window_ttl(url: str, params: Optional[dict[str, Any]] = None) -> Optional[float]:
+    """TTL in seconds for a response, or None if it can be kept forever.
+
+    Only windows that end close to now (or have no end at all, which the API
+    treats as now) may still change, so only those expire.
+    """
+    base, merged = split_url(url, params)
+
+    if any(path in base for path in IMMUTABLE_PATHS):
+        return None
+
+    for name in END_PARAMS:
+        if name in merged:
+            end = parse_time(merged[name])
+            if end is None:
+                return RECENT_TTL
+            if end.timestamp() < time.time() - RECENT_WINDOW:
+                return None
+            return RECENT_TTL
+
+    return RECENT_TTL
+
+
+class ResponseCache:
+    """SQLite-backed store of raw API responses.
+
+    Entries are compressed, evicted least-recently-used first once the file
+    grows past `max_bytes`, and safe to share between threads.
+    """
+
+    path: str
+    max_bytes: int
+    lock: threading.Lock
+
+    def __init__(
+        self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires REAL,
+                last_access REAL NOT NULL
+            )
+            """)
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self.total_bytes = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, url: str, params: Optional[dict[str, Any]] = None) -> Optional[str]:
+        key = cache_key(url, params)
+        now = time.time()
+
+        with self.lock:
+            row = self.db.execute(
+                "SELECT body, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            body, expires = row
+            if expires is not None and expires < now:
+                self.expired += 1
+                self.misses += 1
+                self._delete(key)
+                return None
+
+            self.db.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+
+        return zlib.decompress(body).decode()
+
+    def put(
+        self,
+        url: str,
+        params: Optional[dict[str, Any]],
+        text: str,
+        ttl: Optional[float] = None,
+    ):
+        key = cache_key(url, params)
+        body = zlib.compress(text.encode())
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+
+        with self.lock:
+            self._delete(key)
+            self.db.execute(
+                "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, body, len(body), expires, now),
+            )
+            self.total_bytes += len(body)
+
+            if self.total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def _delete(self, key: str):
+        row = self.db.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_bytes -= row[0]
+
+    def _evict(self, target_bytes: int):
+        rows = self.db.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ).fetchall()
+        for key, size in rows:
+            if self.total_bytes <= target_bytes:
+                break
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def report(self) -> str:
+        with self.lock:
+            lookups = self.hits + self.misses
+            rate = self.hits / lookups if lookups else 0.0
+            return (
+                f"cache hits: {self.hits}, misses: {self.misses} "
+                f"({rate:.1%} hit rate), expired: {self.expired}, "
+                f"evicted: {self.evictions}, "
+                f"size: {self.total_bytes / 1024**2:.1f} MiB"
+            )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
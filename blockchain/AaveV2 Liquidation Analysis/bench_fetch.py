@@ -0,0 +1,260 @@
+"""Compare the thread pool fetcher against the async engine on a local mock API.
+
+The mock server sleeps `--latency` seconds per request and `--handshake` seconds
+the first time it sees a new connection, which stands in for the TLS handshake
+that `requests.get` pays on every call. The server runs in its own process so it
+does not compete with the client for the GIL. It also answers JSON-RPC batches
+of `eth_getTransactionReceipt`, which is used to compare per-transaction REST
+fee lookups against `fee_resolver`.
+
+    python -m bench_fetch --calls 1000 --latency 0.05 --handshake 0.05
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import loads
+from os import environ
+from typing import Any, Callable, Optional
+
+import requests as rq
+from amberdata_common.response_cache import ResponseCache, window_ttl
+
+import fee_resolver
+import fetch
+from checkpoint import Checkpoint
+from fetch import Progress, build_url
+from ratelimit import DEFAULT_RPS, RateLimiter, parse_retry_after
+
+
+# the thread pool fetcher get_data used before the async engine, as a baseline
+def call_api(
+    endpoint: str,
+    params: dict[str, str],
+    progress: Optional[Progress],
+    limiter: RateLimiter,
+    cache: Optional[ResponseCache] = None,
+) -> Any:
+    if cache:
+        cached = cache.get(endpoint, params)
+        if cached is not None:
+            if progress:
+                progress.next()
+            return loads(cached)["payload"]
+
+    headers = {
+        "accept": "application/json",
+        "x-api-key": environ["API_KEY"],
+    }
+
+    url = build_url(endpoint, params)
+
+    while True:
+        limiter.acquire()
+        response = rq.get(url, headers=headers)
+
+        if response.status_code == 429:
+            limiter.throttled(parse_retry_after(response.headers.get("Retry-After")))
+            continue
+
+        json = response.json()
+
+        if "message" in json:
+            if json["message"] == "Too Many Requests":
+                limiter.throttled(
+                    parse_retry_after(response.headers.get("Retry-After"))
+                )
+                continue
+
+        limiter.succeeded()
+
+        status = json["status"]
+        if not status == 200:
+            print(f"error calling GET {url}")
+            return dict()
+
+        if cache:
+            cache.put(endpoint, params, response.text, window_ttl(endpoint, params))
+
+        if progress:
+            progress.next()
+        return json["payload"]
+
+
+def threaded_parallel_api(
+    endpoints_params: list[tuple[str, dict[str, str]]],
+    max_workers: int = 5,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    on_payload: Optional[Callable[[Any], None]] = None,
+) -> list[Any]:
+    payloads = []
+    prog = Progress(len(endpoints_params))
+    limiter = limiter or RateLimiter(DEFAULT_RPS)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(call_api, endpoint, params, prog, limiter, cache): (
+                endpoint,
+                params,
+            )
+            for endpoint, params in endpoints_params
+        }
+
+        for future in as_completed(futures):
+            endpoint, params = futures[future]
+            try:
+                payload = future.result()
+                if payload:
+                    if on_payload:
+                        on_payload(payload)
+                    else:
+                        payloads.append(payload)
+                    if checkpoint:
+                        checkpoint.record_done(
+                            endpoint, params, None if on_payload else payload
+                        )
+                elif checkpoint:
+                    checkpoint.record_failed(endpoint, params, "error response")
+            except Exception as e:
+                print(f"exception {e}")
+                if checkpoint:
+                    checkpoint.record_failed(endpoint, params, str(e))
+
+    print()
+
+    return payloads
+
+
+def make_handler(latency: float, handshake: float):
+    class MockAmberdata(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            time.sleep(handshake)
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps(
+                {"status": 200, "payload": {"data": [{"path": self.path}]}}
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            time.sleep(latency)
+            calls = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            body = json.dumps(
+                [
+                    {
+                        "jsonrpc": "2.0",
+                        "id": call["id"],
+                        "result": {
+                            "transactionHash": call["params"][0],
+                            "gasUsed": hex(21000),
+                            "effectiveGasPrice": hex(30 * 10**9),
+                        },
+                    }
+                    for call in calls
+                ]
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockAmberdata
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(port_queue: multiprocessing.Queue, latency: float, handshake: float):
+    server = MockServer(("127.0.0.1", 0), make_handler(latency, handshake))
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def timed(label: str, func, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    payloads = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:8.2f}s  ({len(payloads)} payloads)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--handshake", type=float, default=0.05)
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--rps", type=float, default=10_000)
+    args = parser.parse_args()
+
+    environ.setdefault("API_KEY", "bench")
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve,
+        args=(port_queue, args.latency, args.handshake),
+        daemon=True,
+    )
+    server.start()
+    host = f"http://127.0.0.1:{port_queue.get()}"
+    endpoint = f"{host}/window"
+
+    endpoints_params = [(endpoint, {"window": str(i)}) for i in range(args.calls)]
+
+    baseline = timed(
+        "threads (requests.get, 11)",
+        threaded_parallel_api,
+        endpoints_params,
+        max_workers=11,
+        limiter=RateLimiter(args.rps),
+    )
+    engine = timed(
+        f"async (pooled, {args.max_workers})",
+        fetch.parallel_api,
+        endpoints_params,
+        max_workers=args.max_workers,
+        limiter=RateLimiter(args.rps),
+    )
+    print(f"speedup: {baseline / engine:.1f}x")
+
+    txs = [f"0x{i:064x}" for i in range(args.calls)]
+    rest = timed(
+        f"fees, REST per tx ({args.max_workers})",
+        fetch.parallel_api,
+        [(f"{host}/blockchains/transactions/{tx}", dict()) for tx in txs],
+        max_workers=args.max_workers,
+        limiter=RateLimiter(args.rps),
+    )
+    rpc = timed(
+        f"fees, RPC batches of {fee_resolver.BATCH_SIZE}",
+        lambda: fee_resolver.resolve_fees(
+            txs, f"{host}/rpc", limiter=RateLimiter(args.rps)
+        )[0],
+    )
+    print(f"speedup: {rest / rpc:.1f}x")
+
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Compare loading ETH prices from CSV against the Parquet store.
+
+Writes three years of synthetic minutely prices both ways into a temporary
+directory, then loads one year of it in a fresh process per method and reports
+wall-clock time and peak resident memory.
+
+    python -m bench_storage
+"""
+
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from lib import filter_dates
+from storage import read_dataset, write_dataset
+
+START = "6/1/2021"
+END = "6/1/2022"
+
+
+def synthetic_prices() -> pd.DataFrame:
+    timestamps = pd.date_range("2021-01-01", "2024-01-01", freq="min", inclusive="left")
+    returns = np.random.default_rng(0).normal(0, 0.001, len(timestamps))
+    return pd.DataFrame(
+        {"timestamp": timestamps, "price": 730 * np.exp(np.cumsum(returns))}
+    )
+
+
+def load_csv(root: str) -> pd.DataFrame:
+    eth = pd.read_csv(
+        f"{root}/ether_price.csv", parse_dates=True, index_col=0
+    ).sort_index()
+    return filter_dates(eth, START, END)
+
+
+def load_parquet(root: str) -> pd.DataFrame:
+    eth = read_dataset("ether_price", START, END, ["timestamp", "price"], root)
+    return eth.set_index("timestamp").sort_index()
+
+
+def max_rss_mib() -> float:
+    # ru_maxrss survives exec on Linux, so a spawned child would report the
+    # parent's peak; VmHWM is reset for the new process image
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(method: str, root: str, results: multiprocessing.Queue):
+    loader = {"csv": load_csv, "parquet": load_parquet}[method]
+    before = max_rss_mib()
+    start = time.perf_counter()
+    eth = loader(root)
+    elapsed = time.perf_counter() - start
+    results.put((method, elapsed, max_rss_mib() - before, len(eth)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as root:
+        prices = synthetic_prices()
+        prices.to_csv(f"{root}/ether_price.csv", index=False)
+        write_dataset("ether_price", prices, root)
+        print(f"{len(prices)} rows, loading {START} - {END}")
+
+        for method in ("csv", "parquet"):
+            timings = []
+            for _ in range(args.repeat):
+                results = ctx.Queue()
+                process = ctx.Process(target=measure, args=(method, root, results))
+                process.start()
+                timings.append(results.get())
+                process.join()
+
+            _, elapsed, rss, rows = min(timings, key=lambda t: t[1])
+            print(f"{method:<8} {elapsed:6.2f}s  {rss:7.1f} MiB peak RSS  {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+from typing import Any
+
+from amberdata_common.response_cache import cache_key
+
+CHECKPOINT_DIR = "data/checkpoints"
+
+# Rewrite the manifest after this many completed windows. The payload log is
+# the source of truth for finished windows, so a crash between manifest writes
+# loses nothing.
+MANIFEST_EVERY = 100
+
+
+class Checkpoint:
+    """Durable record of which request windows of a fetch have finished.
+
+    Every completed window's payload is appended to `<name>.jsonl` as soon as it
+    arrives, and `<name>.manifest.json` lists the done and failed windows. A
+    rerun with the same checkpoint only requests windows that are not done yet.
+    """
+
+    name: str
+    log_path: str
+    manifest_path: str
+    done: set[str]
+    failed: dict[str, dict[str, Any]]
+    lock: threading.Lock
+
+    def __init__(self, name: str, directory: str = CHECKPOINT_DIR):
+        self.name = name
+        self.log_path = os.path.join(directory, f"{name}.jsonl")
+        self.manifest_path = os.path.join(directory, f"{name}.manifest.json")
+        self.done = set()
+        self.failed = dict()
+        self.lock = threading.Lock()
+        self.unsaved = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.failed = json.load(f).get("failed", dict())
+
+        for key, _ in self._read_log():
+            self.done.add(key)
+            self.failed.pop(key, None)
+
+        self.log = open(self.log_path, "a")
+        if self.log.tell() > 0 and not self._ends_with_newline():
+            self.log.write("\n")
+
+    def _read_log(self):
+        if not os.path.exists(self.log_path):
+            return
+
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a write cut short by a crash; that window is fetched again
+                    continue
+                yield record["key"], record["payload"]
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.log_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @staticmethod
+    def key(endpoint: str, params: dict[str, str]) -> str:
+        return cache_key(endpoint, params)
+
+    def pending(
+        self, endpoints_params: list[tuple[str, dict[str, str]]]
+    ) -> list[tuple[str, dict[str, str]]]:
+        todo = [
+            (endpoint, params)
+            for endpoint, params in endpoints_params
+            if self.key(endpoint, params) not in self.done
+        ]
+        if len(todo) < len(endpoints_params):
+            print(
+                f"resuming {self.name}: "
+                f"{len(endpoints_params) - len(todo)} windows already done, "
+                f"{len(todo)} to fetch"
+            )
+        return todo
+
+    def with_failed(
+        self, endpoints_params: list[tuple[str, dict[str, str]]]
+    ) -> list[tuple[str, dict[str, str]]]:
+        """`endpoints_params` plus the failed windows of earlier runs it lacks.
+
+        An `--append` run only asks for windows after the newest stored row, so
+        a window that failed before it would otherwise never be retried.
+        """
+        wanted = {self.key(endpoint, params) for endpoint, params in endpoints_params}
+        return endpoints_params + [
+            (window["endpoint"], window["params"])
+            for key, window in self.failed.items()
+            if key not in wanted
+        ]
+
+    def record_done(self, endpoint: str, params: dict[str, str], payload: Any):
+        key = self.key(endpoint, params)
+        line = json.dumps({"key": key, "payload": payload})
+
+        with self.lock:
+            self.log.write(line + "\n")
+            self.log.flush()
+            self.done.add(key)
+            self.failed.pop(key, None)
+            self.unsaved += 1
+            if self.unsaved >= MANIFEST_EVERY:
+                self._save_manifest()
+
+    def record_failed(self, endpoint: str, params: dict[str, str], reason: str):
+        with self.lock:
+            self.failed[self.key(endpoint, params)] = {
+                "endpoint": endpoint,
+                "params": params,
+                "reason": reason,
+            }
+            self._save_manifest()
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"done": sorted(self.done), "failed": self.failed}, f)
+        os.replace(tmp_path, self.manifest_path)
+        self.unsaved = 0
+
+    def payloads(self, endpoints_params: list[tuple[str, dict[str, str]]]) -> list[Any]:
+        """Every stored payload belonging to one of `endpoints_params`."""
+        with self.lock:
+            self.log.flush()
+            self._save_manifest()
+
+        wanted = {self.key(endpoint, params) for endpoint, params in endpoints_params}
+        payloads = []
+        for key, payload in self._read_log():
+            if key in wanted:
+                payloads.append(payload)
+                wanted.remove(key)
+        return payloads
+
+    def clear(self):
+        """Forget this fetch once its results have been written out."""
+        with self.lock:
+            self.log.close()
+            for path in (self.log_path, self.manifest_path):
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,213 @@
+"""Transaction fees from batched JSON-RPC receipt lookups.
+
+One `POST` to the RPC endpoint carries `batch_size` `eth_getTransactionReceipt`
+calls, so fees for tens of thousands of liquidations take a few hundred round
+trips instead of one REST call per transaction. Resolved fees are kept in the
+response cache under their transaction hash and are never requested again.
+"""
+
+import asyncio
+from json import dumps, loads
+from typing import Any, Callable, Optional
+
+import aiohttp
+from amberdata_common.response_cache import ResponseCache
+
+from checkpoint import Checkpoint
+from fetch import Progress, make_session
+from ratelimit import DEFAULT_RPS, RateLimiter, parse_retry_after
+
+RPC_URL = "https://rpc.web3api.io/api/v2"
+TX_ENDPOINT = "https://api.amberdata.com/blockchains/transactions/"
+BATCH_SIZE = 100
+
+# Cache entries are addressed like any other request, this URL is never called.
+FEE_CACHE_URL = "rpc://fees"
+
+
+def tx_endpoint(tx: str) -> str:
+    """The REST lookup for `tx`; checkpoints key fees by it whichever way they
+    were fetched.
+    """
+    return f"{TX_ENDPOINT}{tx}"
+
+
+def batch_request(method: str, txs: list[str]) -> list[dict[str, Any]]:
+    return [
+        {"jsonrpc": "2.0", "id": i, "method": method, "params": [tx]}
+        for i, tx in enumerate(txs)
+    ]
+
+
+def receipt_fee(tx: str, receipt: Optional[dict[str, Any]]) -> Optional[dict]:
+    """`gasUsed` and the price actually paid, or None if the node has no receipt.
+
+    `effectiveGasPrice` is the base fee plus tip for EIP-1559 transactions and
+    equal to `gasPrice` for legacy ones.
+    """
+    if not receipt or "gasUsed" not in receipt:
+        return None
+
+    gas_price = receipt.get("effectiveGasPrice")
+    return {
+        "hash": tx,
+        "gasUsed": int(receipt["gasUsed"], 16),
+        "gasPrice": int(gas_price, 16) if gas_price else None,
+    }
+
+
+async def post_batch(
+    session: aiohttp.ClientSession,
+    rpc_url: str,
+    method: str,
+    txs: list[str],
+    limiter: RateLimiter,
+) -> list[Optional[dict[str, Any]]]:
+    """The `result` of `method` for each of `txs`, in order (None where the call
+    errored or the node returned nothing).
+    """
+    while True:
+        await limiter.acquire_async()
+        async with session.post(rpc_url, json=batch_request(method, txs)) as response:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status == 429:
+                limiter.throttled(retry_after)
+                continue
+
+            text = await response.text()
+
+        json = loads(text)
+
+        if isinstance(json, dict):
+            if json.get("message") == "Too Many Requests":
+                limiter.throttled(retry_after)
+                continue
+            print(f"error calling POST {rpc_url}: {json.get('error', json)}")
+            return [None] * len(txs)
+
+        limiter.succeeded()
+
+        results: list[Optional[dict[str, Any]]] = [None] * len(txs)
+        for item in json:
+            if isinstance(item.get("id"), int) and 0 <= item["id"] < len(txs):
+                results[item["id"]] = item.get("result")
+        return results
+
+
+async def async_resolve_fees(
+    txs: list[str],
+    rpc_url: str = RPC_URL,
+    batch_size: int = BATCH_SIZE,
+    max_workers: int = 32,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    on_fees: Optional[Callable[[list[dict]], None]] = None,
+) -> tuple[list[dict], list[str]]:
+    limiter = limiter or RateLimiter(DEFAULT_RPS)
+    fees = []
+    unresolved = []
+
+    def resolved(batch: list[dict]):
+        if not batch:
+            return
+        if on_fees:
+            on_fees(batch)
+        else:
+            fees.extend(batch)
+        if checkpoint:
+            for fee in batch:
+                checkpoint.record_done(
+                    tx_endpoint(fee["hash"]), dict(), None if on_fees else fee
+                )
+
+    pending = []
+    cached = []
+    for tx in dict.fromkeys(txs):
+        hit = cache.get(FEE_CACHE_URL, {"hash": tx}) if cache else None
+        if hit is None:
+            pending.append(tx)
+        else:
+            cached.append(loads(hit))
+    resolved(cached)
+
+    batches = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+    prog = Progress(len(batches))
+
+    async with make_session(max_workers) as session:
+
+        async def resolve(batch: list[str]) -> tuple[list[dict], list[str]]:
+            receipts = await post_batch(
+                session, rpc_url, "eth_getTransactionReceipt", batch, limiter
+            )
+            batch_fees = {}
+            for tx, receipt in zip(batch, receipts):
+                fee = receipt_fee(tx, receipt)
+                if fee is not None:
+                    batch_fees[tx] = fee
+
+            # receipts from nodes that predate `effectiveGasPrice`
+            no_price = [tx for tx, fee in batch_fees.items() if fee["gasPrice"] is None]
+            if no_price:
+                found = await post_batch(
+                    session, rpc_url, "eth_getTransactionByHash", no_price, limiter
+                )
+                for tx, transaction in zip(no_price, found):
+                    if transaction and transaction.get("gasPrice"):
+                        batch_fees[tx]["gasPrice"] = int(transaction["gasPrice"], 16)
+                    else:
+                        del batch_fees[tx]
+
+            prog.next()
+            return list(batch_fees.values()), [
+                tx for tx in batch if tx not in batch_fees
+            ]
+
+        async def call(batch: list[str]):
+            try:
+                return batch, *(await resolve(batch)), None
+            except Exception as e:
+                return batch, [], batch, e
+
+        tasks = [asyncio.create_task(call(batch)) for batch in batches]
+
+        for task in asyncio.as_completed(tasks):
+            batch, batch_fees, missing, e = await task
+            if e is not None:
+                print(f"exception {e}")
+
+            if cache:
+                for fee in batch_fees:
+                    cache.put(FEE_CACHE_URL, {"hash": fee["hash"]}, dumps(fee))
+            resolved(batch_fees)
+            unresolved.extend(missing)
+
+    if batches:
+        print()
+
+    return fees, unresolved
+
+
+def resolve_fees(
+    txs: list[str],
+    rpc_url: str = RPC_URL,
+    batch_size: int = BATCH_SIZE,
+    max_workers: int = 32,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    on_fees: Optional[Callable[[list[dict]], None]] = None,
+) -> tuple[list[dict], list[str]]:
+    """Fees for `txs` as `{"hash", "gasUsed", "gasPrice"}` dicts, plus the hashes
+    that could not be resolved over RPC.
+
+    Hashes already in `cache` are not requested. With `checkpoint`, each fee is
+    recorded under its REST endpoint, so a rerun skips it whichever way it is
+    fetched. With `on_fees`, each batch of fees is handed to it as it arrives
+    and nothing is collected.
+    """
+    return asyncio.run(
+        async_resolve_fees(
+            txs, rpc_url, batch_size, max_workers, limiter, cache, checkpoint, on_fees
+        )
+    )
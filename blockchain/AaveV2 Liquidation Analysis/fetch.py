@@ -0,0 +1,220 @@
+import asyncio
+import sys
+import threading
+from json import loads
+from os import environ
+from typing import Any, Callable, Optional
+
+import aiohttp
+from amberdata_common.response_cache import ResponseCache, window_ttl
+
+from checkpoint import Checkpoint
+from ratelimit import DEFAULT_RPS, RateLimiter, parse_retry_after
+
+# Given a window's params and its payload, the params of the smaller windows to
+# fetch instead, or None if the payload is complete.
+Splitter = Callable[[dict[str, str], Any], Optional[list[dict[str, str]]]]
+
+
+class Progress:
+    num_calls: int
+    current_call: int
+    lock: threading.Lock
+
+    def __init__(self, num_calls: int):
+        self.num_calls = num_calls
+        self.current_call = 0
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            self.current_call += 1
+            sys.stdout.write(f"\r[{self.current_call}/{self.num_calls}]")
+            sys.stdout.flush()
+
+
+def build_url(endpoint: str, params: dict[str, str]) -> str:
+    if not params:
+        return endpoint
+
+    param_string = "&".join(f"{key}={value}" for key, value in params.items())
+    return f"{endpoint}?{param_string}"
+
+
+def make_session(max_workers: int) -> aiohttp.ClientSession:
+    """One keep-alive pool shared by every request in a run, so each host only
+    pays for `max_workers` TLS handshakes instead of one per window.
+    """
+    headers = {
+        "accept": "application/json",
+        "x-api-key": environ["API_KEY"],
+    }
+    connector = aiohttp.TCPConnector(limit=max_workers, ttl_dns_cache=300)
+
+    return aiohttp.ClientSession(
+        headers=headers,
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=60),
+    )
+
+
+async def async_call_api(
+    session: aiohttp.ClientSession,
+    endpoint: str,
+    params: dict[str, str],
+    progress: Optional[Progress],
+    limiter: RateLimiter,
+    cache: Optional[ResponseCache] = None,
+) -> Any:
+    if cache:
+        cached = cache.get(endpoint, params)
+        if cached is not None:
+            if progress:
+                progress.next()
+            return loads(cached)["payload"]
+
+    url = build_url(endpoint, params)
+
+    while True:
+        await limiter.acquire_async()
+        async with session.get(url) as response:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status == 429:
+                limiter.throttled(retry_after)
+                continue
+
+            text = await response.text()
+
+        json = loads(text)
+
+        if "message" in json:
+            if json["message"] == "Too Many Requests":
+                limiter.throttled(retry_after)
+                continue
+
+        limiter.succeeded()
+
+        status = json["status"]
+        if not status == 200:
+            print(f"error calling GET {url}")
+            return dict()
+
+        if cache:
+            cache.put(endpoint, params, text, window_ttl(endpoint, params))
+
+        if progress:
+            progress.next()
+        return json["payload"]
+
+
+async def async_call_window(
+    session: aiohttp.ClientSession,
+    endpoint: str,
+    params: dict[str, str],
+    progress: Optional[Progress],
+    limiter: RateLimiter,
+    cache: Optional[ResponseCache] = None,
+    split: Optional[Splitter] = None,
+) -> Any:
+    """`async_call_api`, re-requesting the window as the parts `split` returns
+    (recursively) when its payload is incomplete, and merging their rows.
+    """
+    payload = await async_call_api(session, endpoint, params, None, limiter, cache)
+
+    parts = split(params, payload) if split and payload else None
+    if parts:
+        payloads = await asyncio.gather(
+            *(
+                async_call_window(session, endpoint, part, None, limiter, cache, split)
+                for part in parts
+            )
+        )
+        if not all(payloads):
+            return dict()
+        payload = {"data": [row for part in payloads for row in part["data"]]}
+
+    if progress:
+        progress.next()
+    return payload
+
+
+async def async_parallel_api(
+    endpoints_params: list[tuple[str, dict[str, str]]],
+    max_workers: int = 32,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    on_payload: Optional[Callable[[Any], None]] = None,
+    split: Optional[Splitter] = None,
+) -> list[Any]:
+    payloads = []
+    prog = Progress(len(endpoints_params))
+    limiter = limiter or RateLimiter(DEFAULT_RPS)
+
+    async with make_session(max_workers) as session:
+
+        async def call(endpoint: str, params: dict[str, str]):
+            try:
+                payload = await async_call_window(
+                    session, endpoint, params, prog, limiter, cache, split
+                )
+                return endpoint, params, payload, None
+            except Exception as e:
+                return endpoint, params, None, e
+
+        tasks = [
+            asyncio.create_task(call(endpoint, params))
+            for endpoint, params in endpoints_params
+        ]
+
+        for task in asyncio.as_completed(tasks):
+            endpoint, params, payload, e = await task
+            if e is not None:
+                print(f"exception {e}")
+                if checkpoint:
+                    checkpoint.record_failed(endpoint, params, str(e))
+            elif payload:
+                if on_payload:
+                    on_payload(payload)
+                else:
+                    payloads.append(payload)
+                if checkpoint:
+                    checkpoint.record_done(
+                        endpoint, params, None if on_payload else payload
+                    )
+            elif checkpoint:
+                checkpoint.record_failed(endpoint, params, "error response")
+
+    print()
+
+    return payloads
+
+
+def parallel_api(
+    endpoints_params: list[tuple[str, dict[str, str]]],
+    max_workers: int = 32,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    on_payload: Optional[Callable[[Any], None]] = None,
+    split: Optional[Splitter] = None,
+) -> list[Any]:
+    """Drop-in replacement for the thread pool version in `get_data`.
+
+    `max_workers` is the number of requests allowed in flight at once, which is
+    also the size of the keep-alive connection pool they share. Pass the same
+    `limiter` to every call in a run so they share one requests-per-second budget.
+    Responses found in `cache` are returned without touching the network, and
+    each window is recorded in `checkpoint` the moment it finishes.
+
+    With `on_payload`, each payload is handed to it as soon as it arrives and
+    nothing is collected, so memory does not grow with the number of windows.
+
+    With `split`, a window whose payload `split` deems incomplete is fetched
+    again as smaller windows; the caller still gets one payload per window.
+    """
+    return asyncio.run(
+        async_parallel_api(
+            endpoints_params, max_workers, limiter, cache, checkpoint, on_payload, split
+        )
+    )
@@ -1,22 +1,47 @@
-import sys
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
-from os import environ
-from typing import Any, Optional
+import argparse
+import os
+import shutil
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional
 
 import pandas as pd
-import requests as rq
+import pyarrow as pa
+from amberdata_common.response_cache import ResponseCache
 from dateutil.relativedelta import relativedelta
 from dotenv import load_dotenv
 
+from checkpoint import Checkpoint
+from fee_resolver import BATCH_SIZE, RPC_URL, TX_ENDPOINT, resolve_fees, tx_endpoint
+from fetch import Splitter, parallel_api
 from lib import pandas_long
-
-
-def get_date_pairs(hours_delta: int) -> list[tuple[str, str]]:
-    start_date = datetime(2021, 1, 1)
-    end_date = datetime(2024, 1, 1)
-
+from ratelimit import DEFAULT_RPS, RateLimiter
+from sinks import ArrowStreamSink, read_staged, staging_sink
+from storage import (
+    SCHEMAS,
+    append_dataset,
+    drop_repeated,
+    newest_timestamp,
+    read_dataset,
+    write_batches,
+    write_dataset,
+)
+
+START_DATE = datetime(2021, 1, 1)
+END_DATE = datetime(2024, 1, 1)
+
+# Liquidations are requested a week at a time; windows that come back with a
+# full page are split until every row fits.
+LIQ_WINDOW_HOURS = 7 * 24
+LIQ_PAGE_SIZE = 990
+MIN_WINDOW = timedelta(minutes=1)
+
+
+def get_date_pairs(
+    hours_delta: int,
+    start_date: datetime = START_DATE,
+    end_date: datetime = END_DATE,
+) -> list[tuple[str, str]]:
     date_list = []
 
     current_date = start_date
@@ -24,6 +49,9 @@ def get_date_pairs(hours_delta: int) -> list[tuple[str, str]]:
         date_list.append(current_date.isoformat())
         current_date += relativedelta(hours=hours_delta)
 
+    if not date_list:
+        return []
+
     if not date_list[-1] == end_date.isoformat():
         date_list.append(end_date.isoformat())
 
@@ -32,82 +60,127 @@ def get_date_pairs(hours_delta: int) -> list[tuple[str, str]]:
     return date_pairs
 
 
-class Progress:
-    num_calls: int
-    current_call: int
-    lock: threading.Lock
-
-    def __init__(self, num_calls: int):
-        self.num_calls = num_calls
-        self.current_call = 0
-        self.lock = threading.Lock()
-
-    def next(self):
-        with self.lock:
-            self.current_call += 1
-            sys.stdout.write(f"\r[{self.current_call}/{self.num_calls}]")
-            sys.stdout.flush()
-
-
-def call_api(
-    endpoint: str, params: dict[str, str], progress: Optional[Progress]
-) -> Any:
-    headers = {
-        "accept": "application/json",
-        "x-api-key": environ["API_KEY"],
-    }
-
-    param_string = "&".join(f"{key}={value}" for key, value in params.items())
+def split_full_windows(page_size: int, min_window: timedelta = MIN_WINDOW) -> Splitter:
+    """Halve any window that returned a full page, since the API drops the rows
+    past `page_size` without saying so.
+    """
 
-    url = f"{endpoint}?{param_string}"
+    def split(params: dict[str, str], payload: Any) -> Optional[list[dict[str, str]]]:
+        if len(payload.get("data", [])) < page_size:
+            return None
 
-    while True:
-        response = rq.get(url, headers=headers)
-        json = response.json()
+        start = datetime.fromisoformat(params["startDate"])
+        end = datetime.fromisoformat(params["endDate"])
+        if end - start <= min_window:
+            print(f"{start} - {end} has over {page_size} rows, some may be missing")
+            return None
 
-        if "message" in json:
-            if json["message"] == "Too Many Requests":
-                continue
+        middle = (start + (end - start) / 2).replace(microsecond=0).isoformat()
+        return [params | {"endDate": middle}, params | {"startDate": middle}]
 
-        status = response.json()["status"]
-        if not status == 200:
-            print(f"error calling GET {url}")
-            return dict()
+    return split
 
-        if progress:
-            progress.next()
-        return response.json()["payload"]
 
-
-def parallel_api(
+def fetch_windows(
     endpoints_params: list[tuple[str, dict[str, str]]],
-    max_workers: int = 5,
+    max_workers: int,
+    limiter: Optional[RateLimiter],
+    cache: Optional[ResponseCache],
+    checkpoint: Optional[Checkpoint],
+    on_payload: Optional[Callable[[Any], None]] = None,
+    split: Optional[Splitter] = None,
 ) -> list[Any]:
-    payloads = []
-    prog = Progress(len(endpoints_params))
+    """`parallel_api`, skipping windows a previous run already finished and
+    retrying the ones it gave up on.
+
+    When streaming to `on_payload`, finished windows are only marked done in
+    the checkpoint (their rows are already in the sink) and nothing is returned.
+    """
+    if not checkpoint:
+        return parallel_api(
+            endpoints_params,
+            max_workers,
+            limiter,
+            cache,
+            on_payload=on_payload,
+            split=split,
+        )
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(call_api, endpoint, params, prog): (endpoint, params)
-            for endpoint, params in endpoints_params
+    endpoints_params = checkpoint.with_failed(endpoints_params)
+    parallel_api(
+        checkpoint.pending(endpoints_params),
+        max_workers,
+        limiter,
+        cache,
+        checkpoint,
+        on_payload,
+        split,
+    )
+    if checkpoint.failed:
+        print(f"{len(checkpoint.failed)} windows failed, rerun to retry them")
+    if on_payload:
+        return []
+    return checkpoint.payloads(endpoints_params)
+
+
+def concat_data(payloads: list[Any], columns: list[str]) -> pd.DataFrame:
+    frames = [pd.DataFrame(p["data"], columns=columns) for p in payloads]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+LIQ_FIELDS = [
+    "transactionHash",
+    "timestamp",
+    "principalAssetSymbol",
+    "principalAmountNative",
+    "collateralAssetId",
+    "collateralAmountNative",
+    "liquidator",
+]
+ETH_FIELDS = ["timestamp", "price"]
+FEE_FIELDS = ["hash", "gasUsed", "gasPrice"]
+
+
+def liq_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "transaction_hash": df["transactionHash"],
+            "timestamp": pd.to_datetime(df["timestamp"] * 10**6),
+            "debt_asset": df["principalAssetSymbol"],
+            "debt_to_cover": df["principalAmountNative"],
+            "collateral_asset": df["collateralAssetId"],
+            "liquidated_collateral_amount": df["collateralAmountNative"],
+            "liquidator": df["liquidator"],
         }
+    )
+
 
-        for future in as_completed(futures):
-            try:
-                payload = future.result()
-                if payload:
-                    payloads.append(payload)
-            except Exception as e:
-                print(f"exception {e}")
+def eth_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(df["timestamp"] * 10**6),
+            "price": df["price"],
+        }
+    )
 
-    print()
 
-    return payloads
+def fee_frame(payloads: list[Any]) -> pd.DataFrame:
+    return pd.DataFrame(payloads, columns=FEE_FIELDS)
 
 
-def get_liq_calls() -> pd.DataFrame:
+def get_liq_calls(
+    start_date: datetime = START_DATE,
+    end_date: datetime = END_DATE,
+    max_workers: int = 32,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    sink: Optional[ArrowStreamSink] = None,
+) -> Optional[pd.DataFrame]:
     endpoint = "https://api.amberdata.com/defi/lending/aavev2/assets/WETH"
-    dates = get_date_pairs(hours_delta=6)
+    dates = get_date_pairs(LIQ_WINDOW_HOURS, start_date, end_date)
     endpoints_params = [
         (
             endpoint,
@@ -116,34 +189,45 @@ def get_liq_calls() -> pd.DataFrame:
                 "endDate": end,
                 "timeFormat": "ms",
                 "action": "LiquidationCall",
-                "size": "990",
+                "size": str(LIQ_PAGE_SIZE),
             },
         )
         for start, end in dates
     ]
+    split = split_full_windows(LIQ_PAGE_SIZE)
 
     print("collecting liquidation data")
-    payloads = parallel_api(endpoints_params, max_workers=11)
-
-    df = pd.concat([pd.DataFrame(p["data"]) for p in payloads], ignore_index=True)
+    if sink:
+        fetch_windows(
+            endpoints_params,
+            max_workers,
+            limiter,
+            cache,
+            checkpoint,
+            lambda p: sink.write(
+                liq_frame(pd.DataFrame(p["data"], columns=LIQ_FIELDS))
+            ),
+            split,
+        )
+        return None
 
-    new = pd.DataFrame(
-        {
-            "transaction_hash": df["transactionHash"],
-            "timestamp": pd.to_datetime(df["timestamp"] * 10**6),
-            "debt_asset": df["principalAssetSymbol"],
-            "debt_to_cover": df["principalAmountNative"],
-            "collateral_asset": df["collateralAssetId"],
-            "liquidated_collateral_amount": df["collateralAmountNative"],
-            "liquidator": df["liquidator"],
-        }
+    payloads = fetch_windows(
+        endpoints_params, max_workers, limiter, cache, checkpoint, split=split
     )
-    return new
-
-
-def get_eth_minutely() -> pd.DataFrame:
+    return liq_frame(concat_data(payloads, LIQ_FIELDS))
+
+
+def get_eth_minutely(
+    start_date: datetime = START_DATE,
+    end_date: datetime = END_DATE,
+    max_workers: int = 32,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    sink: Optional[ArrowStreamSink] = None,
+) -> Optional[pd.DataFrame]:
     endpoint = "https://api.amberdata.com/market/spot/prices/assets/eth/historical/"
-    dates = get_date_pairs(hours_delta=24)
+    dates = get_date_pairs(24, start_date, end_date)
     endpoints_params = [
         (
             endpoint,
@@ -158,58 +242,248 @@ def get_eth_minutely() -> pd.DataFrame:
     ]
 
     print("collecting ethereum price data")
-    payloads = parallel_api(endpoints_params, max_workers=11)
-
-    df = pd.concat([pd.DataFrame(p["data"]) for p in payloads], ignore_index=True)
+    if sink:
+        fetch_windows(
+            endpoints_params,
+            max_workers,
+            limiter,
+            cache,
+            checkpoint,
+            lambda p: sink.write(
+                eth_frame(pd.DataFrame(p["data"], columns=ETH_FIELDS))
+            ),
+        )
+        return None
+
+    payloads = fetch_windows(endpoints_params, max_workers, limiter, cache, checkpoint)
+    return eth_frame(concat_data(payloads, ETH_FIELDS))
+
+
+def get_tx_fees(
+    txs: pd.Series,
+    max_workers: int = 32,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    sink: Optional[ArrowStreamSink] = None,
+    rpc_url: str = RPC_URL,
+    batch_size: int = BATCH_SIZE,
+) -> Optional[pd.DataFrame]:
+    endpoints_params = [(tx_endpoint(tx), dict()) for tx in txs]
+    if checkpoint:
+        endpoints_params = checkpoint.with_failed(endpoints_params)
+        txs = [
+            endpoint[len(TX_ENDPOINT) :]
+            for endpoint, _ in checkpoint.pending(endpoints_params)
+        ]
 
-    new = pd.DataFrame(
-        {
-            "timestamp": pd.to_datetime(df["timestamp"] * 10**6),
-            "price": df["price"],
-        }
+    print("collecting transaction fee data")
+    fees, unresolved = resolve_fees(
+        list(txs),
+        rpc_url,
+        batch_size,
+        max_workers,
+        limiter,
+        cache,
+        checkpoint,
+        (lambda batch: sink.write(fee_frame(batch))) if sink else None,
     )
-    return new
 
+    # transactions the RPC node could not return fall back to one REST call each
+    payloads = []
+    if unresolved:
+        print(f"{len(unresolved)} transactions not found over RPC, using REST")
+        payloads = fetch_windows(
+            [(tx_endpoint(tx), dict()) for tx in unresolved],
+            max_workers,
+            limiter,
+            cache,
+            checkpoint,
+            (lambda p: sink.write(fee_frame([p]))) if sink else None,
+        )
 
-def get_tx_fees(txs: pd.Series) -> pd.DataFrame:
-    endpoints_params = [
-        (f"https://api.amberdata.com/blockchains/transactions/{tx}", dict())
-        for tx in txs
-    ]
+    if sink:
+        return None
+    if checkpoint:
+        return fee_frame(checkpoint.payloads(endpoints_params))
+    return fee_frame(fees + payloads)
 
-    print("collecting transaction fee data")
-    payloads = parallel_api(endpoints_params, max_workers=11)
 
-    df = pd.concat(
-        [pd.DataFrame([p]) for p in payloads],
-        ignore_index=True,
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--start",
+        type=datetime.fromisoformat,
+        default=START_DATE,
+        help="first date to fetch (ISO format)",
     )
-
-    new = pd.DataFrame(
-        {
-            "hash": df["hash"],
-            "gasUsed": df["gasUsed"],
-            "gasPrice": df["gasPrice"],
-        }
+    parser.add_argument(
+        "--end",
+        type=datetime.fromisoformat,
+        default=None,
+        help=f"last date to fetch (default {END_DATE.date()}, or now with --append)",
     )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="only fetch data newer than what is already in data/",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="discard checkpoints left by an interrupted run instead of resuming",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="write each page to disk as it arrives instead of holding the "
+        "whole dataset in memory",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=32,
+        help="number of requests in flight at once",
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        default=DEFAULT_RPS,
+        help="requests per second budget for the API key",
+    )
+    parser.add_argument(
+        "--rpc-url",
+        default=RPC_URL,
+        help="JSON-RPC endpoint used for batched transaction receipt lookups",
+    )
+    parser.add_argument(
+        "--rpc-batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help="transaction receipts requested per JSON-RPC call",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always call the API instead of reusing cached responses",
+    )
+    args = parser.parse_args()
 
-    return new
-
-
-def main():
     pandas_long()
     load_dotenv()
 
-    liqs = get_liq_calls()
-    liqs.to_csv("data/liquidations.csv", index=False)
+    limiter = RateLimiter(args.rps)
+    cache = None if args.no_cache else ResponseCache()
 
-    fees = get_tx_fees(
-        pd.Series(liqs[~liqs["transaction_hash"].duplicated()]["transaction_hash"])
-    )
-    fees.to_csv("data/transaction_fees.csv", index=False)
+    names = ("liquidations", "transaction_fees", "ether_price")
+    # streamed checkpoints only mark windows done, their rows live in staging
+    checkpoints = {
+        name: Checkpoint(f"{name}.stream" if args.stream else name) for name in names
+    }
+    staging = {name: os.path.join("data", "staging", name) for name in names}
+    if args.fresh:
+        for name, checkpoint in checkpoints.items():
+            checkpoint.clear()
+            checkpoints[name] = Checkpoint(checkpoint.name)
+            shutil.rmtree(staging[name], ignore_errors=True)
+
+    # naive UTC, like the API's window boundaries and the stored timestamps
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    end_date = args.end or (now if args.append else END_DATE)
+    liq_start = eth_start = args.start
+    if args.append:
+        liq_start = newest_timestamp("liquidations") or args.start
+        eth_start = newest_timestamp("ether_price") or args.start
+
+    def sink(name: str):
+        if args.stream:
+            return staging_sink(staging[name], SCHEMAS[name])
+        return nullcontext()
+
+    def save(name: str, df: Optional[pd.DataFrame]) -> bool:
+        # keep a partial result out of data/: an --append run starts after the
+        # newest stored row, and the checkpoint keeps the rows fetched so far
+        checkpoint = checkpoints[name]
+        if checkpoint.failed:
+            print(f"not saving {name}, {len(checkpoint.failed)} windows failed")
+            return False
+
+        if args.stream:
+            batches = read_staged(staging[name], SCHEMAS[name])
+            if args.append:
+                df = pa.Table.from_batches(
+                    drop_repeated(name, batches), SCHEMAS[name]
+                ).to_pandas()
+            else:
+                write_batches(name, batches)
+
+        if df is not None:
+            if args.append:
+                append_dataset(name, df)
+            else:
+                write_dataset(name, df)
+
+        checkpoint.clear()
+        shutil.rmtree(staging[name], ignore_errors=True)
+        return True
+
+    with sink("liquidations") as liq_sink:
+        liqs = get_liq_calls(
+            liq_start,
+            end_date,
+            args.max_workers,
+            limiter,
+            cache,
+            checkpoints["liquidations"],
+            liq_sink,
+        )
+    saved = save("liquidations", liqs)
+
+    if liqs is None and saved:
+        liqs = read_dataset("liquidations", columns=["transaction_hash"])
+    elif liqs is None:
+        # streamed rows stay staged until every window is in
+        liqs = (
+            pa.Table.from_batches(
+                read_staged(staging["liquidations"], SCHEMAS["liquidations"]),
+                SCHEMAS["liquidations"],
+            )
+            .select(["transaction_hash"])
+            .to_pandas()
+        )
+    txs = pd.Series(liqs[~liqs["transaction_hash"].duplicated()]["transaction_hash"])
+    if args.append and os.path.exists("data/transaction_fees"):
+        known = read_dataset("transaction_fees", columns=["hash"])["hash"]
+        txs = txs[~txs.isin(known)]
+
+    with sink("transaction_fees") as fee_sink:
+        fees = get_tx_fees(
+            txs,
+            args.max_workers,
+            limiter,
+            cache,
+            checkpoints["transaction_fees"],
+            fee_sink,
+            args.rpc_url,
+            args.rpc_batch_size,
+        )
+    save("transaction_fees", fees)
+
+    with sink("ether_price") as eth_sink:
+        eth = get_eth_minutely(
+            eth_start,
+            end_date,
+            args.max_workers,
+            limiter,
+            cache,
+            checkpoints["ether_price"],
+            eth_sink,
+        )
+    save("ether_price", eth)
 
-    eth = get_eth_minutely()
-    eth.to_csv("data/ether_price.csv", index=False)
+    print(limiter.report())
+    if cache:
+        print(cache.report())
 
 
 if __name__ == "__main__":
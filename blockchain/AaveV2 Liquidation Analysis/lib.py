@@ -3,6 +3,8 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
 
+from storage import read_dataset
+
 
 def filter_dates(df: pd.DataFrame, start: str, end: str) -> pd.DataFrame:
     df = pd.DataFrame(df[df.index > pd.to_datetime(start)])
@@ -13,20 +15,21 @@ def filter_dates(df: pd.DataFrame, start: str, end: str) -> pd.DataFrame:
 def get_data(
     start_date: str = "6/1/2021", end_date: str = "6/1/2022"
 ) -> dict[str, pd.DataFrame | pd.Series]:
-    eth = pd.read_csv(
-        "data/ether_price.csv", parse_dates=True, index_col=0
-    ).sort_index()
+    # the outlier quantiles are taken over the whole series, not just the
+    # requested range, so the full history is read
+    eth = read_dataset("ether_price", columns=["timestamp", "price"])
+    eth = eth.set_index("timestamp").sort_index()
     eth["percent_change"] = eth["price"].pct_change()
     eth = eth[
         (eth["percent_change"].quantile(0.01) < eth["percent_change"])
         & (eth["percent_change"] < eth["percent_change"].quantile(0.99))
     ]
 
-    fees = pd.read_csv("data/transaction_fees.csv")
+    fees = read_dataset("transaction_fees")
     fees = fees.set_index("hash")
     fees = pd.Series((fees["gasUsed"] * fees["gasPrice"]) / 10**18)
 
-    liq = pd.read_csv("data/liquidations.csv")
+    liq = read_dataset("liquidations")
     liq = liq.set_index("transaction_hash")
 
     eth = filter_dates(eth, start_date, end_date)
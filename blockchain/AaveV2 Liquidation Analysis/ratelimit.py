@@ -0,0 +1,137 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+DEFAULT_RPS = 20.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """`Retry-After` is either a number of seconds or an HTTP date."""
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token bucket shared by every worker hitting the same API key.
+
+    `rps` is the configured budget. Each 429 halves the effective rate (down to
+    `min_rps`) and pauses all callers for the server's `Retry-After`, or for a
+    jittered exponential backoff when the server does not send one. Successful
+    calls creep the rate back up to the budget.
+
+    `acquire` is for threads and `acquire_async` for coroutines; both can be
+    used on the same instance at once.
+    """
+
+    rps: float
+    burst: float
+    min_rps: float
+    rate: float
+    tokens: float
+    last_refill: float
+    blocked_until: float
+    consecutive_429s: int
+    lock: threading.Lock
+
+    def __init__(
+        self,
+        rps: float,
+        burst: Optional[float] = None,
+        min_rps: float = 1.0,
+        base_backoff: float = 0.5,
+        max_backoff: float = 60.0,
+    ):
+        self.rps = rps
+        self.burst = burst if burst is not None else max(rps, 1.0)
+        self.min_rps = min(min_rps, rps)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.rate = rps
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.consecutive_429s = 0
+        self.lock = threading.Lock()
+
+        self.num_requests = 0
+        self.num_throttled = 0
+        self.total_wait = 0.0
+        self.started = time.monotonic()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            # while a 429 block is in force `last_refill` sits at its end, so
+            # no tokens build up and the callers queued behind the block are
+            # spaced out at `rate` when it lifts instead of all firing at once
+            if now > self.last_refill:
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.last_refill) * self.rate
+                )
+                self.last_refill = now
+            self.tokens -= 1
+            self.num_requests += 1
+
+            wait = max(self.last_refill - now, 0.0) + max(-self.tokens, 0.0) / self.rate
+            self.total_wait += wait
+            return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttled(self, retry_after: Optional[float] = None):
+        """Record a 429 from the server."""
+        with self.lock:
+            self.num_throttled += 1
+            self.consecutive_429s += 1
+            self.rate = max(self.rate / 2, self.min_rps)
+
+            if retry_after is None:
+                ceiling = min(
+                    self.max_backoff,
+                    self.base_backoff * 2 ** (self.consecutive_429s - 1),
+                )
+                retry_after = random.uniform(ceiling / 2, ceiling)
+
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            # drain the bucket down to the one request allowed when the block lifts
+            self.tokens = min(self.tokens, 1.0)
+            self.last_refill = max(self.last_refill, self.blocked_until)
+
+    def succeeded(self):
+        with self.lock:
+            self.consecutive_429s = 0
+            self.rate = min(self.rps, self.rate + self.rps / 20)
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            return (
+                f"requests: {self.num_requests}, "
+                f"throttled (429): {self.num_throttled}, "
+                f"time spent waiting (all workers): {self.total_wait:.1f}s, "
+                f"effective rate: {self.num_requests / max(elapsed, 1e-9):.1f} rps "
+                f"(budget {self.rps:g} rps, currently {self.rate:.1f} rps)"
+            )
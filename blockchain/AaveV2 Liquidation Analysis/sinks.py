@@ -0,0 +1,94 @@
+"""Staging files written one page of results at a time.
+
+Used with `parallel_api(..., on_payload=...)` so each page is converted to a
+columnar batch and written out as soon as it arrives, instead of keeping every
+payload in memory until the end of the run.
+"""
+
+import glob
+import os
+import time
+from typing import Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+
+def typed_table(schema: pa.Schema, df: pd.DataFrame) -> pa.Table:
+    """Coerce `df` to `schema`; the API returns some numbers as strings."""
+    df = df[schema.names].copy()
+
+    for field in schema:
+        if pa.types.is_timestamp(field.type):
+            df[field.name] = pd.to_datetime(df[field.name])
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(df[field.name])
+
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+class ArrowStreamSink:
+    """Arrow IPC stream. Each page is flushed as its own record batch, so the
+    file stays readable up to the last complete page if the run is killed.
+    """
+
+    schema: pa.Schema
+    path: str
+    rows: int
+
+    def __init__(self, path: str, schema: pa.Schema):
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, "wb")
+        self.writer = pa.ipc.new_stream(self.file, schema)
+
+    def write(self, df: pd.DataFrame):
+        table = typed_table(self.schema, df)
+        if table.num_rows:
+            for batch in table.to_batches():
+                self.writer.write_batch(batch)
+            self.file.flush()
+            self.rows += table.num_rows
+
+    def close(self):
+        self.writer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def staging_sink(directory: str, schema: pa.Schema) -> ArrowStreamSink:
+    """A new stream file in `directory`, so a resumed run adds to the pages an
+    interrupted run already wrote instead of overwriting them.
+    """
+    return ArrowStreamSink(os.path.join(directory, f"{time.time_ns()}.arrows"), schema)
+
+
+def read_staged(
+    directory: str, schema: Optional[pa.Schema] = None
+) -> Iterator[pa.RecordBatch]:
+    """Every complete record batch in the stream files of `directory`."""
+    for path in sorted(glob.glob(os.path.join(directory, "*.arrows"))):
+        with pa.OSFile(path) as source:
+            try:
+                reader = pa.ipc.open_stream(source)
+            except pa.ArrowInvalid:
+                # killed before the schema was written
+                continue
+
+            while True:
+                try:
+                    batch = reader.read_next_batch()
+                except StopIteration:
+                    break
+                except (pa.ArrowInvalid, OSError):
+                    # a batch cut short when the run was killed
+                    break
+                yield batch if schema is None else batch.cast(schema)
@@ -0,0 +1,268 @@
+"""Parquet storage for the datasets in `data/`.
+
+Time series are written as hive-partitioned Parquet (`year=2021/month=5/...`)
+with a fixed schema, so reads only open the partitions and row groups that
+overlap the requested date range, and only decode the requested columns.
+
+Run `python -m storage` to convert CSVs written by older versions of
+`get_data.py`.
+"""
+
+import os
+import shutil
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from sinks import typed_table
+
+DATA_DIR = "data"
+TIME_COLUMN = "timestamp"
+
+SCHEMAS = {
+    "liquidations": pa.schema(
+        [
+            ("transaction_hash", pa.string()),
+            ("timestamp", pa.timestamp("ms")),
+            ("debt_asset", pa.string()),
+            ("debt_to_cover", pa.float64()),
+            ("collateral_asset", pa.string()),
+            ("liquidated_collateral_amount", pa.float64()),
+            ("liquidator", pa.string()),
+        ]
+    ),
+    "transaction_fees": pa.schema(
+        [
+            ("hash", pa.string()),
+            ("gasUsed", pa.int64()),
+            ("gasPrice", pa.int64()),
+        ]
+    ),
+    "ether_price": pa.schema(
+        [
+            ("timestamp", pa.timestamp("ms")),
+            ("price", pa.float64()),
+        ]
+    ),
+}
+
+# the columns that identify a row; a liquidation transaction can close several
+# positions, so only a fully identical liquidation row is a repeat
+NATURAL_KEYS = {
+    "liquidations": SCHEMAS["liquidations"].names,
+    "transaction_fees": ["hash"],
+    "ether_price": ["timestamp"],
+}
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive"
+)
+
+
+def dataset_path(name: str, root: str = DATA_DIR) -> str:
+    return os.path.join(root, name)
+
+
+def is_partitioned(name: str) -> bool:
+    return TIME_COLUMN in SCHEMAS[name].names
+
+
+def with_partition_columns(table: pa.Table | pa.RecordBatch) -> pa.Table:
+    timestamps = table[TIME_COLUMN]
+    return (
+        (pa.Table.from_batches([table]) if isinstance(table, pa.RecordBatch) else table)
+        .append_column("year", pc.cast(pc.year(timestamps), pa.int16()))
+        .append_column("month", pc.cast(pc.month(timestamps), pa.int8()))
+    )
+
+
+def to_table(name: str, df: pd.DataFrame) -> pa.Table:
+    table = typed_table(SCHEMAS[name], df)
+
+    if is_partitioned(name):
+        table = with_partition_columns(table.sort_by(TIME_COLUMN))
+
+    return table
+
+
+def write_dataset(name: str, df: pd.DataFrame, root: str = DATA_DIR):
+    """Replace the stored dataset `name` with `df`."""
+    path = dataset_path(name, root)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    _write(name, to_table(name, df), path)
+
+
+def drop_repeated(
+    name: str, batches: Iterable[pa.RecordBatch]
+) -> Iterator[pa.RecordBatch]:
+    """Skip rows whose natural key was already seen in an earlier row.
+
+    Staged pages can repeat: a run killed after writing a page but before its
+    window was checkpointed fetches and stages that window again on resume.
+    Only the keys are kept in memory, not the rows.
+    """
+    key = NATURAL_KEYS[name]
+    seen = set()
+    for batch in batches:
+        keep = []
+        for row in zip(*(batch.column(column).to_pylist() for column in key)):
+            keep.append(row not in seen)
+            seen.add(row)
+        if all(keep):
+            yield batch
+        elif any(keep):
+            yield batch.filter(pa.array(keep))
+
+
+def write_batches(name: str, batches: Iterable[pa.RecordBatch], root: str = DATA_DIR):
+    """Replace the stored dataset `name` with `batches`, one batch at a time, so
+    the whole dataset never has to fit in memory. Rows repeating a natural key
+    are dropped.
+    """
+    path = dataset_path(name, root)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    batches = drop_repeated(name, batches)
+
+    if not is_partitioned(name):
+        os.makedirs(path, exist_ok=True)
+        with pq.ParquetWriter(
+            os.path.join(path, "part-0.parquet"), SCHEMAS[name], compression="zstd"
+        ) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+        return
+
+    partitioned = (
+        batch
+        for table in map(with_partition_columns, batches)
+        for batch in table.to_batches()
+    )
+    schema = (
+        SCHEMAS[name]
+        .append(pa.field("year", pa.int16()))
+        .append(pa.field("month", pa.int8()))
+    )
+    _write(name, pa.RecordBatchReader.from_batches(schema, partitioned), path)
+
+
+def append_dataset(name: str, df: pd.DataFrame, root: str = DATA_DIR):
+    """Merge `df` into the stored dataset, dropping exact duplicate rows.
+
+    Only the partitions that `df` touches are read and rewritten.
+    """
+    path = dataset_path(name, root)
+    if not os.path.exists(path):
+        write_dataset(name, df, root)
+        return
+
+    new = to_table(name, df)
+    if is_partitioned(name):
+        months = set(zip(new["year"].to_pylist(), new["month"].to_pylist()))
+        touched = pc.field("year") < 0
+        for year, month in months:
+            touched = touched | (
+                (pc.field("year") == year) & (pc.field("month") == month)
+            )
+        old = ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+        old = old.to_table(filter=touched)
+    else:
+        old = pq.read_table(os.path.join(path, "part-0.parquet"))
+
+    merged = pa.concat_tables([old, new.select(old.column_names)])
+    merged = pa.Table.from_pandas(
+        merged.to_pandas().drop_duplicates(),
+        schema=merged.schema,
+        preserve_index=False,
+    )
+    if is_partitioned(name):
+        merged = merged.sort_by(TIME_COLUMN)
+
+    _write(name, merged, path)
+
+
+def _write(name: str, table: pa.Table | pa.RecordBatchReader, path: str):
+    if not is_partitioned(name):
+        os.makedirs(path, exist_ok=True)
+        pq.write_table(table, os.path.join(path, "part-0.parquet"), compression="zstd")
+        return
+
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        min_rows_per_group=64 * 1024,
+        max_rows_per_group=64 * 1024,
+    )
+
+
+def read_dataset(
+    name: str,
+    start: Optional[str | datetime] = None,
+    end: Optional[str | datetime] = None,
+    columns: Optional[list[str]] = None,
+    root: str = DATA_DIR,
+) -> pd.DataFrame:
+    """Load rows strictly between `start` and `end` (the same bounds as
+    `lib.filter_dates`), reading only `columns`.
+    """
+    path = dataset_path(name, root)
+    columns = columns or SCHEMAS[name].names
+
+    if not is_partitioned(name):
+        return pq.read_table(
+            os.path.join(path, "part-0.parquet"), columns=columns
+        ).to_pandas()
+
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+
+    expression = None
+    if start is not None:
+        start = pd.to_datetime(start)
+        expression = (pc.field("year") >= start.year) & (
+            pc.field(TIME_COLUMN) > pa.scalar(start, pa.timestamp("ms"))
+        )
+    if end is not None:
+        end = pd.to_datetime(end)
+        before_end = (pc.field("year") <= end.year) & (
+            pc.field(TIME_COLUMN) < pa.scalar(end, pa.timestamp("ms"))
+        )
+        expression = before_end if expression is None else expression & before_end
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def newest_timestamp(name: str, root: str = DATA_DIR) -> Optional[datetime]:
+    path = dataset_path(name, root)
+    if not os.path.exists(path):
+        return None
+
+    timestamps = ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+    newest = pc.max(timestamps.to_table(columns=[TIME_COLUMN])[TIME_COLUMN])
+    if not newest.is_valid:
+        return None
+    return newest.as_py()
+
+
+def convert_csvs(root: str = DATA_DIR):
+    """Write a Parquet dataset for every `<name>.csv` found in `root`."""
+    for name in SCHEMAS:
+        csv_path = os.path.join(root, f"{name}.csv")
+        if os.path.exists(csv_path):
+            print(f"converting {csv_path}")
+            write_dataset(name, pd.read_csv(csv_path), root)
+
+
+if __name__ == "__main__":
+    convert_csvs()
@@ -1,11 +1,26 @@
 import requests
 import csv
+import json
 from datetime import datetime, timedelta
 
+from amberdata_common.response_cache import ResponseCache, window_ttl
+
 # Set your API Key and Instrument Name here
 api_key = "Your_API_Key_Here"
 instrument_name = "BTCUSDT"  
 
+# Local cache of API responses, so re-runs only fetch the months that are still open
+cache = ResponseCache()
+
+def cached_get(url, headers):
+    cached = cache.get(url)
+    if cached is not None:
+        return 200, cached
+    response = requests.get(url, headers=headers)
+    if response.status_code == 200:
+        cache.put(url, None, response.text, window_ttl(url))
+    return response.status_code, response.text
+
 def format_date(date):
     return date.strftime("%Y-%m-%dT%H:%M:%S")
 
@@ -15,9 +30,9 @@ def get_oldest_start_date():
         "accept": "application/json",
         "x-api-key": api_key
     }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        data = response.json()['payload']['data']
+    status_code, text = cached_get(url, headers)
+    if status_code == 200:
+        data = json.loads(text)['payload']['data']
         oldest_date = datetime.now()
         for exchange in data:
             if 'open_interest' in data[exchange][instrument_name]:
@@ -27,7 +42,7 @@ def get_oldest_start_date():
                     oldest_date = start_date
         return oldest_date
     else:
-        print(f"Failed to fetch start date. Error: {response.text}")
+        print(f"Failed to fetch start date. Error: {text}")
         return None
 
 def get_data(start_date, end_date):
@@ -36,11 +51,11 @@ def get_data(start_date, end_date):
         "accept": "application/json",
         "x-api-key": api_key
     }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        return response.json()['payload']['data']
+    status_code, text = cached_get(url, headers)
+    if status_code == 200:
+        return json.loads(text)['payload']['data']
     else:
-        print(f"Failed to fetch data for range {start_date} to {end_date}. Error: {response.text}")
+        print(f"Failed to fetch data for range {start_date} to {end_date}. Error: {text}")
         return []
 
 # Start the timer
@@ -75,4 +90,5 @@ end_time = datetime.now()
 
 # Calculate and print the total runtime
 total_runtime = end_time - start_time
-print(f"Data retrieval complete. CSV file '{csv_file_name}' created. Total runtime: {total_runtime}")
\ No newline at end of file
+print(f"Data retrieval complete. CSV file '{csv_file_name}' created. Total runtime: {total_runtime}")
+print(cache.report())
\ No newline at end of file
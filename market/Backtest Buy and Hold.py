@@ -3,11 +3,8 @@
 # ======================================================================================================================
 
 import backtrader as bt
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-import io
-import pandas as pd
-import requests
+from amberdata_common.amberdata_loader import AmberdataLoader
+from amberdata_common.backtest_report import add_analyzers, backtest_report, format_report, save_report
 
 # ======================================================================================================================
 # CONFIGURATION
@@ -16,6 +13,9 @@ import requests
 # Set your Amberdata API_KEY here
 Amberdata_API_KEY = 'YOUR_API_KEY'
 
+# Market data, with API responses kept in a local cache (set AMBERDATA_CACHE to move it)
+loader = AmberdataLoader(Amberdata_API_KEY)
+
 # Set initial capital
 icap = 100000
 
@@ -29,6 +29,15 @@ PercTrail = 0.40
 start_date = "2015-04-21"
 end_date = "2020-05-09"
 
+# Stock to flow model to compare the close with (see amberdata_common.amberdata_loader.STF_MODELS)
+stf_model = "valuations"
+
+# Where each run writes its report: JSON metrics, Parquet transactions and value, and an HTML page
+report_dir = "reports"
+
+# Also open backtrader's interactive chart after the run (needs a display)
+show_plot = False
+
 
 # ======================================================================================================================
 # HELPERS - DATA SOURCES
@@ -43,119 +52,6 @@ class CustomPandas(bt.feeds.PandasData):
     #params = (('stf2sd', 8),)
     params = (('stf', 8),)
 
-# Call Amberdata's API
-def amberdata(url, queryString, apiKey):
-    try:
-        headers = {'x-api-key': apiKey}
-        response = requests.request("GET", url, headers=headers, params=queryString)
-        return response.text
-    except Exception as e:
-        raise e
-
-# Get Market data from Amberdata
-def amberdata_ohlcv(exchange, symbol, startDate, endDate):
-    format = "%Y-%m-%dT%H:%M:%S"
-    startTimestamp = datetime.strptime(startDate, '%Y-%m-%d')
-    endTimestamp = datetime.strptime(endDate, '%Y-%m-%d')
-
-    current = startTimestamp
-    next = current
-    fields = "timestamp,open,high,low,close,volume"
-    payload = fields
-    while (current < endTimestamp):
-        next += relativedelta(years=1)
-        if (next > endTimestamp):
-            next = endTimestamp
-        print('Retrieving OHLCV between', current, ' and ', next)
-        result = amberdata(
-            "https://web3api.io/api/v2/market/ohlcv/" + symbol + "/historical",
-            {"exchange": exchange, "timeInterval": "days", "timeFormat": "iso", "format": "raw_csv", "fields": fields, "startDate": current.strftime(format), "endDate": next.strftime(format)},
-            Amberdata_API_KEY
-        )
-        payload += "\n" + result
-        current = next
-
-    return payload
-
-# Get On-chain data from Amberdata - Stock to flow valuation model
-def amberdata_stf(symbol, startDate, endDate):
-    print('Retrieving STF between', startDate, ' and ', endDate)
-    return amberdata(
-        "https://web3api.io/api/v2/market/metrics/" + symbol + "/valuations/historical",
-        {"format": "csv", "timeFrame": "day", "startDate": startDate, "endDate": endDate},
-        Amberdata_API_KEY
-    )
-
-def to_pandas(csv):
-    return pd.read_csv(io.StringIO(csv), index_col='timestamp', parse_dates=True)
-
-
-# ======================================================================================================================
-# HELPERS - TRADING
-# ======================================================================================================================
-
-def pretty_print(format, *args):
-    print(format.format(*args))
-
-def exists(object, *properties):
-    for property in properties:
-        if not property in object: return False
-        object = object.get(property)
-    return True
-
-def printTradeAnalysis(cerebro, analyzers):
-    format = "  {:<24} : {:<24}"
-    NA     = '-'
-
-    print('Backtesting Results')
-    if hasattr(analyzers, 'ta'):
-        ta = analyzers.ta.get_analysis()
-
-        openTotal         = ta.total.open          if exists(ta, 'total', 'open'  ) else None
-        closedTotal       = ta.total.closed        if exists(ta, 'total', 'closed') else None
-        wonTotal          = ta.won.total           if exists(ta, 'won',   'total' ) else None
-        lostTotal         = ta.lost.total          if exists(ta, 'lost',  'total' ) else None
-
-        streakWonLongest  = ta.streak.won.longest  if exists(ta, 'streak', 'won',  'longest') else None
-        streakLostLongest = ta.streak.lost.longest if exists(ta, 'streak', 'lost', 'longest') else None
-
-        pnlNetTotal       = ta.pnl.net.total       if exists(ta, 'pnl', 'net', 'total'  ) else None
-        pnlNetAverage     = ta.pnl.net.average     if exists(ta, 'pnl', 'net', 'average') else None
-
-        pretty_print(format, 'Open Positions', openTotal   or NA)
-        pretty_print(format, 'Closed Trades',  closedTotal or NA)
-        pretty_print(format, 'Winning Trades', wonTotal    or NA)
-        pretty_print(format, 'Loosing Trades', lostTotal   or NA)
-        print('\n')
-
-        pretty_print(format, 'Longest Winning Streak',   streakWonLongest  or NA)
-        pretty_print(format, 'Longest Loosing Streak',   streakLostLongest or NA)
-        pretty_print(format, 'Strike Rate (Win/closed)', (wonTotal / closedTotal) * 100 if wonTotal and closedTotal else NA)
-        print('\n')
-
-        pretty_print(format, 'Inital Portfolio Value', '${}'.format(icap))
-        pretty_print(format, 'Final Portfolio Value',  '${}'.format(cerebro.broker.getvalue()))
-        pretty_print(format, 'Net P/L',                '${}'.format(round(pnlNetTotal,   2)) if pnlNetTotal   else NA)
-        pretty_print(format, 'P/L Average per trade',  '${}'.format(round(pnlNetAverage, 2)) if pnlNetAverage else NA)
-        print('\n')
-
-    if hasattr(analyzers, 'drawdown'):
-        pretty_print(format, 'Drawdown', '${}'.format(analyzers.drawdown.get_analysis()['drawdown']))
-    if hasattr(analyzers, 'sharpe'):
-        pretty_print(format, 'Sharpe Ratio:', analyzers.sharpe.get_analysis()['sharperatio'])
-    if hasattr(analyzers, 'vwr'):
-        pretty_print(format, 'VRW', analyzers.vwr.get_analysis()['vwr'])
-    if hasattr(analyzers, 'sqn'):
-        pretty_print(format, 'SQN', analyzers.sqn.get_analysis()['sqn'])
-    print('\n')
-
-    print('Transactions')
-    format = "  {:<24} {:<24} {:<16} {:<8} {:<8} {:<16}"
-    pretty_print(format, 'Date', 'Amount', 'Price', 'SID', 'Symbol', 'Value')
-    for key, value in analyzers.txn.get_analysis().items():
-        pretty_print(format, key.strftime("%Y/%m/%d %H:%M:%S"), value[0][0], value[0][1], value[0][2], value[0][3], value[0][4])
-
-
 # ======================================================================================================================
 # STRATEGY
 # ======================================================================================================================
@@ -191,30 +87,27 @@ cerebro.addsizer(bt.sizers.PercentSizer, percents=PercSize)
 cerebro.addstrategy(Strategy)
 
 # Read market and on-chain data into dataframe
-btc = to_pandas(amberdata_ohlcv("gdax", "btc_usd", start_date, end_date))
-btc_stf = to_pandas(amberdata_stf("btc", start_date, end_date))
-btc['stf'] = btc_stf['stockToFlow_price']
+btc = loader.ohlcv_stf("gdax", "btc_usd", "btc", start_date, end_date, stf_model)
 
 # Feed Cerebro our data
 #cerebro.adddata(CustomPandas(dataname=btc, openinterest=None, stf2sd='stf2sd'))
 cerebro.adddata(CustomPandas(dataname=btc, openinterest=None, stf='stf'))
 
 # Add analyzers
-cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='ta')
-cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
-cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe', riskfreerate=0.0, annualize=True, timeframe=bt.TimeFrame.Days)
-cerebro.addanalyzer(bt.analyzers.VWR, _name='vwr')
-cerebro.addanalyzer(bt.analyzers.SQN, _name='sqn')
-cerebro.addanalyzer(bt.analyzers.Transactions, _name='txn')
+add_analyzers(cerebro)
 
 # Run our Backtest
 backtest = cerebro.run()
 backtest_results = backtest[0]
 
-# Print some analytics
-printTradeAnalysis(cerebro, backtest_results.analyzers)
+# Print some analytics, and write them where batch runs can collect them
+report = backtest_report(cerebro, backtest_results, "Buy and Hold")
+print(format_report(report))
+print('Report written to', save_report(report, report_dir))
+print(loader.cache.report())
 
 # Finally plot the end results
-cerebro.plot(style='candlestick', volume=False)
+if show_plot:
+    cerebro.plot(style='candlestick', volume=False)
 
 # ======================================================================================================================
@@ -1,14 +1,27 @@
 import pandas as pd
 import requests
+
 # from pprint import pprint
 import os
+import queue
+import threading
 import time
 import json
-import traceback
 import plotly.express as px
 import numpy as np
 
-from itertools import zip_longest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from depth_heatmap import depth_heatmap
+from depth_store import DepthStore
+from incremental_depth import IncrementalDepth
+from orderbook_depth import (
+    DEFAULT_GRID_BPS,
+    DepthProfile,
+    concat_profiles,
+    depth_profile,
+    merge_profiles,
+    profile_responses,
+)
 
 """
 Good YouTube video to watch for context: https://www.youtube.com/watch?v=BJt6PGKeO9I
@@ -73,6 +86,51 @@ Type Hints
 AmberdataResponseStack = list[AmberdataResponse]
 
 
+def prefetched(pages, size: int):
+    """
+    Runs the `pages` generator on a background thread and yields what it
+    produces, keeping at most `size` pages buffered ahead of the consumer.
+
+    Pages come out in the same order, and an exception raised by `pages` is
+    raised here. If the consumer stops early, the background thread stops after
+    the page it is fetching.
+    """
+    buffer = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(done)
+        except Exception as exc:
+            put((done, exc))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, tuple) and item[0] is done:
+                raise item[1]
+            yield item
+    finally:
+        stop.set()
+
+
 class EndpointCaller:
     def __init__(self, amberdata_api_key):
         self.x_api_key = amberdata_api_key
@@ -122,7 +180,12 @@ class EndpointCaller:
             return AmberdataResponse(json.dumps(as_5xx_error_json), 500, duration, None)
 
     def call_endpoint_and_get_all_pages(
-        self, path: str, query: dict, headers: dict, http_ok_next_page_url_extractor
+        self,
+        path: str,
+        query: dict,
+        headers: dict,
+        http_ok_next_page_url_extractor,
+        prefetch: int = 0,
     ):
         """
         Iterative, non-recursive way to get all the pages given an initial URL.
@@ -141,6 +204,8 @@ class EndpointCaller:
             The request headers in a dict, you do not have to pass in the API key because the `EndpointCaller` class is intialized with it
         http_ok_next_page_url_extractor: function
             The function that extracts the next page url from a given API response
+        prefetch: int
+            When above 0, pages are fetched on a background thread up to this many pages ahead of the consumer, so the network calls overlap with whatever the consumer does with each page
 
         Returns
         -------
@@ -148,6 +213,16 @@ class EndpointCaller:
             Individual page from the calling the endpoint
 
         """
+        if prefetch > 0:
+            return (
+                yield from prefetched(
+                    self.call_endpoint_and_get_all_pages(
+                        path, query, headers, http_ok_next_page_url_extractor
+                    ),
+                    prefetch,
+                )
+            )
+
         stack: AmberdataResponseStack = []
         current_page_response = self.call_endpoint_and_get_data_as_json(
             path, query, headers
@@ -186,74 +261,8 @@ class EndpointCaller:
         return AmberdataResponse("DONE", -1, 0, "")
 
 
-def find_mid_price(ask: list, bid: list):
-    best_ask = ask[0]["price"]
-    best_bid = bid[0]["price"]
-    mid = (best_ask + best_bid) / 2
-    return mid
-
-
-def format_json_response(
-    ask_aggregates: list,
-    bid_aggregates: list,
-    instrument: str,
-    timestamp,
-    exchange: str,
-):
-    """
-    Formats the calculation into an easy to parse response
-    """
-    zipped = list(zip_longest(ask_aggregates, bid_aggregates))
-    cleaned = []
-    try:
-        cleaned = [
-            {
-                "basisPointsFromMid": t[0]["basisPointsFromMid"]
-                if t[0] is not None
-                else t[1]["basisPointsFromMid"],
-                "askLiquidityNative": t[0]["liquidity"] if t[0] is not None else None,
-                "askLiquidityFiat": t[0]["liquidityUSD"] if t[0] is not None else None,
-                "askLiquidityCumulativeNative": t[0]["cumulativeLiquidity"]
-                if t[0] is not None
-                else None,
-                "askLiquidityCumulativeFiat": t[0]["cumulativeLiquidityUSD"]
-                if t[0] is not None
-                else None,
-                "bidLiquidityNative": t[1]["liquidity"] if t[1] is not None else None,
-                "bidLiquidityFiat": t[1]["liquidityUSD"] if t[1] is not None else None,
-                "bidLiquidityCumulativeNative": t[1]["cumulativeLiquidity"]
-                if t[1] is not None
-                else None,
-                "bidLiquidityCumulativeFiat": t[1]["cumulativeLiquidityUSD"]
-                if t[1] is not None
-                else None,
-                "currency": "USD",
-            }
-            for t in zipped
-        ]
-    except Exception as e:
-        # In case there is an aggregation issue, we don't have to stop the complete pipeline, trace the issue, return an empty collect and resume the pipeline
-        stack_trace = "".join(traceback.TracebackException.from_exception(e).format())
-        print(stack_trace)
-        raise e
-
-    """
-    To enhance this when aggregating ACROSS EXCHANGES for an instrument at a specific minute, just join on `basisPointsFromMid` and sum(askLiquidity) and sum(bidLiquidity)
-
-    """
-
-    return [
-        {
-            "exchange": exchange,
-            "instrument": instrument,
-            "timestamp": timestamp,
-            "liquidity": cleaned,
-        }
-    ]
-
-
 def get_spot_ob_snapshot_for_instrument(
-    instrument: str, exchange: str, endpoint_caller: EndpointCaller
+    instrument: str, exchange: str, endpoint_caller: EndpointCaller, prefetch: int = 0
 ):
     """
     Parameters
@@ -264,6 +273,8 @@ def get_spot_ob_snapshot_for_instrument(
         The name of the exchange supported by Amberdata
     x_api_key - required
         Your Amberdata API key
+    prefetch - optional
+        How many pages to fetch ahead of the caller on a background thread
     """
     additional_headers = {
         "Accept-Encoding": "gzip, deflate, br",
@@ -279,9 +290,66 @@ def get_spot_ob_snapshot_for_instrument(
         query_params,
         additional_headers,
         http_ok_next_page_url_extractor,
+        prefetch,
     )
 
 
+def get_consolidated_depth(
+    pairs: list[tuple[str, str]],
+    endpoint_caller: EndpointCaller,
+    grid_bps=DEFAULT_GRID_BPS,
+    max_workers: int = None,
+    prefetch: int = 2,
+) -> DepthProfile:
+    """
+    Parameters
+
+    pairs - required
+        The (instrument, exchange) pairs to pull i.e. [("eth_usd", "bitfinex"), ("eth_usd", "kraken")]
+    endpoint_caller - required
+        Shared by the threads that pull each pair
+    grid_bps - optional
+        Distances from mid, in basis points, to aggregate liquidity at
+    max_workers - optional
+        Size of the process pool that buckets the pages (defaults to the number of CPUs)
+    prefetch - optional
+        How many pages each pair fetches ahead of the one being submitted
+
+    Every pair is pulled on its own thread, and each page is bucketed on the
+    process pool as soon as it arrives. The per-minute profiles of every venue
+    are then summed into one consolidated depth series per instrument, labelled
+    with the requested exchanges joined by "+".
+    """
+    with ProcessPoolExecutor(max_workers) as pool, ThreadPoolExecutor(
+        max(1, len(pairs))
+    ) as fetchers:
+
+        def pull(instrument: str, exchange: str):
+            futures = []
+            for page in get_spot_ob_snapshot_for_instrument(
+                instrument, exchange, endpoint_caller, prefetch
+            ):
+                if page.status != 200:
+                    print(f"Skipping a page of {instrument} on {exchange}: {page.data}")
+                    continue
+                futures.append(
+                    pool.submit(depth_profile, page.data["payload"]["data"], grid_bps)
+                )
+            return futures
+
+        pulls = [
+            fetchers.submit(pull, instrument, exchange)
+            for instrument, exchange in pairs
+        ]
+        profiles = [future.result() for pulled in pulls for future in pulled.result()]
+
+    if not profiles:
+        raise ValueError(f"No order book snapshots for any of {pairs}")
+    # labelled by every requested venue, so repeated pulls of the same pairs
+    # land in one store partition whichever venues answered
+    return merge_profiles(profiles, "+".join(sorted({e for _, e in pairs})))
+
+
 def plot_liquidity_histogram(aggregation: dict):
     """
     aggregation is of format
@@ -344,109 +412,42 @@ def plot_liquidity_histogram(aggregation: dict):
 
 if __name__ == "__main__":
     endpoint_caller = EndpointCaller(os.getenv("PRODUCTION_API_KEY"))
+    # the next pages download while the current one is aggregated
     spot_ob_snapshot = get_spot_ob_snapshot_for_instrument(
-        "eth_usd", "bitfinex", endpoint_caller
+        "eth_usd", "bitfinex", endpoint_caller, prefetch=4
     )
 
-    aggregation_outputs: list[dict] = []
+    # liquidity within each of these distances from mid, in basis points
+    grid_bps = DEFAULT_GRID_BPS
+    # grid_bps = np.arange(100, 2001, 100)  # 1% buckets out to 20%
+    # grid_bps = np.arange(1, 101)  # 1 bps buckets out to 1%
+
+    # each minute only adds the levels that changed since the one before; the
+    # book is re-bucketed when the mid moves a grid step (step_bps=0 re-buckets
+    # every minute, exactly like depth_profile)
+    engine = IncrementalDepth(grid_bps)
+    profiles: list[DepthProfile] = []
     aggregation_start_time = time.time()
 
     for response_page in spot_ob_snapshot:
         amberdata_json_contents = response_page.data
         payload_data = amberdata_json_contents["payload"]["data"]
 
-        for minutely_snapshot in payload_data:
-            asks = minutely_snapshot["ask"]
-            bids = minutely_snapshot["bid"]
-            mid = find_mid_price(asks, bids)
-
-            increment = mid / 100  # this is 1%
-            # increment = mid / 100 / 100  # this is 1 basis point (bps) i.e. 0.01%
-
-            """
-            Using the mid price, for the ask levels, we compute liquidity at 1% increments.
-            """
-            ask_df = pd.DataFrame.from_records(asks)
-            start = mid + increment
-            end = ask_df.tail(1).iloc[0]["price"] + increment
-            ask_aggregates = []
-            while start <= end:
-                bucket = ask_df[
-                    (ask_df["price"] <= start) & (ask_df["price"] > start - increment)
-                ]
-                liquidity = bucket["volume"].sum()
-                liquidityUSD = 0
-                for idx, row in bucket.iterrows():
-                    liquidityUSD += row["price"] * row["volume"]
-                ask_aggregates.append(
-                    {
-                        "basisPointsFromMid": abs(
-                            round((start - mid) / mid, 4) * 10000
-                        ),
-                        "liquidity": liquidity,
-                        "liquidityUSD": liquidityUSD,
-                    }
-                )
-                start += increment
-
-            for idx, item in enumerate(ask_aggregates):
-                if idx == 0:
-                    item["cumulativeLiquidity"] = item["liquidity"]
-                    item["cumulativeLiquidityUSD"] = item["liquidityUSD"]
-                else:
-                    item["cumulativeLiquidity"] = (
-                        item["liquidity"] + ask_aggregates[idx - 1]["liquidity"]
-                    )
-                    item["cumulativeLiquidityUSD"] = (
-                        item["liquidityUSD"] + ask_aggregates[idx - 1]["liquidityUSD"]
-                    )
+        profiles.append(engine.profile(payload_data))
 
-            """
-            Using the mid price, for the bid levels, we compute liquidity at 1% decrements.
-            """
-            bid_df = pd.DataFrame.from_records(bids)
-            start = mid - increment
-            end = bid_df.tail(1).iloc[0]["price"] - increment
-            bid_aggregates = []
-            while start >= end:
-                bucket = bid_df[
-                    (bid_df["price"] >= start) & (bid_df["price"] < start + increment)
-                ]
-                liquidity = bucket["volume"].sum()
-                liquidityUSD = 0
-                for idx, row in bucket.iterrows():
-                    liquidityUSD += row["price"] * row["volume"]
-                bid_aggregates.append(
-                    {
-                        "basisPointsFromMid": abs(
-                            round((start - mid) / mid, 4) * 10000
-                        ),
-                        "liquidity": liquidity,
-                        "liquidityUSD": liquidityUSD,
-                    }
-                )
-                start -= increment
+    depth = concat_profiles(profiles)
 
-            for idx, item in enumerate(bid_aggregates):
-                if idx == 0:
-                    item["cumulativeLiquidity"] = item["liquidity"]
-                    item["cumulativeLiquidityUSD"] = item["liquidityUSD"]
-                else:
-                    item["cumulativeLiquidity"] = (
-                        item["liquidity"] + bid_aggregates[idx - 1]["liquidity"]
-                    )
-                    item["cumulativeLiquidityUSD"] = (
-                        item["liquidityUSD"] + bid_aggregates[idx - 1]["liquidityUSD"]
-                    )
+    # consolidated depth across venues instead of a single exchange:
+    # depth = get_consolidated_depth(
+    #     [("eth_usd", "bitfinex"), ("eth_usd", "coinbase"), ("eth_usd", "kraken")],
+    #     endpoint_caller,
+    #     grid_bps,
+    # )
 
-            minutely_liquidity_aggregate = format_json_response(
-                ask_aggregates,
-                bid_aggregates,
-                minutely_snapshot["instrument"],
-                minutely_snapshot["timestamp"],
-                minutely_snapshot["exchange"],
-            )
-            aggregation_outputs.append(minutely_liquidity_aggregate)
+    # keep every minute for later analysis, i.e.
+    # DepthStore().read("eth_usd", "bitfinex", "2025-01-09", "2025-01-10", bps=[50])
+    DepthStore().write(depth)
+    aggregation_outputs = profile_responses(depth)
 
     aggregation_end_time = time.time()
     print(
@@ -454,3 +455,6 @@ if __name__ == "__main__":
     )
     # pprint(aggregation_outputs)
     plot_liquidity_histogram(aggregation_outputs[0])
+    # every minute at once, binned down to at most 2000 columns
+    depth_heatmap(depth).show()
+    # for a PNG file instead, see save_heatmap in depth_heatmap.py
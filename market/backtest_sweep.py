@@ -0,0 +1,268 @@
+"""
+Parameter sweeps of the backtrader scripts' `Strategy` across a process pool.
+
+A script (`Backtest BTC_LO_MCD_SMA_STF_Perct_TS.py` or one of those in
+`archive/`) is imported for its `Strategy`, `CustomPandas` feed and capital
+settings without running its own backtest. The OHLCV+STF frame is loaded once
+and handed to every worker when it starts (see `worker_pool`), so each task
+only sends a dict of parameters. Runs skip the observers and the plot, and the
+analyzers the scripts attach are flattened into one results row per run.
+
+A search space maps each `Strategy` param to a list of values, or to a
+`(low, high)` range for random search (integers if both ends are):
+
+    python -m backtest_sweep "Backtest BTC_LO_MCD_SMA_STF_Perct_TS.py" \\
+        trailpercent=0.05:0.5 smaperiod=10:60 dirperiod=5,10,20 \\
+        --samples 500 --rounds 3 --output sweep.csv
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import traceback
+from itertools import product
+from types import ModuleType
+from typing import Optional, Union
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+from amberdata_common.backtest_report import METRIC_COLUMNS, add_analyzers, metrics
+
+from worker_pool import set_state, state, worker_pool
+
+CHUNK_SIZE = 4
+METRIC = "sharpe"
+TOP = 10
+
+Space = dict[str, Union[list, tuple]]
+
+
+def load_script(path: str) -> ModuleType:
+    """A backtest script as a module, without running its backtest."""
+    name = "backtest_" + "".join(
+        c if c.isalnum() else "_" for c in os.path.splitext(os.path.basename(path))[0]
+    )
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def script_frame(
+    script: ModuleType, start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Daily BTC OHLCV with the `stf` column the scripts feed to `CustomPandas`,
+    from the script's `loader` (served from its response cache when already
+    fetched) with its `stf_model`, for its own timeframe unless given one.
+    """
+    return script.loader.ohlcv_stf(
+        "gdax",
+        "btc_usd",
+        "btc",
+        start_date or script.start_date,
+        end_date or script.end_date,
+        script.stf_model,
+    )
+
+
+def grid(space: Space) -> list[dict]:
+    """Every combination of the values listed in `space`."""
+    for name, values in space.items():
+        if not isinstance(values, list):
+            raise ValueError(f"{name}: a grid needs a list of values, not {values!r}")
+    names = list(space)
+    return [dict(zip(names, values)) for values in product(*space.values())]
+
+
+def random_search(space: Space, samples: int, seed: Optional[int] = None) -> list[dict]:
+    """`samples` parameter sets drawn uniformly from `space`."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, values in space.items():
+        if isinstance(values, list):
+            columns[name] = [values[i] for i in rng.integers(len(values), size=samples)]
+        elif all(isinstance(end, (int, np.integer)) for end in values):
+            columns[name] = rng.integers(
+                values[0], values[1] + 1, size=samples
+            ).tolist()
+        else:
+            columns[name] = rng.uniform(values[0], values[1], size=samples).tolist()
+    return [
+        {name: column[i] for name, column in columns.items()} for i in range(samples)
+    ]
+
+
+def narrowed(space: Space, results: pd.DataFrame, metric: str, top: int) -> Space:
+    """
+    `space` cut down to what the `top` runs by `metric` used: ranges to the
+    span of their values, lists to the values they had.
+    """
+    best = results.dropna(subset=[metric]).nlargest(top, metric)
+    if best.empty:
+        return space
+
+    narrow = {}
+    for name, values in space.items():
+        used = best[name]
+        if isinstance(values, list):
+            narrow[name] = [value for value in values if value in set(used)]
+        else:
+            narrow[name] = (type(values[0])(used.min()), type(values[1])(used.max()))
+    return narrow
+
+
+def run_backtest(script: ModuleType, frame: pd.DataFrame, params: dict) -> dict:
+    """One backtest of `script.Strategy` with `params`, as a row of metrics."""
+    cerebro = bt.Cerebro(stdstats=False, maxcpus=1)
+    cerebro.broker.setcash(script.icap)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=script.PercSize)
+    cerebro.addstrategy(script.Strategy, **params)
+    cerebro.adddata(script.CustomPandas(dataname=frame, openinterest=None, stf="stf"))
+
+    add_analyzers(cerebro, detail=False)
+
+    # some strategies print every order
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzers = cerebro.run()[0].analyzers
+    return metrics(cerebro, analyzers)
+
+
+def _run(params: dict) -> dict:
+    try:
+        script = load_script(state["path"])
+        return {**params, **run_backtest(script, state["frame"], params), "error": None}
+    except Exception:
+        return {**params, "error": traceback.format_exc()}
+
+
+def sweep(
+    path: str,
+    frame: pd.DataFrame,
+    candidates: list[dict],
+    max_workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> pd.DataFrame:
+    """
+    Backtests the `Strategy` of the script at `path` on `frame` once per
+    parameter set in `candidates`, and returns a row per run with its params,
+    `METRIC_COLUMNS` and the traceback in `error` if it raised, in candidate
+    order. `max_workers=1` runs in this process.
+    """
+    values = {"path": path, "frame": frame}
+    if max_workers == 1:
+        set_state(values)
+        rows = [_run(params) for params in candidates]
+    else:
+        with worker_pool(max_workers, values) as pool:
+            rows = list(pool.map(_run, candidates, chunksize=chunk_size))
+
+    names = list(dict.fromkeys(name for params in candidates for name in params))
+    results = pd.DataFrame(rows, columns=names + METRIC_COLUMNS + ["error"])
+    # analyzers report None where they have nothing to measure
+    results[METRIC_COLUMNS] = results[METRIC_COLUMNS].astype(np.float64)
+    return results
+
+
+def search(
+    path: str,
+    frame: pd.DataFrame,
+    space: Space,
+    samples: int,
+    rounds: int = 1,
+    metric: str = METRIC,
+    top: int = TOP,
+    seed: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Random search of `samples` runs per round; each round after the first
+    draws from `space` narrowed to the `top` runs so far by `metric`.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    seen = set()
+
+    for _ in range(rounds):
+        candidates = []
+        for params in random_search(space, samples, rng):
+            key = tuple(sorted(params.items()))
+            if key not in seen:
+                seen.add(key)
+                candidates.append(params)
+        results.append(sweep(path, frame, candidates, max_workers))
+        space = narrowed(space, pd.concat(results, ignore_index=True), metric, top)
+
+    return pd.concat(results, ignore_index=True)
+
+
+def parse_space(specs: list[str]) -> Space:
+    """`name=a,b,c` lists and `name=low:high` ranges as a search space."""
+
+    def number(text):
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+
+    space = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if ":" in values:
+            low, high = values.split(":")
+            space[name] = (number(low), number(high))
+        else:
+            space[name] = [number(value) for value in values.split(",")]
+    return space
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("script")
+    parser.add_argument("space", nargs="+", help="name=a,b,c or name=low:high")
+    parser.add_argument("--samples", type=int, help="random search; default grid")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--metric", default=METRIC)
+    parser.add_argument("--top", type=int, default=TOP)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--max-workers", type=int)
+    parser.add_argument(
+        "--output", help="write the results table as CSV, or Parquet if .parquet"
+    )
+    args = parser.parse_args()
+
+    script = load_script(args.script)
+    frame = script_frame(script)
+    space = parse_space(args.space)
+
+    if args.samples is None:
+        results = sweep(args.script, frame, grid(space), args.max_workers)
+    else:
+        results = search(
+            args.script,
+            frame,
+            space,
+            args.samples,
+            args.rounds,
+            args.metric,
+            args.top,
+            args.seed,
+            args.max_workers,
+        )
+
+    if args.output and args.output.endswith(".parquet"):
+        results.to_parquet(args.output, index=False)
+    elif args.output:
+        results.to_csv(args.output, index=False)
+    print(results.sort_values(args.metric, ascending=False).head(args.top))
+
+
+if __name__ == "__main__":
+    main()
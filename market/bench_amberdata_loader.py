@@ -0,0 +1,180 @@
+"""Compare the scripts' old sequential Amberdata helpers against `AmberdataLoader`.
+
+Serves synthetic OHLCV and stock-to-flow CSV from a local HTTP server that
+sleeps `--latency` seconds per request, and loads `--years` of daily bars with
+the model price three ways: one yearly window after another, appending each
+response to a string that is parsed once at the end, as the scripts used to;
+through `AmberdataLoader` with an empty cache; and again once the cache holds
+every window. Checks that all three give the same bars.
+
+    python -m bench_amberdata_loader --years 6 --latency 0.3
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import requests
+from amberdata_common.amberdata_loader import AmberdataLoader, yearly_windows
+from amberdata_common.response_cache import ResponseCache
+from dateutil.relativedelta import relativedelta
+
+START_DATE = "2015-01-20"
+
+
+def days(start: datetime, end: datetime) -> list[datetime]:
+    """Every midnight from `start` to `end`, both included."""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def close(day: datetime) -> float:
+    """A deterministic price for `day`, so every request agrees on it."""
+    t = (day - datetime(2015, 1, 1)).days
+    return 300 * np.exp(0.002 * t + 0.3 * np.sin(t / 40))
+
+
+def handler(latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlsplit(self.path)
+            query = {name: values[0] for name, values in parse_qs(url.query).items()}
+            start = datetime.fromisoformat(query["startDate"])
+            end = datetime.fromisoformat(query["endDate"])
+
+            if "/ohlcv/" in url.path:
+                # raw_csv: no header, both ends of the window included
+                rows = [
+                    f"{day:%Y-%m-%dT%H:%M:%S.000Z},{close(day) * 0.99},"
+                    f"{close(day) * 1.02},{close(day) * 0.97},{close(day)},1000"
+                    for day in days(start, end)
+                ]
+            else:
+                rows = ["timestamp,stockToFlow_price"] + [
+                    f"{day:%Y-%m-%dT%H:%M:%S.000Z},{close(day) * 1.5}"
+                    for day in days(start, end)
+                ]
+
+            body = "\n".join(rows).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def sequential(api_url: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """The scripts' old `amberdata_ohlcv`, `amberdata_stf` and `to_pandas`."""
+
+    def amberdata(url, params):
+        return requests.request(
+            "GET", url, headers={"x-api-key": "bench"}, params=params
+        ).text
+
+    format = "%Y-%m-%dT%H:%M:%S"
+    current = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    fields = "timestamp,open,high,low,close,volume"
+    payload = fields
+    following = current
+    while current < end:
+        following += relativedelta(years=1)
+        if following > end:
+            following = end
+        payload += "\n" + amberdata(
+            f"{api_url}/market/ohlcv/btc_usd/historical",
+            {
+                "exchange": "gdax",
+                "timeInterval": "days",
+                "timeFormat": "iso",
+                "format": "raw_csv",
+                "fields": fields,
+                "startDate": current.strftime(format),
+                "endDate": following.strftime(format),
+            },
+        )
+        current = following
+    stf = amberdata(
+        f"{api_url}/market/metrics/btc/valuations/historical",
+        {
+            "format": "csv",
+            "timeFrame": "day",
+            "startDate": start_date,
+            "endDate": end_date,
+        },
+    )
+
+    btc = pd.read_csv(io.StringIO(payload), index_col="timestamp", parse_dates=True)
+    btc_stf = pd.read_csv(io.StringIO(stf), index_col="timestamp", parse_dates=True)
+    btc["stf"] = btc_stf["stockToFlow_price"]
+    return btc
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--max-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    end_date = (
+        datetime.strptime(START_DATE, "%Y-%m-%d") + relativedelta(years=args.years)
+    ).strftime("%Y-%m-%d")
+    windows = len(yearly_windows(START_DATE, end_date))
+    print(
+        f"{args.years} years of daily bars, {windows} OHLCV windows + 1 STF request, "
+        f"{args.latency * 1000:.0f}ms per request"
+    )
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler(args.latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, "responses.sqlite"))
+        loader = AmberdataLoader("bench", cache, args.max_workers, api_url)
+
+        start = time.perf_counter()
+        expected = sequential(api_url, START_DATE, end_date)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{'sequential, no cache':<24} {elapsed:8.2f}s  "
+            f"({len(expected)} rows, "
+            f"{expected.index.duplicated().sum()} duplicated boundary bars)"
+        )
+        expected = expected[~expected.index.duplicated()]
+
+        for label in ("loader, cold cache", "loader, warm cache"):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                actual = loader.ohlcv_stf(
+                    "gdax", "btc_usd", "btc", START_DATE, end_date, "valuations"
+                )
+            elapsed = time.perf_counter() - start
+            same = expected.index.equals(actual.index) and np.allclose(
+                expected.to_numpy(np.float64), actual.to_numpy()
+            )
+            print(f"{label:<24} {elapsed:8.2f}s  (matches sequential: {same})")
+
+        print(cache.report())
+        cache.close()
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Run the backtrader scripts headless through `backtest_report`.
+
+For each script in `vector_backtest.STRATEGIES`, runs its `Strategy` on
+`--days` synthetic daily bars with `add_analyzers`, builds its report and saves
+it (JSON, Parquet and HTML) to a temporary directory, timing each step. Checks
+that the metrics match a `backtest_sweep` run without the detail analyzers,
+that a saved report loads back the same, and that pyplot was never imported,
+then prints the results table read back from the directory.
+
+    python -m bench_backtest_report --days 2300
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+from amberdata_common.backtest_report import (
+    add_analyzers,
+    backtest_report,
+    format_report,
+    load_report,
+    load_results,
+    save_report,
+)
+
+from backtest_sweep import load_script, run_backtest
+from bench_backtest_sweep import synthetic_ohlcv
+from bench_vector_backtest import GAP, script_path
+from vector_backtest import STRATEGIES
+
+
+def same_metrics(expected: dict, actual: dict) -> bool:
+    return all(
+        (expected[name] is None and actual[name] is None)
+        or np.isclose(expected[name], actual[name])
+        for name in expected
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=2300)
+    args = parser.parse_args()
+
+    frame = synthetic_ohlcv(args.days, gap=GAP)
+    print(f"{args.days} days")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in STRATEGIES:
+            script = load_script(script_path(name))
+            cerebro = bt.Cerebro(stdstats=False)
+            cerebro.broker.setcash(script.icap)
+            cerebro.addsizer(bt.sizers.PercentSizer, percents=script.PercSize)
+            cerebro.addstrategy(script.Strategy)
+            cerebro.adddata(
+                script.CustomPandas(dataname=frame, openinterest=None, stf="stf")
+            )
+            add_analyzers(cerebro)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                strategy = cerebro.run()[0]
+            ran = time.perf_counter() - start
+
+            start = time.perf_counter()
+            report = backtest_report(cerebro, strategy, os.path.splitext(name)[0])
+            text = format_report(report)
+            path = save_report(report, directory)
+            reported = time.perf_counter() - start
+
+            loaded = load_report(path)
+            round_trip = (
+                loaded.transactions.equals(report.transactions)
+                and loaded.value.equals(report.value)
+                and same_metrics(report.metrics, loaded.metrics)
+            )
+            matches = same_metrics(report.metrics, run_backtest(script, frame, {}))
+            print(
+                f"  {name:<40} run {ran * 1000:5.0f}ms  report {reported * 1000:5.0f}ms  "
+                f"({len(report.transactions)} transactions, "
+                f"metrics match sweep: {matches}, loads back: {round_trip})"
+            )
+
+        print("pyplot imported:", "matplotlib.pyplot" in sys.modules)
+        print(f"\n{text}\n")
+        print("files:", ", ".join(sorted(os.listdir(directory))[:4]), "...")
+        results = load_results(directory)
+        with pd.option_context("display.width", 200):
+            print(
+                results[
+                    ["name", "closed_trades", "strike_rate", "final_value", "sharpe"]
+                ].to_string(index=False)
+            )
+
+
+if __name__ == "__main__":
+    main()
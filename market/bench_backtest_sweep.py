@@ -0,0 +1,150 @@
+"""Time `backtest_sweep` on the backtrader scripts' strategies.
+
+Builds `--days` of synthetic daily BTC OHLCV with a stock-to-flow line, checks
+that a sweep run (no observers, analyzers only) gives the same result as the
+script's own cerebro setup with the default params, then sweeps a grid of
+trailing-stop and SMA params for `Backtest BTC_LO_MCD_SMA_STF_Perct_TS.py`
+(or `--script`) in this process and across a process pool, and finishes with
+a few rounds of narrowing random search.
+
+    python -m bench_backtest_sweep --days 2300
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+
+from backtest_sweep import grid, load_script, run_backtest, search, sweep
+
+SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "Backtest BTC_LO_MCD_SMA_STF_Perct_TS.py",
+)
+SPACE = {
+    "trailpercent": [0.05, 0.1, 0.15, 0.2, 0.3, 0.4],
+    "smaperiod": [10, 20, 30, 50],
+    "dirperiod": [5, 10],
+}
+SEARCH_SPACE = {
+    "trailpercent": (0.05, 0.5),
+    "smaperiod": (10, 60),
+    "dirperiod": (5, 20),
+}
+
+
+def synthetic_ohlcv(
+    days: int,
+    seed: int = 0,
+    gap: float = 0.0,
+    freq: str = "D",
+    drift: float = 0.001,
+    volatility: float = 0.04,
+) -> pd.DataFrame:
+    """
+    Bars (daily unless `freq`) of a random walk with `drift` and `volatility`
+    per bar, and a slower `stf` line it crosses. Each open is the previous
+    close, moved by a random relative gap with standard deviation `gap`.
+    """
+    rng = np.random.default_rng(seed)
+    close = 300 * np.exp(np.cumsum(rng.normal(drift, volatility, days)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    if gap:
+        open_ = open_ * np.exp(rng.normal(0, gap, days))
+    spread = np.abs(rng.normal(0, 0.02, days))
+    return pd.DataFrame(
+        {
+            "open": open_,
+            "high": np.maximum(open_, close) * (1 + spread),
+            "low": np.minimum(open_, close) * (1 - spread),
+            "close": close,
+            "volume": rng.uniform(1e3, 1e4, days),
+            "stf": close * np.exp(rng.normal(0.05, 0.3, days).cumsum() * 0.05),
+        },
+        index=pd.date_range("2015-01-20", periods=days, freq=freq, name="timestamp"),
+    )
+
+
+def script_run(script, frame: pd.DataFrame) -> float:
+    """Final value of the script's own cerebro setup, observers included."""
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.addobserver(bt.observers.BuySell)
+    cerebro.addobserver(bt.observers.Value)
+    cerebro.addobserver(bt.observers.DrawDown)
+    cerebro.addobserver(bt.observers.Trades)
+    cerebro.broker.setcash(script.icap)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=script.PercSize)
+    cerebro.addstrategy(script.Strategy)
+    cerebro.adddata(script.CustomPandas(dataname=frame, openinterest=None, stf="stf"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        cerebro.run()
+    return cerebro.broker.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--script", default=SCRIPT)
+    parser.add_argument("--days", type=int, default=2300)
+    parser.add_argument("--samples", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    frame = synthetic_ohlcv(args.days)
+    script = load_script(args.script)
+    candidates = grid(SPACE)
+    print(f"{args.days} days, {len(candidates)} param sets, {os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    expected = script_run(script, frame)
+    elapsed = time.perf_counter() - start
+    actual = run_backtest(script, frame, {})["final_value"]
+    print(
+        f"{'script setup, one run':<24} {elapsed:8.2f}s  "
+        f"(sweep run matches: {np.isclose(expected, actual)})"
+    )
+
+    results = {}
+    for label, workers in (("sweep, in process", 1), ("sweep, process pool", None)):
+        start = time.perf_counter()
+        results[label] = sweep(
+            args.script, frame, candidates, workers or args.max_workers
+        )
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<24} {elapsed:8.2f}s  "
+            f"({elapsed / len(candidates) * 1000:.0f}ms per run, "
+            f"{results[label]['error'].notna().sum()} errors)"
+        )
+    serial, pooled = results.values()
+    print(
+        "pool matches in process:",
+        serial.drop(columns="error").equals(pooled.drop(columns="error")),
+    )
+
+    start = time.perf_counter()
+    searched = search(
+        args.script,
+        frame,
+        SEARCH_SPACE,
+        args.samples,
+        args.rounds,
+        seed=0,
+        max_workers=args.max_workers,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"\n{'narrowing random search':<24} {elapsed:8.2f}s  ({len(searched)} runs)")
+    print(
+        searched.sort_values("sharpe", ascending=False)
+        .head(5)[list(SEARCH_SPACE) + ["closed_trades", "net_pnl", "sharpe", "sqn"]]
+        .to_string(index=False)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+"""Compare the per-snapshot depth loop against `orderbook_depth.depth_profile`.
+
+Builds a day of synthetic minutely order book snapshots, aggregates them with
+the loop the script used to run and with `depth_profile` on a 1% grid, checks
+that their cumulative depth matches, and reports the time each took. Then times
+`depth_profile` on coarse and fine bps grids and checks its running cumulative
+depth against a direct sum over the levels. Finally pages through the snapshots
+with a mock `EndpointCaller` that sleeps `--latency` seconds per page, with and
+without prefetching, and for `--venues` exchanges one after another against
+the concurrent consolidated-depth job, checks that consolidated depth (also
+with a venue missing some minutes) bins into a heatmap, and times queries on a
+`DepthStore` holding every venue's profiles. Then moves an `IncrementalDepth`
+through a book that changes `--changes` levels a minute and checks it against
+`depth_profile`. Last, times rendering `--heatmap-minutes` of depth as a
+heatmap.
+
+    python -m bench_orderbook_depth --snapshots 1440 --levels 250
+"""
+
+import argparse
+import importlib.util
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from depth_heatmap import depth_heatmap, heatmap_grid, save_heatmap
+from depth_store import DepthStore, resample
+from incremental_depth import IncrementalDepth
+from orderbook_depth import (
+    DEFAULT_GRID_BPS,
+    concat_profiles,
+    DepthProfile,
+    depth_profile,
+    find_mid_price,
+    format_json_response,
+    grid_buckets,
+    linear_grid,
+    merge_profiles,
+    parse_timestamps,
+    profile_responses,
+)
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "Spot OB Snapshot Liquidity Depth.py")
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("spot_ob_liquidity_depth", SCRIPT)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    return script
+
+
+def synthetic_snapshots(count: int, levels: int, seed: int = 0) -> list[dict]:
+    """Books around a random-walk mid."""
+    rng = np.random.default_rng(seed)
+    mids = 3300 * np.exp(np.cumsum(rng.normal(0, 0.0005, count)))
+    snapshots = []
+
+    for minute, mid in enumerate(mids):
+        spread = mid * 0.0001
+        sides = {}
+        for side, direction in (("ask", 1), ("bid", -1)):
+            gaps = rng.exponential(mid * 0.0006, levels)
+            prices = mid + direction * (spread / 2 + np.cumsum(gaps))
+            sides[side] = [
+                {"price": float(price), "volume": float(volume)}
+                for price, volume in zip(
+                    np.round(prices, 2), rng.lognormal(0, 1.5, levels)
+                )
+            ]
+
+        snapshots.append(
+            {
+                "exchange": "bitfinex",
+                "instrument": "eth_usd",
+                "timestamp": f"2025-01-09 {minute // 60:02d}:{minute % 60:02d}:00 000",
+                "ask": sides["ask"],
+                "bid": sides["bid"],
+            }
+        )
+
+    return snapshots
+
+
+def aggregate_snapshot(minutely_snapshot: dict):
+    """
+    Liquidity at 1% increments from mid for one snapshot, one bucket at a time.
+
+    This is the loop `Spot OB Snapshot Liquidity Depth.py` used before
+    `depth_profile`, kept as the reference it is checked against.
+    """
+    asks = minutely_snapshot["ask"]
+    bids = minutely_snapshot["bid"]
+    mid = find_mid_price(asks, bids)
+
+    increment = mid / 100  # this is 1%
+    # increment = mid / 100 / 100  # this is 1 basis point (bps) i.e. 0.01%
+
+    """
+    Using the mid price, for the ask levels, we compute liquidity at 1% increments.
+    """
+    ask_df = pd.DataFrame.from_records(asks)
+    start = mid + increment
+    end = ask_df.tail(1).iloc[0]["price"] + increment
+    ask_aggregates = []
+    while start <= end:
+        bucket = ask_df[
+            (ask_df["price"] <= start) & (ask_df["price"] > start - increment)
+        ]
+        liquidity = bucket["volume"].sum()
+        liquidityUSD = 0
+        for idx, row in bucket.iterrows():
+            liquidityUSD += row["price"] * row["volume"]
+        ask_aggregates.append(
+            {
+                "basisPointsFromMid": abs(round((start - mid) / mid, 4) * 10000),
+                "liquidity": liquidity,
+                "liquidityUSD": liquidityUSD,
+            }
+        )
+        start += increment
+
+    for idx, item in enumerate(ask_aggregates):
+        if idx == 0:
+            item["cumulativeLiquidity"] = item["liquidity"]
+            item["cumulativeLiquidityUSD"] = item["liquidityUSD"]
+        else:
+            item["cumulativeLiquidity"] = (
+                item["liquidity"] + ask_aggregates[idx - 1]["cumulativeLiquidity"]
+            )
+            item["cumulativeLiquidityUSD"] = (
+                item["liquidityUSD"] + ask_aggregates[idx - 1]["cumulativeLiquidityUSD"]
+            )
+
+    """
+    Using the mid price, for the bid levels, we compute liquidity at 1% decrements.
+    """
+    bid_df = pd.DataFrame.from_records(bids)
+    start = mid - increment
+    end = bid_df.tail(1).iloc[0]["price"] - increment
+    bid_aggregates = []
+    while start >= end:
+        bucket = bid_df[
+            (bid_df["price"] >= start) & (bid_df["price"] < start + increment)
+        ]
+        liquidity = bucket["volume"].sum()
+        liquidityUSD = 0
+        for idx, row in bucket.iterrows():
+            liquidityUSD += row["price"] * row["volume"]
+        bid_aggregates.append(
+            {
+                "basisPointsFromMid": abs(round((start - mid) / mid, 4) * 10000),
+                "liquidity": liquidity,
+                "liquidityUSD": liquidityUSD,
+            }
+        )
+        start -= increment
+
+    for idx, item in enumerate(bid_aggregates):
+        if idx == 0:
+            item["cumulativeLiquidity"] = item["liquidity"]
+            item["cumulativeLiquidityUSD"] = item["liquidityUSD"]
+        else:
+            item["cumulativeLiquidity"] = (
+                item["liquidity"] + bid_aggregates[idx - 1]["cumulativeLiquidity"]
+            )
+            item["cumulativeLiquidityUSD"] = (
+                item["liquidityUSD"] + bid_aggregates[idx - 1]["cumulativeLiquidityUSD"]
+            )
+
+    return format_json_response(
+        ask_aggregates,
+        bid_aggregates,
+        minutely_snapshot["instrument"],
+        minutely_snapshot["timestamp"],
+        minutely_snapshot["exchange"],
+    )
+
+
+def evolving_snapshots(
+    count: int, levels: int, changes: int, seed: int = 0
+) -> list[dict]:
+    """One book of `levels` per side, with `changes` levels per side added,
+    resized or removed each minute and the mid drifting slowly.
+    """
+    rng = np.random.default_rng(seed)
+    mid = 3300.0
+    book = {}
+    for side, direction in (("ask", 1), ("bid", -1)):
+        prices = np.round(mid + direction * (0.2 + np.arange(levels) * 0.5), 2)
+        book[side] = dict(zip(prices.tolist(), rng.lognormal(0, 1.5, levels).tolist()))
+
+    snapshots = []
+    for minute in range(count):
+        if minute:
+            mid += float(rng.normal(0, 0.05))
+            for side, direction in (("ask", 1), ("bid", -1)):
+                levels_now = book[side]
+                prices = list(levels_now)
+                for _ in range(changes):
+                    action = rng.integers(3)
+                    if action == 0 and len(levels_now) > levels // 2:
+                        levels_now.pop(prices[rng.integers(len(prices))], None)
+                    elif action == 1:
+                        price = prices[rng.integers(len(prices))]
+                        levels_now[price] = float(rng.lognormal(0, 1.5))
+                    else:
+                        offset = float(rng.uniform(0.2, levels * 0.5))
+                        price = round(mid + direction * offset, 2)
+                        levels_now[price] = float(rng.lognormal(0, 1.5))
+                # keep the book uncrossed around the new mid
+                for price in [p for p in levels_now if direction * (p - mid) <= 0]:
+                    del levels_now[price]
+
+        snapshots.append(
+            {
+                "exchange": "bitfinex",
+                "instrument": "eth_usd",
+                "timestamp": f"2025-01-09 {minute // 60 % 24:02d}:{minute % 60:02d}:00 000",
+                "ask": [
+                    {"price": p, "volume": v} for p, v in sorted(book["ask"].items())
+                ],
+                "bid": [
+                    {"price": p, "volume": v}
+                    for p, v in sorted(book["bid"].items(), reverse=True)
+                ],
+            }
+        )
+
+    return snapshots
+
+
+def anchored_matches(engine: IncrementalDepth, snapshot: dict) -> bool:
+    """The engine's bucket sums against bucketing `snapshot` from its anchor."""
+    anchor = np.array([engine.anchor])
+    for side in ("ask", "bid"):
+        prices = np.array([level["price"] for level in snapshot[side]])
+        volumes = np.array([level["volume"] for level in snapshot[side]])
+        liquidity, liquidity_usd = grid_buckets(
+            prices, volumes, np.array([len(prices)]), anchor, engine.grid, side
+        )
+        if not (
+            np.allclose(engine.sums[side], liquidity[0])
+            and np.allclose(engine.sums[f"{side}_usd"], liquidity_usd[0])
+        ):
+            return False
+
+    return True
+
+
+def loop_matches(expected: list, profile: DepthProfile) -> bool:
+    """The loop's cumulative depth at each 1% step against `profile`'s on a 1%
+    grid. The loop stops one step past each book's last level, so only the
+    steps it produced are compared.
+    """
+    for row, [want] in enumerate(expected):
+        for column, bucket in enumerate(want["liquidity"]):
+            for side in ("ask", "bid"):
+                value = bucket[f"{side}LiquidityCumulativeNative"]
+                other = getattr(profile, f"{side}_cumulative")[row, column]
+                if value is not None and not math.isclose(
+                    value, other, rel_tol=1e-9, abs_tol=1e-9
+                ):
+                    return False
+
+    return True
+
+
+def cumulative_matches(snapshots: list[dict], grid_bps: np.ndarray) -> bool:
+    """Cumulative depth at each grid point against summing the levels within it."""
+    profile = depth_profile(snapshots, grid_bps)
+
+    for row, snapshot in enumerate(snapshots):
+        mid = profile.mids[row]
+        for side, direction in (("ask", 1), ("bid", -1)):
+            prices = np.array([level["price"] for level in snapshot[side]])
+            volumes = np.array([level["volume"] for level in snapshot[side]])
+            distance = direction * (prices - mid) / mid * 10000
+            expected = [
+                volumes[(distance > 0) & (distance <= bps)].sum() for bps in grid_bps
+            ]
+            if not np.allclose(getattr(profile, f"{side}_cumulative")[row], expected):
+                return False
+
+    return True
+
+
+def mock_caller(script, snapshots: list[dict], page_size: int, latency: float):
+    """An `EndpointCaller` serving `snapshots` in pages linked by `next` URLs."""
+
+    class MockCaller(script.EndpointCaller):
+        def call_endpoint_and_get_data_as_json(
+            self, path: str, query: dict, headers: dict, retry_message: str = None
+        ):
+            time.sleep(latency)
+            page = int(path.rsplit("=", 1)[1]) if query is None else 0
+            start = page * page_size
+            next_url = None
+            if start + page_size < len(snapshots):
+                next_url = f"{script.PRODUCTION_BASE_URL}/mock?page={page + 1}"
+            data = {
+                "payload": {
+                    "data": snapshots[start : start + page_size],
+                    "metadata": {"next": next_url},
+                }
+            }
+            return script.AmberdataResponse(data, 200, latency, path)
+
+    return MockCaller("bench")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshots", type=int, default=1440)
+    parser.add_argument("--levels", type=int, default=250)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--prefetch", type=int, default=4)
+    parser.add_argument("--venues", type=int, default=8)
+    parser.add_argument("--changes", type=int, default=5)
+    parser.add_argument("--heatmap-minutes", type=int, default=131400)
+    args = parser.parse_args()
+
+    script = load_script()
+    snapshots = synthetic_snapshots(args.snapshots, args.levels)
+    print(f"{args.snapshots} snapshots, {args.levels} levels per side")
+
+    start = time.perf_counter()
+    expected = [aggregate_snapshot(snapshot) for snapshot in snapshots]
+    loop = time.perf_counter() - start
+    print(f"{'loop (per snapshot)':<28} {loop:8.2f}s")
+
+    steps = max(len(want["liquidity"]) for [want] in expected)
+    grid = linear_grid(100, 100 * steps)
+    start = time.perf_counter()
+    profiles = [
+        depth_profile(snapshots[i : i + args.page_size], grid)
+        for i in range(0, len(snapshots), args.page_size)
+    ]
+    vectorized = time.perf_counter() - start
+    print(f"{f'profile (pages of {args.page_size})':<28} {vectorized:8.2f}s")
+
+    print(f"speedup: {loop / vectorized:.1f}x")
+    if not loop_matches(expected, concat_profiles(profiles)):
+        raise RuntimeError("depth_profile differs from the per-snapshot loop")
+
+    for label, grid in (
+        ("default grid", np.array(DEFAULT_GRID_BPS, dtype=float)),
+        ("1% grid to 20%", linear_grid(100, 2000)),
+        ("1 bps grid to 20%", linear_grid(1, 2000)),
+    ):
+        start = time.perf_counter()
+        for i in range(0, len(snapshots), args.page_size):
+            depth_profile(snapshots[i : i + args.page_size], grid)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{f'profile, {label}':<28} {elapsed:8.2f}s  "
+            f"cumulative correct: {cumulative_matches(snapshots[:20], grid)}"
+        )
+
+    caller = mock_caller(script, snapshots, args.page_size, args.latency)
+    network = math.ceil(len(snapshots) / args.page_size) * args.latency
+    print(f"{'pages, network alone':<28} {network:8.2f}s")
+    for label, prefetch in (("pages, serial", 0), ("pages, prefetched", args.prefetch)):
+        start = time.perf_counter()
+        pages = script.get_spot_ob_snapshot_for_instrument(
+            "eth_usd", "bitfinex", caller, prefetch
+        )
+        outputs = 0
+        for page in pages:
+            outputs += len(
+                profile_responses(depth_profile(page.data["payload"]["data"]))
+            )
+        elapsed = time.perf_counter() - start
+        print(f"{label:<28} {elapsed:8.2f}s  ({outputs} snapshots)")
+
+    pairs = [("eth_usd", f"venue{i}") for i in range(args.venues)]
+    start = time.perf_counter()
+    profiles = []
+    for instrument, exchange in pairs:
+        for page in script.get_spot_ob_snapshot_for_instrument(
+            instrument, exchange, caller
+        ):
+            profiles.append(depth_profile(page.data["payload"]["data"]))
+    serial = merge_profiles(profiles)
+    elapsed = time.perf_counter() - start
+    print(f"{f'{args.venues} venues, serial':<28} {elapsed:8.2f}s")
+
+    start = time.perf_counter()
+    consolidated = script.get_consolidated_depth(pairs, caller)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{f'{args.venues} venues, concurrent':<28} {elapsed:8.2f}s  "
+        f"({len(consolidated.timestamps)} minutes)"
+    )
+    if not np.allclose(serial.ask_cumulative, consolidated.ask_cumulative):
+        raise RuntimeError("concurrent consolidated depth differs from serial")
+
+    # a venue that is missing half the minutes must not split the label
+    half = len(snapshots) // 2
+    uneven = merge_profiles(
+        [
+            depth_profile(snapshots),
+            depth_profile(snapshots[:half])._replace(exchanges=["coinbase"] * half),
+        ]
+    )
+    start = time.perf_counter()
+    for merged in (consolidated, uneven):
+        heatmap_grid(merged)
+    print(
+        f"{'heatmap, consolidated':<28} {time.perf_counter() - start:8.3f}s  "
+        f"(labels {consolidated.exchanges[0]!r}, {uneven.exchanges[0]!r})"
+    )
+
+    with tempfile.TemporaryDirectory() as root:
+        profile = depth_profile(snapshots)
+        profiles = [
+            profile._replace(exchanges=[exchange] * len(snapshots))
+            for _, exchange in pairs
+        ]
+        store = DepthStore(root)
+        start = time.perf_counter()
+        store.write(concat_profiles(profiles))
+        print(f"{'store, write':<28} {time.perf_counter() - start:8.2f}s")
+
+        first = parse_timestamps(profile.timestamps)[0]
+        start = time.perf_counter()
+        window = store.read(
+            "eth_usd", "venue0", first, first + np.timedelta64(1, "h"), bps=[50]
+        )
+        print(
+            f"{'store, 1h at 50 bps':<28} {time.perf_counter() - start:8.2f}s  "
+            f"({len(window)} rows)"
+        )
+
+        start = time.perf_counter()
+        hourly = resample(store.read("eth_usd", bps=[50, 100]), "1h")
+        print(
+            f"{'store, hourly, all venues':<28} {time.perf_counter() - start:8.2f}s  "
+            f"({len(hourly)} rows)"
+        )
+
+    book = evolving_snapshots(args.snapshots, args.levels, args.changes)
+    grid = linear_grid(1, 500)
+    print(
+        f"evolving book, {args.changes} level changes per side a minute, "
+        f"1 bps grid to 5%"
+    )
+
+    start = time.perf_counter()
+    full = depth_profile(book, grid)
+    print(f"{'full recompute':<28} {time.perf_counter() - start:8.3f}s")
+
+    incremental = {}
+    for label, step_bps in (("incremental, every minute", 0.0), ("incremental", None)):
+        engine = IncrementalDepth(grid, step_bps)
+        start = time.perf_counter()
+        incremental[step_bps] = engine.profile(book)
+        print(
+            f"{label:<28} {time.perf_counter() - start:8.3f}s  "
+            f"({engine.rebuckets} re-buckets, {engine.level_changes} level changes)"
+        )
+
+    # re-bucketing every minute is depth_profile; a grid step of slack is
+    # depth_profile measured from the anchor instead of the mid
+    if not all(
+        np.allclose(getattr(full, name), getattr(incremental[0.0], name))
+        for name in ("ask", "ask_usd", "bid", "bid_usd")
+    ):
+        raise RuntimeError("incremental depth differs from depth_profile")
+    engine = IncrementalDepth(grid)
+    for snapshot in book:
+        engine.update(snapshot)
+        if not anchored_matches(engine, snapshot):
+            raise RuntimeError("incremental depth differs from its anchored recompute")
+
+    # three months of minutes, built directly rather than from snapshots
+    rng = np.random.default_rng(0)
+    grid = np.array(DEFAULT_GRID_BPS, dtype=float)
+    minutes = np.datetime64("2025-01-01T00:00") + np.arange(args.heatmap_minutes)
+    long_profile = DepthProfile(
+        grid,
+        minutes.astype("datetime64[ms]").astype(np.int64).tolist(),
+        ["bitfinex"] * args.heatmap_minutes,
+        ["eth_usd"] * args.heatmap_minutes,
+        np.full(args.heatmap_minutes, 3300.0),
+        *(rng.lognormal(10, 1, (args.heatmap_minutes, len(grid))) for _ in range(4)),
+    )
+    print(f"heatmap of {args.heatmap_minutes} minutes")
+
+    start = time.perf_counter()
+    binned = heatmap_grid(long_profile)
+    print(
+        f"{'heatmap, binning':<28} {time.perf_counter() - start:8.3f}s  "
+        f"({binned.values.shape[1]} columns of {binned.bin_width})"
+    )
+
+    start = time.perf_counter()
+    depth_heatmap(long_profile).to_json()
+    print(f"{'heatmap, plotly figure':<28} {time.perf_counter() - start:8.3f}s")
+
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        save_heatmap(long_profile, os.path.join(root, "depth.png"))
+        print(f"{'heatmap, png export':<28} {time.perf_counter() - start:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
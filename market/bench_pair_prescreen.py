@@ -0,0 +1,82 @@
+"""Measure what `pair_prescreen` saves and what it misses.
+
+On `--assets` synthetic instruments, runs the notebook's full analysis on every
+pair and again on only the pairs that survive `prescreen_pairs`, and reports
+the time each took and how many of the full run's trading pairs the prescreen
+kept. Then times the prescreen alone on a `--screen-assets` universe, where
+the full analysis would take far too long to run.
+
+    python -m bench_pair_prescreen --assets 24 --screen-assets 200 --days 1100
+"""
+
+import argparse
+import time
+import warnings
+
+import bench_pair_scan
+from bench_pair_scan import CONFIG, load_notebook, scanned, synthetic_prices
+from pair_prescreen import prescreen_pairs
+from pair_scan import wide_prices
+
+EXCHANGES = ["bitfinex"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=24)
+    parser.add_argument("--screen-assets", type=int, default=200)
+    parser.add_argument("--days", type=int, default=1100)
+    parser.add_argument("--max-workers", type=int, default=1)
+    args = parser.parse_args()
+
+    # statsmodels' notice about adfuller's future return type, once per pair
+    warnings.simplefilter("ignore", FutureWarning)
+    bench_pair_scan.notebook = load_notebook()
+    prices_df = synthetic_prices(args.assets, args.days)
+    pairs = sorted(prices_df["instrument"].unique())
+    print(f"{args.assets} assets, {args.days} days")
+
+    start = time.perf_counter()
+    expected = scanned(prices_df, pairs, EXCHANGES, CONFIG, args.max_workers)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'full analysis':<24} {elapsed:8.2f}s  "
+        f"({args.assets * (args.assets - 1) // 2} pairs, "
+        f"{len(expected)} trading pairs)"
+    )
+
+    start = time.perf_counter()
+    screen = prescreen_pairs(prices_df, pairs, EXCHANGES, CONFIG)
+    actual = scanned(
+        prices_df,
+        pairs,
+        EXCHANGES,
+        CONFIG,
+        args.max_workers,
+        candidates=screen.pairs(),
+    )
+    elapsed = time.perf_counter() - start
+    kept = expected.keys() & actual.keys()
+    print(
+        f"{'prescreened analysis':<24} {elapsed:8.2f}s  "
+        f"({len(screen.candidates)} pairs, {len(actual)} trading pairs, "
+        f"kept {len(kept)} of {len(expected)})"
+    )
+    print(screen.report.to_string(index=False))
+
+    prices_df = synthetic_prices(args.screen_assets, args.days)
+    pairs = sorted(prices_df["instrument"].unique())
+    start = time.perf_counter()
+    wide = wide_prices(prices_df, EXCHANGES)
+    pivoted = time.perf_counter() - start
+    screen = prescreen_pairs(prices_df, pairs, EXCHANGES, CONFIG, wide=wide)
+    elapsed = time.perf_counter() - start - pivoted
+    print(
+        f"\n{args.screen_assets} assets: pivot {pivoted:.2f}s, "
+        f"prescreen {elapsed:.3f}s"
+    )
+    print(screen.report.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Compare the notebook's serial pair loop against `pair_scan.scan_pairs`.
+
+Loads the analysis functions from the cointegration notebook, builds daily
+prices for `--assets` synthetic instruments (in groups that share a common
+trend, so some pairs are cointegrated), and evaluates every pair three ways:
+filtering the long price frame with boolean masks per pair as the notebook used
+to, through `scan_pairs` in this process, and through `scan_pairs` across a
+process pool. Checks that all three find the same trading pairs and returns.
+
+    python -m bench_pair_scan --assets 24 --days 1100
+"""
+
+import argparse
+import ast
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import types
+import warnings
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from pair_scan import scan_pairs
+
+NOTEBOOK = os.path.join(
+    os.path.dirname(__file__), "Cointegration Based Crypto Pairs Trading Strategy.ipynb"
+)
+CONFIG = {
+    "initial_capital": 1000000,
+    "position_size_pct": 0.05,
+    "transaction_cost": 0.001,
+    "stop_loss_pct": 0.05,
+    "take_profit_pct": 0.30,
+    "min_correlation": 0.3,
+    "min_cointegration_conf": 0.90,
+    "zscore_threshold": 3.0,
+    "min_data_points": 60,
+}
+
+notebook = None
+
+
+def load_notebook() -> types.ModuleType:
+    """The notebook's imports and function definitions, as a module."""
+    module = types.ModuleType("pairs_notebook")
+    # registered so process pool workers can unpickle its functions
+    sys.modules[module.__name__] = module
+
+    with open(NOTEBOOK) as f:
+        cells = json.load(f)["cells"]
+    for cell in cells:
+        if cell["cell_type"] != "code":
+            continue
+        try:
+            tree = ast.parse("".join(cell["source"]))
+        except SyntaxError:
+            # the fetch cell has a placeholder where the API key goes
+            continue
+        # definitions only, not the cells' calls to them
+        tree.body = [
+            node
+            for node in tree.body
+            if isinstance(node, (ast.FunctionDef, ast.Import, ast.ImportFrom))
+        ]
+        exec(compile(tree, NOTEBOOK, "exec"), module.__dict__)
+
+    return module
+
+
+def quiet_evaluate(df1, df2, config):
+    """The notebook's `evaluate_pair` without its per-pair printing."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return notebook.evaluate_pair(df1, df2, config)
+
+
+def synthetic_prices(assets: int, days: int, seed: int = 0) -> pd.DataFrame:
+    """Daily closes in groups of four that follow a shared random walk."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2021-01-01", periods=days, freq="D")
+    frames = []
+
+    for asset in range(assets):
+        if asset % 4 == 0:
+            trend = np.cumsum(rng.normal(0, 0.03, days))
+        noise = np.zeros(days)
+        for day in range(1, days):
+            noise[day] = 0.9 * noise[day - 1] + rng.normal(0, 0.02)
+        close = np.exp(np.log(rng.uniform(1, 1000)) + trend + noise)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "exchangeTimestamp": index,
+                    "instrument": f"asset{asset}_usdt",
+                    "exchange": "bitfinex",
+                    "close": close,
+                }
+            )
+        )
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def masked_loop(prices_df, pairs, exchanges, config) -> dict:
+    """The notebook's old loop: both legs filtered out of the long frame per pair."""
+    prices_df = prices_df.set_index("exchangeTimestamp")
+    results = {}
+
+    for exchange in exchanges:
+        for pair1, pair2 in combinations(pairs, 2):
+            df1 = prices_df[
+                (prices_df["instrument"] == pair1) & (prices_df["exchange"] == exchange)
+            ].sort_index()
+            df2 = prices_df[
+                (prices_df["instrument"] == pair2) & (prices_df["exchange"] == exchange)
+            ].sort_index()
+            common_index = df1.index.intersection(df2.index)
+            df1 = df1.loc[common_index].dropna(subset=["close"])
+            df2 = df2.loc[common_index].dropna(subset=["close"])
+            if min(len(df1), len(df2)) < config["min_data_points"]:
+                continue
+
+            result = quiet_evaluate(df1, df2, config)
+            if result is not None:
+                results[result["pair"]] = result["performance"]["total_return"]
+
+    return results
+
+
+def scanned(prices_df, pairs, exchanges, config, max_workers, candidates=None) -> dict:
+    results = {}
+    for pair in scan_pairs(
+        prices_df,
+        pairs,
+        exchanges,
+        quiet_evaluate,
+        config,
+        max_workers,
+        candidates=candidates,
+    ):
+        if pair.error is not None:
+            raise RuntimeError(pair.error)
+        if pair.result is not None:
+            results[pair.result["pair"]] = pair.result["performance"]["total_return"]
+    return results
+
+
+def same_results(expected: dict, actual: dict) -> bool:
+    return expected.keys() == actual.keys() and all(
+        np.isclose(expected[pair], actual[pair]) for pair in expected
+    )
+
+
+def main():
+    global notebook
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=24)
+    parser.add_argument("--days", type=int, default=1100)
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    # statsmodels' notice about adfuller's future return type, once per pair
+    warnings.simplefilter("ignore", FutureWarning)
+    notebook = load_notebook()
+    prices_df = synthetic_prices(args.assets, args.days)
+    pairs = sorted(prices_df["instrument"].unique())
+    exchanges = ["bitfinex"]
+    print(
+        f"{args.assets} assets, {args.days} days, "
+        f"{args.assets * (args.assets - 1) // 2} pairs, {os.cpu_count()} CPUs"
+    )
+
+    start = time.perf_counter()
+    expected = masked_loop(prices_df, pairs, exchanges, CONFIG)
+    elapsed = time.perf_counter() - start
+    print(f"{'masked loop':<24} {elapsed:8.2f}s  ({len(expected)} trading pairs)")
+
+    for label, workers in (
+        ("scan, in process", 1),
+        ("scan, process pool", args.max_workers),
+    ):
+        start = time.perf_counter()
+        actual = scanned(prices_df, pairs, exchanges, CONFIG, workers)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<24} {elapsed:8.2f}s  "
+            f"(matches loop: {same_results(expected, actual)})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Compare the pairs notebook's per-bar signal and backtest loops against
+`pair_signals`.
+
+Builds a mean-reverting spread of `--bars` bars, runs the notebook's old
+`generate_signals` and `backtest_pair_strategy` loops (kept below as the
+reference) and the notebook's current versions on `pair_signals`, checks that
+signals, per-bar state, trades and performance match, and reports the time
+each took. Then times `zscore_signals` on `--pairs` z-score series at once.
+
+    python -m bench_pair_signals --bars 20000 --pairs 500
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from bench_pair_scan import load_notebook
+from pair_signals import zscore_signals
+
+CONFIG = {
+    "initial_capital": 1000000,
+    "position_size_pct": 0.05,
+    "transaction_cost": 0.001,
+    # tight enough that positions close within the synthetic series
+    "stop_loss_pct": 0.002,
+    "take_profit_pct": 0.003,
+    "zscore_threshold": 2.0,
+}
+
+notebook = None
+
+
+def loop_generate_signals(series_data, metrics, config):
+    """
+    The notebook's original per-bar signal loop.
+
+    Generate trading signals with proper type handling and position-based exits
+
+    Parameters:
+    series_data (pd.DataFrame): Input data containing spread_zscore
+    metrics: Additional metrics (unused in current version)
+    config (dict): Configuration parameters including zscore_threshold
+
+    1 = buy/long entry
+    -1 = sell/short entry
+    0 = no trade
+    -2 = exit long position (sell to close)
+    2 = exit short position (buy to cover)
+    """
+    signals = pd.DataFrame(index=series_data.index)
+    zscore = series_data["spread_zscore"]
+    zscore_threshold = config["zscore_threshold"]
+
+    signals["signal"] = 0
+    signals["zscore"] = zscore
+    current_position = 0
+
+    for i in range(1, len(signals)):
+        curr_zscore = zscore.iloc[i]
+        prev_zscore = zscore.iloc[i - 1]
+
+        if pd.isna(curr_zscore) or pd.isna(prev_zscore):
+            continue
+
+        if current_position == 0:
+            if curr_zscore > zscore_threshold and prev_zscore <= zscore_threshold:
+                signals.iloc[i, signals.columns.get_loc("signal")] = -1
+                current_position = -1
+            elif curr_zscore < -zscore_threshold and prev_zscore >= -zscore_threshold:
+                signals.iloc[i, signals.columns.get_loc("signal")] = 1
+                current_position = 1
+        elif (curr_zscore < 0 and prev_zscore >= 0) or (
+            curr_zscore > 0 and prev_zscore <= 0
+        ):
+            if current_position == 1:
+                signals.iloc[i, signals.columns.get_loc("signal")] = -2
+                current_position = 0
+            elif current_position == -1:
+                signals.iloc[i, signals.columns.get_loc("signal")] = 2
+                current_position = 0
+
+    signals["signal"] = signals["signal"].fillna(0)
+    return signals
+
+
+def loop_backtest_pair_strategy(series_data, signals, config):
+    """
+    The notebook's original per-bar backtest loop.
+
+    Backtest pairs trading strategy with proper position tracking, stop loss, and profit taking
+    """
+    dtypes = {
+        "position": "int32",
+        "equity": "float64",
+        "returns": "float64",
+        "unrealized_pnl": "float64",
+        "active_qty1": "float64",
+        "active_qty2": "float64",
+    }
+
+    result_df = pd.DataFrame(
+        {
+            "position": [0] * len(signals),
+            "equity": [0.0] * len(signals),
+            "returns": [0.0] * len(signals),
+            "unrealized_pnl": [0.0] * len(signals),
+            "active_qty1": [0.0] * len(signals),
+            "active_qty2": [0.0] * len(signals),
+        },
+        index=signals.index,
+    ).astype(dtypes)
+
+    position = 0
+    running_equity = config["initial_capital"]  # Realized equity
+    returns = []
+    trades = []
+    active_qty1 = 0.0
+    active_qty2 = 0.0
+    entry_price1 = 0.0
+    entry_price2 = 0.0
+    entry_date = None
+    equity_curve = []
+
+    prev_daily_equity = running_equity  # Used to calculate daily returns
+
+    for i in range(len(signals)):
+        current_signal = signals["signal"].iloc[i]
+        price1 = series_data["price1"].iloc[i]
+        price2 = series_data["price2"].iloc[i]
+        hedge_ratio = series_data["hedge_ratio"].iloc[i]
+        current_date = signals.index[i]
+
+        # Calculate current PnL (unrealized)
+        if position == 1:
+            current_pnl = (active_qty1 * (price1 - entry_price1)) - (
+                active_qty2 * (price2 - entry_price2)
+            )
+        elif position == -1:
+            current_pnl = (-active_qty1 * (price1 - entry_price1)) + (
+                active_qty2 * (price2 - entry_price2)
+            )
+        else:
+            current_pnl = 0.0
+
+        period_return = 0.0
+
+        # Check stop loss / take profit if in a position
+        if position != 0:
+            pnl_pct = current_pnl / running_equity if running_equity != 0 else 0
+            if pnl_pct <= -config["stop_loss_pct"]:
+                exit_type = "stop_loss"
+            elif pnl_pct >= config["take_profit_pct"]:
+                exit_type = "take_profit"
+            else:
+                exit_type = None
+
+            if exit_type:
+                total_cost = (
+                    abs(active_qty1 * price1) + abs(active_qty2 * price2)
+                ) * config["transaction_cost"]
+                trade_return = current_pnl - total_cost
+                running_equity += trade_return  # Realize the trade return
+                # After realizing trade, current_pnl = 0 since position closes
+                current_pnl = 0.0
+
+                trades.append(
+                    {
+                        "date": current_date,
+                        "entry_date": entry_date,
+                        "signal": exit_type,
+                        "entry_price1": entry_price1,
+                        "entry_price2": entry_price2,
+                        "exit_price1": price1,
+                        "exit_price2": price2,
+                        "qty1": active_qty1,
+                        "qty2": active_qty2,
+                        "return": trade_return,
+                        "costs": total_cost,
+                        "position": position,
+                        "pnl_pct": pnl_pct * 100,
+                    }
+                )
+
+                position = 0
+                active_qty1 = 0.0
+                active_qty2 = 0.0
+                entry_date = None
+
+        # Handle new entries
+        elif current_signal in [1, -1] and position == 0:
+            position_size = running_equity * config["position_size_pct"]
+
+            if price1 <= 0 or price2 <= 0 or hedge_ratio is None or hedge_ratio <= 0:
+                # Invalid conditions for a trade
+                pass
+            else:
+                active_qty1 = position_size / price1
+                attempted_qty2 = (position_size * hedge_ratio) / price2
+
+                if attempted_qty2 > 1e6:
+                    print("Attempted qty2 too large, skipping trade.")
+                else:
+                    active_qty2 = attempted_qty2
+                    entry_price1 = price1
+                    entry_price2 = price2
+                    entry_date = current_date
+                    total_cost = (
+                        abs(active_qty1 * price1) + abs(active_qty2 * price2)
+                    ) * config["transaction_cost"]
+                    running_equity -= total_cost
+                    position = 1 if current_signal == 1 else -1
+
+        # Handle normal exits
+        elif (current_signal == -2 and position == 1) or (
+            current_signal == 2 and position == -1
+        ):
+
+            total_cost = (
+                abs(active_qty1 * price1) + abs(active_qty2 * price2)
+            ) * config["transaction_cost"]
+            trade_return = current_pnl - total_cost
+            running_equity += trade_return
+            current_pnl = 0.0  # Position closed, unrealized pnl realized
+            trades.append(
+                {
+                    "date": current_date,
+                    "entry_date": entry_date,
+                    "signal": current_signal,
+                    "entry_price1": entry_price1,
+                    "entry_price2": entry_price2,
+                    "exit_price1": price1,
+                    "exit_price2": price2,
+                    "qty1": active_qty1,
+                    "qty2": active_qty2,
+                    "return": trade_return,
+                    "costs": total_cost,
+                    "position": position,
+                    "pnl_pct": (
+                        (trade_return / running_equity) * 100
+                        if running_equity != 0
+                        else 0
+                    ),
+                }
+            )
+
+            position = 0
+            active_qty1 = 0.0
+            active_qty2 = 0.0
+            entry_date = None
+
+        # Daily mark-to-market equity calculation
+        daily_equity = running_equity + current_pnl
+
+        # Calculate daily returns based on daily_equity changes
+        if prev_daily_equity != 0:
+            period_return = (daily_equity / prev_daily_equity) - 1
+        else:
+            period_return = 0.0
+
+        prev_daily_equity = daily_equity
+
+        result_df.loc[signals.index[i]] = {
+            "position": position,
+            "equity": daily_equity,
+            "returns": period_return,
+            "unrealized_pnl": current_pnl,
+            "active_qty1": active_qty1,
+            "active_qty2": active_qty2,
+        }
+
+        returns.append(period_return)
+        equity_curve.append(daily_equity)
+
+    returns = pd.Series(returns, index=signals.index)
+    trades_df = pd.DataFrame(trades)
+    cumulative_returns = (
+        pd.Series(equity_curve, index=signals.index) / config["initial_capital"]
+    )
+
+    performance = notebook.calculate_performance_metrics(
+        returns, trades_df, cumulative_returns
+    )
+
+    return result_df, returns, performance, trades_df, cumulative_returns
+
+
+def synthetic_pair(bars: int, seed: int = 0) -> pd.DataFrame:
+    """Two legs whose log spread is an AR(1) around a drifting common price."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=bars, freq="min")
+    common = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    spread = np.zeros(bars)
+    for bar in range(1, bars):
+        spread[bar] = 0.97 * spread[bar - 1] + rng.normal(0, 0.05)
+
+    series_data = pd.DataFrame(
+        {"price1": common * np.exp(spread), "price2": common, "hedge_ratio": 1.0},
+        index=index,
+    )
+    series_data["spread"] = series_data["price1"] - series_data["price2"]
+    rolling = series_data["spread"].rolling(30)
+    series_data["spread_zscore"] = (
+        series_data["spread"] - rolling.mean()
+    ) / rolling.std()
+    return series_data
+
+
+def same_frame(expected: pd.DataFrame, actual: pd.DataFrame) -> bool:
+    if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+        return False
+    for column in expected.columns:
+        want, got = expected[column], actual[column]
+        if want.dtype.kind in "fiu" and got.dtype.kind in "fiu":
+            if not np.allclose(want, got, equal_nan=True):
+                return False
+        elif not want.equals(got):
+            return False
+    return True
+
+
+def same_backtest(expected: tuple, actual: tuple) -> bool:
+    result_df, returns, performance, trades, cumulative = expected
+    return (
+        same_frame(result_df, actual[0])
+        and np.allclose(returns, actual[1])
+        and performance.keys() == actual[2].keys()
+        and all(np.isclose(performance[k], actual[2][k]) for k in performance)
+        and same_frame(trades, actual[3])
+        and np.allclose(cumulative, actual[4])
+    )
+
+
+def main():
+    global notebook
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=20000)
+    parser.add_argument("--pairs", type=int, default=500)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", FutureWarning)
+    notebook = load_notebook()
+    series_data = synthetic_pair(args.bars)
+    print(f"{args.bars} bars")
+
+    start = time.perf_counter()
+    loop_signals = loop_generate_signals(series_data, None, CONFIG)
+    signals_loop = time.perf_counter() - start
+    start = time.perf_counter()
+    signals = notebook.generate_signals(series_data, None, CONFIG)
+    signals_kernel = time.perf_counter() - start
+    print(f"{'signals, loop':<24} {signals_loop:8.3f}s")
+    print(
+        f"{'signals, kernel':<24} {signals_kernel:8.3f}s  "
+        f"({signals_loop / signals_kernel:.0f}x, "
+        f"match: {same_frame(loop_signals, signals)}, "
+        f"{(signals['signal'] != 0).sum()} signals)"
+    )
+
+    start = time.perf_counter()
+    expected = loop_backtest_pair_strategy(series_data, loop_signals, CONFIG)
+    backtest_loop = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = notebook.backtest_pair_strategy(series_data, signals, CONFIG)
+    backtest_kernel = time.perf_counter() - start
+    print(f"{'backtest, loop':<24} {backtest_loop:8.3f}s")
+    print(
+        f"{'backtest, kernel':<24} {backtest_kernel:8.3f}s  "
+        f"({backtest_loop / backtest_kernel:.0f}x, "
+        f"match: {same_backtest(expected, actual)}, {len(actual[3])} trades)"
+    )
+
+    zscores = np.column_stack(
+        [
+            synthetic_pair(args.bars // 10, seed)["spread_zscore"].to_numpy()
+            for seed in range(args.pairs)
+        ]
+    )
+    start = time.perf_counter()
+    batch, positions = zscore_signals(zscores, CONFIG["zscore_threshold"])
+    elapsed = time.perf_counter() - start
+    single = [
+        zscore_signals(zscores[:, pair], CONFIG["zscore_threshold"])[0]
+        for pair in range(args.pairs)
+    ]
+    print(
+        f"{f'signals, {args.pairs} pairs':<24} {elapsed:8.3f}s  "
+        f"({zscores.shape[0]} bars each, matches one at a time: "
+        f"{np.array_equal(batch, np.column_stack(single))})"
+    )
+
+
+if __name__ == "__main__":
+    main()
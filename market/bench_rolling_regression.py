@@ -0,0 +1,126 @@
+"""Compare statsmodels/pandas rolling statistics against `rolling_regression`.
+
+For `--assets` synthetic instruments of `--days` daily closes, computes the
+pairs notebook's rolling statistics (rolling OLS of log prices, its rolling
+R-squared, and short and long rolling return correlations) the way it used to
+with `RollingOLS` and pandas, one pair at a time for `--sample` pairs, checks
+that the cumulative-sum kernels give the same numbers, then times
+`pair_regressions` on every pair of the universe at once.
+
+    python -m bench_rolling_regression --assets 100 --days 1100
+"""
+
+import argparse
+import time
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from statsmodels.regression.rolling import RollingOLS
+
+from bench_pair_scan import synthetic_prices
+from pair_scan import wide_prices
+from rolling_regression import pair_regressions, rolling_correlation, rolling_regression
+
+WINDOW = 30
+SHORT_WINDOW = 30
+LONG_WINDOW = 180
+
+
+def statsmodels_pair(close1: pd.Series, close2: pd.Series) -> dict:
+    """The notebook's rolling statistics as they were computed before."""
+    y = np.log(close1)
+    x = np.log(close2)
+    rols = RollingOLS(y, sm.add_constant(x.rename("x")), window=WINDOW).fit()
+    slope = rols.params["x"]
+    intercept = rols.params["const"]
+    residuals = y - (slope * x + intercept)
+    tss = ((y - y.rolling(window=WINDOW).mean()) ** 2).rolling(window=WINDOW).sum()
+    rss = (residuals**2).rolling(window=WINDOW).sum()
+
+    returns1 = close1.pct_change()
+    returns2 = close2.pct_change()
+    return {
+        "beta": slope,
+        "intercept": intercept,
+        "r_squared": 1 - rss / tss,
+        "short_correlation": returns1.rolling(SHORT_WINDOW).corr(returns2),
+        "long_correlation": returns1.rolling(LONG_WINDOW).corr(returns2),
+    }
+
+
+def kernel_pair(close1: pd.Series, close2: pd.Series) -> dict:
+    regression = rolling_regression(np.log(close1), np.log(close2), WINDOW)
+    returns1 = close1.pct_change()
+    returns2 = close2.pct_change()
+    return {
+        "beta": regression.beta,
+        "intercept": regression.intercept,
+        "r_squared": regression.r_squared,
+        "short_correlation": rolling_correlation(returns1, returns2, SHORT_WINDOW),
+        "long_correlation": rolling_correlation(returns1, returns2, LONG_WINDOW),
+    }
+
+
+def same_stats(expected: dict, actual: dict) -> bool:
+    return all(
+        np.allclose(expected[name], actual[name], equal_nan=True, atol=1e-8)
+        for name in expected
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=100)
+    parser.add_argument("--days", type=int, default=1100)
+    parser.add_argument("--sample", type=int, default=50)
+    args = parser.parse_args()
+
+    wide = wide_prices(synthetic_prices(args.assets, args.days))["bitfinex"]
+    pairs = list(combinations(wide.columns, 2))
+    sample = pairs[: args.sample]
+    print(f"{args.assets} assets, {args.days} days, {len(pairs)} pairs")
+
+    start = time.perf_counter()
+    expected = [statsmodels_pair(wide[a], wide[b]) for a, b in sample]
+    elapsed = time.perf_counter() - start
+    per_pair = elapsed / len(sample)
+    print(
+        f"{'statsmodels, per pair':<28} {per_pair * 1000:8.2f}ms  "
+        f"(all pairs: ~{per_pair * len(pairs):.0f}s)"
+    )
+
+    start = time.perf_counter()
+    actual = [kernel_pair(wide[a], wide[b]) for a, b in sample]
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'kernel, per pair':<28} {elapsed / len(sample) * 1000:8.2f}ms  "
+        f"(match: {all(same_stats(e, a) for e, a in zip(expected, actual))})"
+    )
+
+    start = time.perf_counter()
+    regressions = pair_regressions(wide, pairs, WINDOW)
+    returns = wide.pct_change()
+    for window in (SHORT_WINDOW, LONG_WINDOW):
+        rolling_correlation(
+            returns[[a for a, _ in pairs]].to_numpy(),
+            returns[[b for _, b in pairs]].to_numpy(),
+            window,
+        )
+    elapsed = time.perf_counter() - start
+    batch_matches = all(
+        np.allclose(
+            regressions[name][f"{a}/{b}"], stats[name], equal_nan=True, atol=1e-8
+        )
+        for (a, b), stats in zip(sample, expected)
+        for name in ("beta", "intercept", "r_squared")
+    )
+    print(
+        f"{'kernel, all pairs at once':<28} {elapsed:8.2f}s  "
+        f"(matches per pair: {batch_matches})"
+    )
+
+
+if __name__ == "__main__":
+    main()
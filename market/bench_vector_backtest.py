@@ -0,0 +1,123 @@
+"""Compare the backtrader scripts against `vector_backtest`.
+
+For each script in `vector_backtest.STRATEGIES`, runs its `Strategy` in
+backtrader and the matching vectorized backtest on `--days` synthetic daily
+bars (with opens that gap from the previous close, so some entries are
+rejected for cash as they are on real data), checks that both make the same
+transactions and end on the same value, and times them. Then times a sweep of
+`--sweep` param sets for the main script, and one run on `--minutes` minute
+bars, which would take backtrader over a minute at its daily per-bar rate.
+
+    python -m bench_vector_backtest --days 2300 --sweep 1000 --minutes 500000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import backtrader as bt
+import numpy as np
+
+from backtest_sweep import grid, load_script
+from bench_backtest_sweep import synthetic_ohlcv
+from vector_backtest import STRATEGIES, mcd_sma_stf_percent
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GAP = 0.003
+
+
+def script_path(name: str) -> str:
+    path = os.path.join(HERE, name)
+    return path if os.path.exists(path) else os.path.join(HERE, "archive", name)
+
+
+def backtrader_run(script, frame):
+    """Transactions as `(date, amount, price)` and the final value."""
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.setcash(script.icap)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=script.PercSize)
+    cerebro.addstrategy(script.Strategy)
+    cerebro.adddata(script.CustomPandas(dataname=frame, openinterest=None, stf="stf"))
+    cerebro.addanalyzer(bt.analyzers.Transactions, _name="txn")
+    with contextlib.redirect_stdout(io.StringIO()):
+        strategy = cerebro.run()[0]
+    transactions = [
+        (date, amount, price)
+        for date, (
+            (amount, price, *_),
+        ) in strategy.analyzers.txn.get_analysis().items()
+    ]
+    return transactions, cerebro.broker.getvalue()
+
+
+def same_transactions(expected, backtest) -> bool:
+    actual = list(backtest.transactions[["amount", "price"]].itertuples(name=None))
+    return len(expected) == len(actual) and all(
+        date.date() == other.date() and np.isclose(amount, a) and np.isclose(price, p)
+        for (date, amount, price), (other, a, p) in zip(expected, actual)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=2300)
+    parser.add_argument("--sweep", type=int, default=1000)
+    parser.add_argument("--minutes", type=int, default=500000)
+    args = parser.parse_args()
+
+    frame = synthetic_ohlcv(args.days, gap=GAP)
+    print(f"{args.days} days")
+    for name, strategy in STRATEGIES.items():
+        start = time.perf_counter()
+        expected, value = backtrader_run(load_script(script_path(name)), frame)
+        slow = time.perf_counter() - start
+
+        start = time.perf_counter()
+        backtest = strategy(frame)
+        fast = time.perf_counter() - start
+        matches = same_transactions(expected, backtest) and np.isclose(
+            value, backtest.value.iloc[-1]
+        )
+        print(
+            f"  {name:<42} backtrader {slow * 1000:6.0f}ms  "
+            f"vectorized {fast * 1000:5.1f}ms  ({slow / fast:4.0f}x, "
+            f"{len(expected)} transactions, matches: {matches})"
+        )
+
+    space = {
+        "trailpercent": list(np.linspace(0.05, 0.5, 10)),
+        "smaperiod": list(range(10, 60, 5)),
+        "dirperiod": list(range(5, 25, 2)),
+    }
+    candidates = grid(space)[: args.sweep]
+    start = time.perf_counter()
+    values = [
+        mcd_sma_stf_percent(frame, **params).value.iloc[-1] for params in candidates
+    ]
+    elapsed = time.perf_counter() - start
+    print(
+        f"\nsweep of {len(candidates)} param sets: {elapsed:.2f}s "
+        f"({elapsed / len(candidates) * 1000:.1f}ms each, best value {max(values):.0f})"
+    )
+
+    # the daily stock-to-flow walk runs away over this many bars, so it is
+    # replaced by the close's average over the last day
+    with np.errstate(over="ignore"):
+        minutes = synthetic_ohlcv(
+            args.minutes, gap=GAP / 10, freq="min", drift=0.0, volatility=0.001
+        )
+    minutes["stf"] = minutes["close"].rolling(1440, min_periods=1).mean()
+    start = time.perf_counter()
+    # a 1% trail, as 40% would rarely be reached within minutes
+    backtest = mcd_sma_stf_percent(minutes, trailpercent=0.01)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{args.minutes} minute bars: {elapsed:.2f}s "
+        f"({len(backtest.transactions)} transactions)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Compare the notebook's row-wise Garman-Klass against `volatility`.
+
+Builds `--pairs` synthetic instruments of hourly bars over `--years`, times the
+`DataFrame.apply(..., axis=1)` estimator on one of them against the vectorized
+one, then times `dispersion_tables` on all of them and checks its hour-of-day
+figures for one instrument against computing each hour separately.
+
+    python -m bench_volatility --pairs 50 --years 3
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from volatility import dispersion_tables, garman_klass, yang_zhang_k
+
+
+def synthetic_bars(pairs: int, hours: int, seed: int = 0) -> pd.DataFrame:
+    """Random-walk hourly OHLCV bars for `pairs` instruments, one after another."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2021-01-01", periods=hours, freq="h")
+    frames = []
+
+    for pair in range(pairs):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, hours)))
+        open = np.r_[close[0], close[:-1]] * np.exp(rng.normal(0, 0.001, hours))
+        high = np.maximum(open, close) * np.exp(np.abs(rng.normal(0, 0.005, hours)))
+        low = np.minimum(open, close) * np.exp(-np.abs(rng.normal(0, 0.005, hours)))
+        frames.append(
+            pd.DataFrame(
+                {
+                    "instrument": f"pair{pair}",
+                    "open": open,
+                    "high": high,
+                    "low": low,
+                    "close": close,
+                    "volume": rng.lognormal(5, 1, hours),
+                },
+                index=index,
+            )
+        )
+
+    return pd.concat(frames)
+
+
+def row_garman_klass(row):
+    return (
+        0.5 * np.log(row["high"] / row["low"]) ** 2
+        - (2 * np.log(2) - 1) * np.log(row["close"] / row["open"]) ** 2
+    )
+
+
+def hourly_matches(bars: pd.DataFrame, hourly: pd.DataFrame) -> bool:
+    """Every estimator for each hour, computed from that hour's bars alone."""
+    previous = bars["close"].shift(1)
+    returns = np.log(bars["close"] / previous)
+    overnight = np.log(bars["open"] / previous)
+    open_close = np.log(bars["close"] / bars["open"])
+    high_low = np.log(bars["high"] / bars["low"])
+    gk = bars.apply(row_garman_klass, axis=1)
+    rs = np.log(bars["high"] / bars["close"]) * np.log(
+        bars["high"] / bars["open"]
+    ) + np.log(bars["low"] / bars["close"]) * np.log(bars["low"] / bars["open"])
+
+    for hour in range(24):
+        at = bars.index.hour == hour
+        k = yang_zhang_k(at.sum())
+        expected = {
+            "close_to_close": returns[at].std(),
+            "parkinson": np.sqrt((high_low[at] ** 2).mean() / (4 * np.log(2))),
+            "garman_klass": np.sqrt(gk[at].mean()),
+            "rogers_satchell": np.sqrt(rs[at].mean()),
+            "yang_zhang": np.sqrt(
+                overnight[at].var() + k * open_close[at].var() + (1 - k) * rs[at].mean()
+            ),
+        }
+        for name, value in expected.items():
+            if not np.isclose(hourly.loc[hour, name], value):
+                return False
+
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--years", type=float, default=3)
+    args = parser.parse_args()
+
+    hours = int(args.years * 365 * 24)
+    bars = synthetic_bars(args.pairs, hours)
+    print(f"{args.pairs} pairs, {hours} hourly bars each ({len(bars)} rows)")
+
+    one = bars[bars["instrument"] == "pair0"].drop(columns="instrument")
+    start = time.perf_counter()
+    rowwise = one.apply(row_garman_klass, axis=1)
+    apply = time.perf_counter() - start
+    print(f"{'garman-klass, apply':<32} {apply:8.3f}s")
+
+    start = time.perf_counter()
+    vectorized = garman_klass(one["open"], one["high"], one["low"], one["close"])
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'garman-klass, vectorized':<32} {elapsed:8.3f}s  "
+        f"({apply / elapsed:.0f}x, match: {np.allclose(rowwise, vectorized)})"
+    )
+    print(f"{'apply, extrapolated to all pairs':<32} {apply * args.pairs:8.3f}s")
+
+    start = time.perf_counter()
+    hourly, daily = dispersion_tables(bars)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'dispersion tables, all pairs':<32} {elapsed:8.3f}s  "
+        f"({len(hourly)} hourly and {len(daily)} daily rows, 5 estimators)"
+    )
+
+    one_hourly, _ = dispersion_tables(one)
+    print(
+        f"hourly matches per-hour computation: {hourly_matches(one, one_hourly)}, "
+        f"single pair matches multi-pair: "
+        f"{np.allclose(one_hourly.values, hourly.loc['pair0'].values)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Time `walk_forward` on the main script's strategy.
+
+Builds `--days` of synthetic daily bars, and walks a grid of trailing-stop and
+SMA params forward over them in folds of `--train` in-sample and `--test`
+out-of-sample bars, in this process and across a process pool, checking both
+pick the same params and stitch the same equity curve. Checks that the folds'
+slices share memory with the frame, and that the stitched curve ends where the
+folds' out-of-sample returns compound to. For comparison, prints how the best
+params on the whole series (what a single fixed window picks) did there.
+
+    python -m bench_walk_forward --days 2300 --train 730 --test 180
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from backtest_sweep import grid
+from bench_backtest_sweep import synthetic_ohlcv
+from vector_backtest import CASH, mcd_sma_stf_percent
+from walk_forward import folds, performance, walk_forward
+
+GAP = 0.003
+SPACE = {
+    "trailpercent": [0.05, 0.1, 0.15, 0.2, 0.3, 0.4],
+    "smaperiod": [10, 20, 30, 50],
+    "dirperiod": [5, 10],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=2300)
+    parser.add_argument("--train", type=int, default=730)
+    parser.add_argument("--test", type=int, default=180)
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    frame = synthetic_ohlcv(args.days, gap=GAP)
+    candidates = grid(SPACE)
+    schedule = folds(len(frame), args.train, args.test)
+    print(
+        f"{args.days} days, {len(schedule)} folds x {len(candidates)} param sets, "
+        f"{os.cpu_count()} CPUs"
+    )
+
+    fold = schedule[-1]
+    history = frame.iloc[fold.train_start : fold.test_end]
+    print(
+        "fold slices share the frame's memory:",
+        all(
+            np.shares_memory(history[name].to_numpy(np.float64), frame[name].to_numpy())
+            for name in frame
+        ),
+    )
+
+    results = {}
+    for label, workers in (("folds, in process", 1), ("folds, process pool", None)):
+        start = time.perf_counter()
+        results[label] = walk_forward(
+            mcd_sma_stf_percent,
+            frame,
+            candidates,
+            args.train,
+            args.test,
+            max_workers=workers or args.max_workers,
+        )
+        elapsed = time.perf_counter() - start
+        runs = len(schedule) * (len(candidates) + 1)
+        print(
+            f"{label:<24} {elapsed:8.2f}s  "
+            f"({elapsed / runs * 1000:.1f}ms per backtest)"
+        )
+    serial, pooled = results.values()
+    print(
+        "pool matches in process:",
+        serial.folds.equals(pooled.folds) and serial.equity.equals(pooled.equity),
+    )
+    compounded = CASH * (1 + serial.folds["oos_return"]).prod()
+    print(
+        "stitched equity matches the folds' returns:",
+        np.isclose(serial.equity.iloc[-1], compounded),
+    )
+
+    print()
+    print(
+        serial.folds[
+            ["fold", "test_start", *SPACE, "is_sharpe", "oos_return", "oos_sharpe"]
+        ].to_string(index=False)
+    )
+    walked = performance(serial.equity)
+    tested = frame.index >= serial.equity.index[0]
+    fixed = max(
+        candidates,
+        key=lambda params: performance(mcd_sma_stf_percent(frame, **params).value)[
+            "sharpe"
+        ],
+    )
+    hindsight = performance(mcd_sma_stf_percent(frame, **fixed).value[tested])
+    print(
+        f"\nwalk-forward, out of sample: {walked['return']:8.2%} return, "
+        f"Sharpe {walked['sharpe']:.2f}"
+    )
+    print(
+        f"best params in hindsight:    {hindsight['return']:8.2%} return, "
+        f"Sharpe {hindsight['sharpe']:.2f}  ({fixed})"
+    )
+
+
+if __name__ == "__main__":
+    main()
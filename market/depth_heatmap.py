@@ -0,0 +1,247 @@
+"""
+Time × bps liquidity heatmaps of depth profiles from `orderbook_depth`.
+
+Months of minutely snapshots are far more columns than a screen has pixels, so
+`heatmap_grid` first bins the rows into at most `max_columns` equal time bins
+(like datashader does), and the figures are built from those bins. Minutes with
+no snapshot stay empty rather than being stretched over.
+
+`depth_heatmap` returns an interactive Plotly figure, `depth_animation` plays
+the per-bucket depth through time, and `save_heatmap` writes a static image
+with matplotlib, so no browser is needed.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import plotly.graph_objects as go
+from matplotlib.dates import date2num
+from matplotlib.figure import Figure
+
+from orderbook_depth import DepthProfile, parse_timestamps
+
+MAX_COLUMNS = 2000
+ASK_COLOR = "#2ecc71"
+BID_COLOR = "#e74c3c"
+
+
+class HeatmapGrid(NamedTuple):
+    """
+    Depth binned for display: `values[row, column]` is the liquidity `bps[row]`
+    from mid (bids negative) in the time bin starting at `times[column]`, or
+    NaN if the bin had no snapshots.
+    """
+
+    times: np.ndarray
+    bin_width: np.timedelta64
+    bps: np.ndarray
+    values: np.ndarray
+    snapshots: np.ndarray
+
+
+def heatmap_grid(
+    profile: DepthProfile,
+    usd: bool = True,
+    cumulative: bool = False,
+    max_columns: int = MAX_COLUMNS,
+    how: str = "mean",
+) -> HeatmapGrid:
+    """
+    Bins the rows of `profile`, which must hold one exchange and instrument
+    (a `merge_profiles` consolidation counts as one exchange), into at most
+    `max_columns` time bins of whole minutes, aggregating each with `how`
+    (`"mean"` or `"max"`).
+    """
+    if len(set(profile.exchanges)) > 1 or len(set(profile.instruments)) > 1:
+        raise ValueError("heatmap profiles must hold one exchange and instrument")
+    if how not in ("mean", "max"):
+        raise ValueError(f"unknown aggregation {how!r}")
+
+    suffix = "_usd" if usd else ""
+    if cumulative:
+        ask = getattr(profile, f"ask_cumulative{suffix}")
+        bid = getattr(profile, f"bid_cumulative{suffix}")
+    else:
+        ask = getattr(profile, f"ask{suffix}")
+        bid = getattr(profile, f"bid{suffix}")
+    # bids furthest from mid first, so rows run from -max to +max bps
+    bps = np.concatenate([-profile.grid_bps[::-1], profile.grid_bps])
+    values = np.concatenate([bid[:, ::-1], ask], axis=1)
+
+    minutes = parse_timestamps(profile.timestamps).astype("datetime64[m]")
+    order = np.argsort(minutes, kind="stable")
+    minutes = minutes[order]
+    values = values[order]
+
+    if not len(minutes):
+        return HeatmapGrid(
+            minutes, np.timedelta64(1, "m"), bps, np.empty((len(bps), 0)), np.array([])
+        )
+
+    span = int((minutes[-1] - minutes[0]) / np.timedelta64(1, "m")) + 1
+    width = -(-span // max_columns)
+    column = ((minutes - minutes[0]) / np.timedelta64(1, "m")).astype(int) // width
+    columns = column[-1] + 1
+
+    starts = np.flatnonzero(np.diff(column, prepend=-1))
+    counts = np.diff(starts, append=len(column))
+    if how == "mean":
+        binned = np.add.reduceat(values, starts, axis=0) / counts[:, None]
+    else:
+        binned = np.maximum.reduceat(values, starts, axis=0)
+
+    grid = np.full((columns, len(bps)), np.nan)
+    grid[column[starts]] = binned
+    snapshots = np.zeros(columns, dtype=int)
+    snapshots[column[starts]] = counts
+
+    width = np.timedelta64(width, "m")
+    return HeatmapGrid(
+        minutes[0] + np.arange(columns) * width, width, bps, grid.T, snapshots
+    )
+
+
+def heatmap_title(profile: DepthProfile, usd: bool, cumulative: bool) -> str:
+    kind = "Cumulative liquidity" if cumulative else "Liquidity"
+    unit = "$" if usd else "native"
+    return (
+        f"{kind} ({unit}) for {profile.instruments[0]} on {profile.exchanges[0]} "
+        f"by basis points from mid"
+    )
+
+
+def depth_heatmap(
+    profile: DepthProfile,
+    usd: bool = True,
+    cumulative: bool = False,
+    max_columns: int = MAX_COLUMNS,
+    how: str = "mean",
+) -> go.Figure:
+    """
+    Interactive heatmap of `profile`, time along x and distance from mid along
+    y (one row per grid point, bids below zero).
+    """
+    binned = heatmap_grid(profile, usd, cumulative, max_columns, how)
+    fig = go.Figure(
+        go.Heatmap(
+            x=binned.times,
+            y=[f"{b:g}" for b in binned.bps],
+            z=binned.values,
+            colorscale="Viridis",
+            colorbar={"title": "Amount ($)" if usd else "Amount"},
+            customdata=np.broadcast_to(binned.snapshots, binned.values.shape),
+            hovertemplate=(
+                "%{x}<br>%{y} bps<br>%{z:,.0f}<br>%{customdata} snapshots"
+                "<extra></extra>"
+            ),
+        )
+    )
+    fig.update_layout(
+        title=heatmap_title(profile, usd, cumulative),
+        xaxis_title=f"Time ({binned.bin_width.astype(int)} min bins)",
+        yaxis_title="Basis Points from Mid",
+        yaxis_type="category",
+        template="plotly_dark",
+    )
+    return fig
+
+
+def depth_animation(
+    profile: DepthProfile,
+    usd: bool = True,
+    cumulative: bool = False,
+    frames: int = 200,
+    how: str = "mean",
+) -> go.Figure:
+    """
+    Bar chart of depth by distance from mid, with one animation frame per time
+    bin (at most `frames`).
+    """
+    binned = heatmap_grid(profile, usd, cumulative, frames, how)
+    labels = [f"{b:g}" for b in binned.bps]
+    colors = [BID_COLOR if b < 0 else ASK_COLOR for b in binned.bps]
+    shown = np.flatnonzero(binned.snapshots)
+
+    def bars(column):
+        return go.Bar(x=labels, y=binned.values[:, column], marker_color=colors)
+
+    names = [str(binned.times[column]) for column in shown]
+    fig = go.Figure(
+        data=[bars(shown[0])] if len(shown) else [],
+        frames=[
+            go.Frame(data=[bars(column)], name=name)
+            for column, name in zip(shown, names)
+        ],
+    )
+    fig.update_layout(
+        title=heatmap_title(profile, usd, cumulative),
+        xaxis={"title": "Basis Points from Mid", "type": "category"},
+        yaxis={
+            "title": "Amount ($)" if usd else "Amount",
+            "range": [0, np.nanmax(binned.values, initial=0) * 1.05],
+        },
+        template="plotly_dark",
+        updatemenus=[
+            {
+                "type": "buttons",
+                "buttons": [
+                    {
+                        "label": "Play",
+                        "method": "animate",
+                        "args": [None, {"frame": {"duration": 100}}],
+                    }
+                ],
+            }
+        ],
+        sliders=[
+            {
+                "steps": [
+                    {
+                        "label": name,
+                        "method": "animate",
+                        "args": [[name], {"mode": "immediate"}],
+                    }
+                    for name in names
+                ]
+            }
+        ],
+    )
+    return fig
+
+
+def save_heatmap(
+    profile: DepthProfile,
+    path: str,
+    usd: bool = True,
+    cumulative: bool = False,
+    max_columns: int = MAX_COLUMNS,
+    how: str = "mean",
+    size: tuple[float, float] = (14, 6),
+    dpi: int = 150,
+):
+    """
+    Writes the heatmap of `profile` to `path` (`.png`, `.svg`, `.pdf`, ...)
+    without opening a window or a browser.
+    """
+    binned = heatmap_grid(profile, usd, cumulative, max_columns, how)
+    fig = Figure(figsize=size, dpi=dpi)
+    ax = fig.subplots()
+
+    if len(binned.times):
+        start = date2num(binned.times[0])
+        end = date2num(binned.times[-1] + binned.bin_width)
+        image = ax.imshow(
+            binned.values,
+            aspect="auto",
+            origin="lower",
+            interpolation="nearest",
+            extent=(start, end, -0.5, len(binned.bps) - 0.5),
+        )
+        fig.colorbar(image, ax=ax, label="Amount ($)" if usd else "Amount")
+        ax.xaxis_date()
+        fig.autofmt_xdate()
+
+    ax.set_yticks(range(len(binned.bps)), [f"{b:g}" for b in binned.bps])
+    ax.set_ylabel("Basis Points from Mid")
+    ax.set_title(heatmap_title(profile, usd, cumulative))
+    fig.savefig(path, bbox_inches="tight")
@@ -0,0 +1,173 @@
+"""
+Parquet store for depth profiles computed by `orderbook_depth`.
+
+Profiles are kept as one row per (timestamp, exchange, instrument), with the
+cumulative liquidity within each grid distance from mid in its own column
+(`ask_50` is everything offered within 50 bps of mid, `bid_usd_50` the same
+below mid in USD). Rows are partitioned by instrument, exchange and month, so a
+query like "depth at ±50 bps for eth_usd on bitfinex between T1 and T2" only
+opens the matching files and only decodes the columns for 50 bps.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from orderbook_depth import DepthProfile, parse_timestamps
+
+DEPTH_DIR = os.path.join("data", "depth")
+
+PARTITIONING = ds.partitioning(
+    pa.schema(
+        [("instrument", pa.string()), ("exchange", pa.string()), ("month", pa.string())]
+    ),
+    flavor="hive",
+)
+KEY_COLUMNS = ["timestamp", "exchange", "instrument"]
+
+
+def column_name(side: str, bps: float, usd: bool = False) -> str:
+    return f"{side}_usd_{bps:g}" if usd else f"{side}_{bps:g}"
+
+
+class DepthStore:
+    """
+    Append-only store of depth profiles on one bps grid, rooted at `root`.
+
+    Writing a minute that is already stored adds a newer copy; reads return the
+    most recently written one.
+    """
+
+    root: str
+    grid_bps: Optional[np.ndarray]
+
+    def __init__(self, root: str = DEPTH_DIR):
+        self.root = root
+        self.grid_path = os.path.join(root, "_grid.json")
+        self.grid_bps = None
+        if os.path.exists(self.grid_path):
+            with open(self.grid_path) as f:
+                self.grid_bps = np.array(json.load(f), dtype=np.float64)
+
+    def write(self, profile: DepthProfile):
+        if not len(profile.mids):
+            return
+
+        if self.grid_bps is None:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.grid_path, "w") as f:
+                json.dump(profile.grid_bps.tolist(), f)
+            self.grid_bps = np.array(profile.grid_bps, dtype=np.float64)
+        elif not np.array_equal(profile.grid_bps, self.grid_bps):
+            raise ValueError(
+                f"profile grid {profile.grid_bps.tolist()} does not match the "
+                f"store's grid {self.grid_bps.tolist()}"
+            )
+
+        timestamps = parse_timestamps(profile.timestamps)
+        columns = {
+            "timestamp": pa.array(timestamps, pa.timestamp("ms")),
+            "exchange": profile.exchanges,
+            "instrument": profile.instruments,
+            "month": np.datetime_as_string(timestamps, unit="M"),
+            "mid": profile.mids,
+        }
+        for side in ("ask", "bid"):
+            for usd in (False, True):
+                cumulative = getattr(
+                    profile, f"{side}_cumulative_usd" if usd else f"{side}_cumulative"
+                )
+                for i, bps in enumerate(self.grid_bps):
+                    columns[column_name(side, bps, usd)] = cumulative[:, i]
+
+        table = pa.table(columns).sort_by(
+            [
+                ("instrument", "ascending"),
+                ("exchange", "ascending"),
+                ("timestamp", "ascending"),
+            ]
+        )
+        ds.write_dataset(
+            table,
+            self.root,
+            format="parquet",
+            partitioning=PARTITIONING,
+            # one new file per write; names sort in write order for `read`
+            basename_template=f"part-{time.time_ns()}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        )
+
+    def read(
+        self,
+        instrument: str,
+        exchange: Optional[str] = None,
+        start: Optional[str | datetime] = None,
+        end: Optional[str | datetime] = None,
+        bps: Optional[list[float]] = None,
+        usd: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Cumulative depth for `instrument` (on `exchange`, or every exchange)
+        from `start` up to but not including `end`, at the `bps` grid points
+        (default all of them), in native units or USD.
+
+        Returns one row per timestamp and exchange with `mid` and an
+        `ask_<bps>`/`bid_<bps>` column per requested grid point.
+        """
+        if self.grid_bps is None:
+            raise FileNotFoundError(f"no depth profiles stored in {self.root}")
+
+        bps = self.grid_bps if bps is None else bps
+        missing = [b for b in bps if b not in self.grid_bps]
+        if missing:
+            raise ValueError(f"{missing} bps not on the store's grid {self.grid_bps}")
+
+        expression = pc.field("instrument") == instrument
+        if exchange is not None:
+            expression &= pc.field("exchange") == exchange
+        if start is not None:
+            start = pd.Timestamp(start)
+            expression &= (pc.field("month") >= start.strftime("%Y-%m")) & (
+                pc.field("timestamp") >= pa.scalar(start, pa.timestamp("ms"))
+            )
+        if end is not None:
+            end = pd.Timestamp(end)
+            expression &= (pc.field("month") <= end.strftime("%Y-%m")) & (
+                pc.field("timestamp") < pa.scalar(end, pa.timestamp("ms"))
+            )
+
+        wanted = [column_name(side, b, usd) for side in ("ask", "bid") for b in bps]
+        dataset = ds.dataset(self.root, format="parquet", partitioning=PARTITIONING)
+        frame = dataset.to_table(
+            columns=KEY_COLUMNS + ["mid"] + wanted, filter=expression
+        ).to_pandas()
+
+        frame = frame.drop_duplicates(KEY_COLUMNS, keep="last")
+        frame.columns = [
+            name.replace("_usd_", "_") if usd else name for name in frame.columns
+        ]
+        return frame.sort_values(["timestamp", "exchange"]).reset_index(drop=True)
+
+
+def resample(frame: pd.DataFrame, rule: str = "1h", how: str = "mean") -> pd.DataFrame:
+    """
+    Depth from `DepthStore.read` per `rule` (`"1h"`, `"1D"`, ...) and
+    exchange, aggregated with `how` (`"mean"`, `"min"`, `"last"`, ...).
+    """
+    return (
+        frame.set_index("timestamp")
+        .groupby(["instrument", "exchange"])
+        .resample(rule)
+        .agg(how)
+        .dropna(how="all")
+        .reset_index()
+    )
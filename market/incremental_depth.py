@@ -0,0 +1,171 @@
+"""
+Order book depth kept up to date from one snapshot to the next.
+
+Consecutive minutely snapshots usually differ in a handful of levels, so
+instead of bucketing the whole book again, `IncrementalDepth` diffs each side
+against the previous snapshot with `np.searchsorted` on the sorted prices and
+adds only the changed sizes into the per-bucket sums with `np.add.at`. Buckets
+are measured from an anchor mid; the book is re-bucketed in full only when the
+mid moves a grid step away from it.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from orderbook_depth import (
+    DEFAULT_GRID_BPS,
+    DepthProfile,
+    find_mid_price,
+    grid_buckets,
+    grid_index,
+    side_levels,
+)
+
+SIDES = ("ask", "bid")
+
+
+def positions(
+    haystack: np.ndarray, needles: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Index of each of `needles` in the sorted `haystack`, and whether it is there."""
+    index = np.searchsorted(haystack, needles)
+    found = index < len(haystack)
+    found[found] = haystack[index[found]] == needles[found]
+    return index, found
+
+
+class IncrementalDepth:
+    """
+    Depth of one book on a bps grid, moved from snapshot to snapshot by `update`.
+
+    The book is re-bucketed whenever the mid is `step_bps` or more from the
+    anchor, by default the finest step of the grid, so bucket edges are never
+    off by more than one grid step. With `step_bps=0` every snapshot is
+    re-bucketed and the result equals `depth_profile` on the same snapshots.
+
+    Each price should appear once per side.
+    """
+
+    grid: np.ndarray
+    step_bps: float
+    anchor: Optional[float]
+    mid: Optional[float]
+    prices: dict[str, np.ndarray]
+    volumes: dict[str, np.ndarray]
+    sums: dict[str, np.ndarray]
+
+    def __init__(
+        self,
+        grid_bps: np.ndarray | tuple = DEFAULT_GRID_BPS,
+        step_bps: Optional[float] = None,
+    ):
+        self.grid = np.asarray(grid_bps, dtype=np.float64)
+        if step_bps is None:
+            step_bps = float(np.diff(self.grid, prepend=0.0).min())
+        self.step_bps = step_bps
+        self.anchor = None
+        self.mid = None
+        self.prices = {side: np.empty(0) for side in SIDES}
+        self.volumes = {side: np.empty(0) for side in SIDES}
+        self.sums = {
+            name: np.zeros(len(self.grid))
+            for side in SIDES
+            for name in (side, f"{side}_usd")
+        }
+
+        self.rebuckets = 0
+        self.level_changes = 0
+
+    def rebucket(self, anchor: float):
+        """Measures every level from `anchor` and recomputes all bucket sums."""
+        self.anchor = anchor
+        self.rebuckets += 1
+
+        for side in SIDES:
+            prices = self.prices[side]
+            liquidity, liquidity_usd = grid_buckets(
+                prices,
+                self.volumes[side],
+                np.array([len(prices)]),
+                np.array([anchor]),
+                self.grid,
+                side,
+            )
+            self.sums[side] = liquidity[0]
+            self.sums[f"{side}_usd"] = liquidity_usd[0]
+
+    def _apply(self, side: str, prices: np.ndarray, volumes: np.ndarray):
+        # sizes at prices in the new book, less what the old book had there
+        old_prices, old_volumes = self.prices[side], self.volumes[side]
+        index, found = positions(old_prices, prices)
+        previous = np.zeros(len(prices))
+        previous[found] = old_volumes[index[found]]
+
+        # levels the new book no longer has
+        _, kept = positions(prices, old_prices)
+
+        changed = np.concatenate([prices, old_prices[~kept]])
+        delta = np.concatenate([volumes - previous, -old_volumes[~kept]])
+        moved = delta != 0
+        changed, delta = changed[moved], delta[moved]
+        self.level_changes += len(changed)
+
+        bucket, keep = grid_index(
+            changed, np.full(len(changed), self.anchor), self.grid, side
+        )
+        np.add.at(self.sums[side], bucket[keep], delta[keep])
+        np.add.at(self.sums[f"{side}_usd"], bucket[keep], (changed * delta)[keep])
+
+        self.prices[side], self.volumes[side] = prices, volumes
+
+    def update(self, snapshot: dict):
+        """
+        Moves the book to `snapshot`, adding only the levels that differ from
+        the previous one, or re-bucketing if the mid moved a grid step.
+        """
+        mid = find_mid_price(snapshot["ask"], snapshot["bid"])
+        rebucket = (
+            self.anchor is None
+            or abs(mid - self.anchor) / self.anchor * 10000 >= self.step_bps
+        )
+
+        for side in SIDES:
+            prices, volumes, _ = side_levels([snapshot], side)
+            order = np.argsort(prices, kind="stable")
+            prices, volumes = prices[order], volumes[order]
+            if rebucket:
+                self.prices[side], self.volumes[side] = prices, volumes
+            else:
+                self._apply(side, prices, volumes)
+
+        if rebucket:
+            self.rebucket(mid)
+        self.mid = mid
+
+    def profile(self, snapshots: list[dict]) -> DepthProfile:
+        """
+        Updates through `snapshots` in order and returns the depth after each,
+        as `depth_profile` would. Snapshots with an empty side are skipped.
+        """
+        snapshots = [s for s in snapshots if s["ask"] and s["bid"]]
+        rows = {name: [] for name in ("ask", "ask_usd", "bid", "bid_usd")}
+        mids = []
+
+        for snapshot in snapshots:
+            self.update(snapshot)
+            mids.append(self.mid)
+            for name, values in rows.items():
+                values.append(self.sums[name].copy())
+
+        return DepthProfile(
+            self.grid,
+            [s["timestamp"] for s in snapshots],
+            [s["exchange"] for s in snapshots],
+            [s["instrument"] for s in snapshots],
+            np.array(mids),
+            **{
+                name: np.array(values).reshape(len(snapshots), len(self.grid))
+                for name, values in rows.items()
+            },
+        )
@@ -0,0 +1,214 @@
+"""
+Cheap pre-screening of candidate pairs before the statsmodels tests.
+
+For every pair of instruments on an exchange at once, `prescreen_pairs` counts
+the timestamps both have prices for, takes the correlation of their returns
+from a single matrix product, and estimates how quickly the log-price spread
+mean-reverts (the AR(1) half-life of `log p1 - beta * log p2`, with `beta`
+from the full-sample covariance). Pairs are dropped stage by stage against
+thresholds in the config, the survivors are ranked fastest-reverting first, and
+a report says how many pairs each stage removed.
+
+Correlations and betas are taken over each instrument's own observations, so
+with gaps in the data they are close to, not exactly, the pairwise figures.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from pair_scan import wide_prices
+
+MIN_CORRELATION = 0.3
+MAX_HALF_LIFE = 100
+# pairs whose spreads are measured at once by `half_lives`
+PAIR_BLOCK = 1024
+CANDIDATE_COLUMNS = [
+    "exchange",
+    "pair1",
+    "pair2",
+    "observations",
+    "correlation",
+    "beta",
+    "half_life",
+]
+
+
+class Prescreen(NamedTuple):
+    # surviving pairs with `CANDIDATE_COLUMNS`, best first
+    candidates: pd.DataFrame
+    # per exchange and stage, how many pairs remained and how many it removed
+    report: pd.DataFrame
+
+    def pairs(self) -> list[tuple[str, str, str]]:
+        """The candidates as `(exchange, pair1, pair2)`, for `scan_pairs`."""
+        return list(
+            self.candidates[["exchange", "pair1", "pair2"]].itertuples(
+                index=False, name=None
+            )
+        )
+
+
+def column_std(values: np.ndarray, valid: np.ndarray):
+    """Mean and sample standard deviation of each column over its valid rows."""
+    count = np.maximum(valid.sum(axis=0), 2)
+    mean = np.where(valid, values, 0.0).sum(axis=0) / count
+    centred = np.where(valid, values - mean, 0.0)
+    return mean, np.sqrt((centred**2).sum(axis=0) / (count - 1))
+
+
+def standardized(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Columns scaled to mean 0 and standard deviation 1 over their valid rows,
+    with invalid rows set to 0."""
+    mean, std = column_std(values, valid)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(valid & (std > 0), (values - mean) / std, 0.0)
+
+
+def correlation_matrix(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Correlation of every pair of columns from one matrix product."""
+    z = standardized(values, valid)
+    overlap = valid.T.astype(np.float64) @ valid.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (z.T @ z) / (overlap - 1)
+
+
+def half_lives(
+    log_prices: np.ndarray, first: np.ndarray, second: np.ndarray, beta: np.ndarray
+) -> np.ndarray:
+    """
+    Bars for the spread `log_prices[:, first] - beta * log_prices[:, second]`
+    to halve its distance from its mean, from its lag-1 autoregression; inf if
+    it does not revert.
+    """
+    result = np.full(len(first), np.inf)
+
+    for start in range(0, len(first), PAIR_BLOCK):
+        block = slice(start, start + PAIR_BLOCK)
+        spread = (
+            log_prices[:, first[block]] - beta[block] * log_prices[:, second[block]]
+        )
+        current = spread[1:]
+        previous = spread[:-1]
+        valid = np.isfinite(current) & np.isfinite(previous)
+        count = np.maximum(valid.sum(axis=0), 2)
+        current_mean = np.where(valid, current, 0.0).sum(axis=0) / count
+        previous_mean = np.where(valid, previous, 0.0).sum(axis=0) / count
+        lagged = np.where(valid, previous - previous_mean, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            phi = (np.where(valid, current - current_mean, 0.0) * lagged).sum(
+                axis=0
+            ) / (lagged**2).sum(axis=0)
+            reverting = (phi > 0) & (phi < 1)
+            result[block] = np.where(
+                reverting, -np.log(2) / np.log(np.where(reverting, phi, 0.5)), np.inf
+            )
+
+    return result
+
+
+def screen_exchange(
+    wide: pd.DataFrame, pairs: list[str], exchange: str, config: dict
+) -> tuple[pd.DataFrame, list[dict]]:
+    pairs = [pair for pair in pairs if pair in wide.columns]
+    prices = wide[pairs].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_prices = np.log(prices)
+    priced = np.isfinite(log_prices)
+    returns = prices[1:] / prices[:-1] - 1
+    returned = np.isfinite(returns)
+
+    first, second = np.triu_indices(len(pairs), k=1)
+    stages = [{"exchange": exchange, "stage": "all pairs", "remaining": len(first)}]
+
+    def keep(mask, stage):
+        nonlocal first, second
+        first, second = first[mask], second[mask]
+        stages.append({"exchange": exchange, "stage": stage, "remaining": len(first)})
+        return mask
+
+    overlap = priced.T.astype(np.float64) @ priced.astype(np.float64)
+    observations = overlap[first, second]
+    min_data_points = config.get("min_data_points", 0)
+    observations = observations[keep(observations >= min_data_points, "enough data")]
+
+    correlation = correlation_matrix(returns, returned)[first, second]
+    min_correlation = config.get("prescreen_min_correlation", MIN_CORRELATION)
+    passed = keep(np.abs(correlation) >= min_correlation, "return correlation")
+    correlation, observations = correlation[passed], observations[passed]
+
+    # slope of log p1 on log p2, as test_cointegration regresses them
+    _, std = column_std(log_prices, priced)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = (
+            correlation_matrix(log_prices, priced)[first, second]
+            * std[first]
+            / std[second]
+        )
+
+    half_life = half_lives(log_prices, first, second, beta)
+    max_half_life = config.get("prescreen_max_half_life", MAX_HALF_LIFE)
+    passed = keep(half_life <= max_half_life, "spread half-life")
+    correlation, observations = correlation[passed], observations[passed]
+    beta, half_life = beta[passed], half_life[passed]
+
+    candidates = pd.DataFrame(
+        {
+            "exchange": exchange,
+            "pair1": np.array(pairs, dtype=object)[first],
+            "pair2": np.array(pairs, dtype=object)[second],
+            "observations": observations.astype(int),
+            "correlation": correlation,
+            "beta": beta,
+            "half_life": half_life,
+        }
+    ).sort_values(["half_life", "correlation"], ascending=[True, False])
+
+    top = config.get("prescreen_top")
+    if top is not None:
+        candidates = candidates.head(top)
+        stages.append(
+            {"exchange": exchange, "stage": "top ranked", "remaining": len(candidates)}
+        )
+
+    return candidates, stages
+
+
+def prescreen_pairs(
+    prices_df: pd.DataFrame,
+    pairs: list[str],
+    exchanges: list[str],
+    config: dict,
+    wide: Optional[dict[str, pd.DataFrame]] = None,
+) -> Prescreen:
+    """
+    Screens every pair of `pairs` on each of `exchanges`, keeping those with at
+    least `config["min_data_points"]` common timestamps, an absolute return
+    correlation of at least `config["prescreen_min_correlation"]`, and a spread
+    half-life of at most `config["prescreen_max_half_life"]` bars, ranked by
+    half-life; `config["prescreen_top"]` keeps only that many per exchange.
+    Pass `wide` (from `pair_scan.wide_prices`) to reuse an existing pivot.
+    """
+    wide = wide_prices(prices_df, exchanges) if wide is None else wide
+    screened = []
+    stages = []
+    for exchange in exchanges:
+        if exchange not in wide:
+            continue
+        candidates, exchange_stages = screen_exchange(
+            wide[exchange], pairs, exchange, config
+        )
+        screened.append(candidates)
+        stages.extend(exchange_stages)
+
+    report = pd.DataFrame(stages, columns=["exchange", "stage", "remaining"])
+    report["eliminated"] = (
+        report.groupby("exchange")["remaining"].diff().fillna(0).abs().astype(int)
+    )
+    candidates = (
+        pd.concat(screened, ignore_index=True)
+        if screened
+        else pd.DataFrame(columns=CANDIDATE_COLUMNS)
+    )
+    return Prescreen(candidates, report)
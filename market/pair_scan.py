@@ -0,0 +1,201 @@
+"""
+Pair screening across a process pool.
+
+Prices are pivoted once into one wide close matrix per exchange (a column per
+instrument), which every worker receives once when it starts. Candidate pairs
+are then sent out in small chunks of `(exchange, pair1, pair2)` names, so each
+task pickles a few strings rather than price frames, and results are yielded as
+soon as their chunk finishes.
+"""
+
+import importlib.util
+import multiprocessing
+import os
+import sys
+import traceback
+import warnings
+from concurrent.futures import as_completed
+from itertools import combinations
+from multiprocessing.context import BaseContext
+from typing import Any, Callable, Iterator, NamedTuple, Optional
+
+import pandas as pd
+
+from worker_pool import set_state, state, worker_pool
+
+CHUNK_SIZE = 16
+
+Evaluator = Callable[[pd.DataFrame, pd.DataFrame, dict], Any]
+
+
+class PairResult(NamedTuple):
+    exchange: str
+    pair1: str
+    pair2: str
+    # whatever the evaluator returned, or None if the pair had too little data
+    result: Any
+    # the evaluator's traceback, if it raised
+    error: Optional[str]
+
+
+def wide_prices(
+    prices_df: pd.DataFrame,
+    exchanges: Optional[list[str]] = None,
+    value: str = "close",
+    timestamp: str = "exchangeTimestamp",
+) -> dict[str, pd.DataFrame]:
+    """
+    `value` per timestamp with one column per instrument, for each exchange in
+    `exchanges` (default all), from a long frame of `instrument`, `exchange`
+    and `value` rows. Timestamps come from the `timestamp` column, or the index
+    if there is no such column.
+    """
+    if timestamp in prices_df.columns:
+        prices_df = prices_df.set_index(timestamp)
+    if exchanges is not None:
+        prices_df = prices_df[prices_df["exchange"].isin(exchanges)]
+
+    wide = prices_df.pivot_table(
+        index=prices_df.index,
+        columns=["exchange", "instrument"],
+        values=value,
+        aggfunc="last",
+    ).sort_index()
+    return {
+        exchange: wide[exchange].dropna(how="all")
+        for exchange in wide.columns.get_level_values("exchange").unique()
+    }
+
+
+def pair_frames(
+    wide: pd.DataFrame, pair1: str, pair2: str, exchange: str
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    The two legs of a pair as frames of `close`, `instrument` and `exchange`,
+    on the timestamps where both have a price.
+    """
+    both = wide[[pair1, pair2]].dropna()
+    return tuple(
+        pd.DataFrame(
+            {"close": both[pair], "instrument": pair, "exchange": exchange},
+            index=both.index,
+        )
+        for pair in (pair1, pair2)
+    )
+
+
+def candidate_pairs(
+    pairs: list[str], exchanges: list[str]
+) -> list[tuple[str, str, str]]:
+    return [
+        (exchange, pair1, pair2)
+        for exchange in exchanges
+        for pair1, pair2 in combinations(pairs, 2)
+    ]
+
+
+def _evaluate_chunk(chunk: list[tuple[str, str, str]]) -> list[PairResult]:
+    results = []
+    evaluate, config = state["evaluate"], state["config"]
+    min_data_points = config.get("min_data_points", 0)
+
+    for exchange, pair1, pair2 in chunk:
+        wide = state["wide"].get(exchange)
+        if wide is None or pair1 not in wide or pair2 not in wide:
+            results.append(PairResult(exchange, pair1, pair2, None, None))
+            continue
+
+        df1, df2 = pair_frames(wide, pair1, pair2, exchange)
+        if len(df1) < min_data_points:
+            results.append(PairResult(exchange, pair1, pair2, None, None))
+            continue
+
+        try:
+            result = evaluate(df1, df2, config)
+            results.append(PairResult(exchange, pair1, pair2, result, None))
+        except Exception:
+            results.append(
+                PairResult(exchange, pair1, pair2, None, traceback.format_exc())
+            )
+
+    return results
+
+
+def _importable(func: Callable) -> bool:
+    """Whether a spawned worker can import `func` by its module and name."""
+    if "<locals>" in func.__qualname__:
+        return False
+    if func.__module__ == "__main__":
+        # a script is re-run in each worker, a notebook or REPL cannot be
+        return os.path.isfile(getattr(sys.modules["__main__"], "__file__", ""))
+    try:
+        return importlib.util.find_spec(func.__module__) is not None
+    except (ImportError, ValueError):
+        # e.g. a module built at runtime and only registered in sys.modules
+        return False
+
+
+def scan_pairs(
+    prices_df: pd.DataFrame,
+    pairs: list[str],
+    exchanges: list[str],
+    evaluate: Evaluator,
+    config: dict,
+    max_workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    candidates: Optional[list[tuple[str, str, str]]] = None,
+    mp_context: Optional[BaseContext] = None,
+    wide: Optional[dict[str, pd.DataFrame]] = None,
+) -> Iterator[PairResult]:
+    """
+    Calls `evaluate(df1, df2, config)` for every pair of `pairs` on every one of
+    `exchanges`, yielding a `PairResult` per pair as its chunk completes (not
+    in pair order). Pairs with fewer than `config["min_data_points"]` common
+    timestamps are yielded with no result and not evaluated.
+
+    Workers are forked on Linux, so `evaluate` may be a function defined in a
+    notebook, and spawned elsewhere (pass `mp_context` for another start
+    method). Spawned workers import `evaluate` by name, so it has to live in a
+    module or script; one they cannot import, such as a function defined in a
+    notebook, is evaluated in this process with a warning rather than breaking
+    the pool. `max_workers=1` always evaluates in this process, which is easier
+    to debug.
+
+    `candidates` limits the scan to those `(exchange, pair1, pair2)`, such as
+    the survivors of `pair_prescreen.prescreen_pairs`, in that order. Pass
+    `wide` (from `wide_prices`) to reuse the pivot the prescreen was run on.
+    """
+    wide = wide_prices(prices_df, exchanges) if wide is None else wide
+    if candidates is None:
+        candidates = candidate_pairs(pairs, exchanges)
+    chunks = [
+        candidates[i : i + chunk_size] for i in range(0, len(candidates), chunk_size)
+    ]
+
+    if mp_context is None:
+        # macOS offers fork too, but system libraries can crash in forked children
+        linux = sys.platform.startswith("linux")
+        mp_context = multiprocessing.get_context("fork" if linux else "spawn")
+    method = mp_context.get_start_method()
+
+    values = {"wide": wide, "evaluate": evaluate, "config": config}
+    serial = max_workers == 1
+    if not serial and method != "fork" and not _importable(evaluate):
+        warnings.warn(
+            f"{method} workers cannot import {evaluate.__qualname__}, so pairs are "
+            "scanned in this process; define it in a module to use the pool",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+        serial = True
+
+    if serial:
+        set_state(values)
+        for chunk in chunks:
+            yield from _evaluate_chunk(chunk)
+        return
+
+    with worker_pool(max_workers, values, mp_context) as pool:
+        futures = [pool.submit(_evaluate_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
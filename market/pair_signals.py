@@ -0,0 +1,240 @@
+"""
+Array kernels for the pairs trading notebook's signal and backtest state
+machines.
+
+Both machines only change state at a handful of bars: the signal machine enters
+when the z-score crosses a threshold and exits when it next crosses zero, and
+the backtest holds a position until its P&L first reaches the stop loss or take
+profit. So instead of visiting every bar in Python, the crossings and P&L are
+computed as arrays and the Python loop only steps from one trade to the next.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+LONG_ENTRY = 1
+SHORT_ENTRY = -1
+LONG_EXIT = -2
+SHORT_EXIT = 2
+
+# bars of P&L computed at a time while looking for a trade's exit
+EXIT_SEARCH = 64
+
+
+def crossings(zscore: np.ndarray, threshold: float):
+    """
+    Bars (along axis 0) where the z-score crosses above `threshold`, below
+    `-threshold`, and through zero, compared with the bar before. A bar where
+    either z-score is NaN crosses nothing.
+    """
+    current = zscore[1:]
+    previous = zscore[:-1]
+    no_cross = np.zeros((1,) + zscore.shape[1:], dtype=bool)
+
+    def from_second_bar(mask):
+        return np.concatenate([no_cross, mask])
+
+    with np.errstate(invalid="ignore"):
+        above = from_second_bar((current > threshold) & (previous <= threshold))
+        below = from_second_bar((current < -threshold) & (previous >= -threshold))
+        zero = from_second_bar(
+            ((current < 0) & (previous >= 0)) | ((current > 0) & (previous <= 0))
+        )
+    return above, below, zero
+
+
+def _column_signals(above, below, zero, signals, positions):
+    entries = np.flatnonzero(above | below)
+    exits = np.flatnonzero(zero)
+    last_exit = -1
+
+    while True:
+        # the first entry after the last exit; the exit bar itself is spent closing
+        k = np.searchsorted(entries, last_exit, "right")
+        if k == len(entries):
+            break
+        entry = entries[k]
+        side = SHORT_ENTRY if above[entry] else LONG_ENTRY
+        signals[entry] = side
+
+        k = np.searchsorted(exits, entry, "right")
+        if k == len(exits):
+            positions[entry:] = side
+            break
+        last_exit = exits[k]
+        signals[last_exit] = LONG_EXIT if side == LONG_ENTRY else SHORT_EXIT
+        positions[entry:last_exit] = side
+
+
+def zscore_signals(zscore: np.ndarray, threshold: float):
+    """
+    The notebook's `generate_signals` state machine for z-scores of shape
+    `(bars,)` or `(bars, pairs)`: short (-1) when the z-score crosses above
+    `threshold`, long (1) when it crosses below `-threshold`, and exit (-2 for a
+    long, 2 for a short) at the next zero crossing.
+
+    Returns `(signals, positions)`, both shaped like `zscore`, where
+    `positions` is the machine's position after each bar.
+    """
+    zscore = np.asarray(zscore, dtype=np.float64)
+    columns = zscore.reshape(len(zscore), -1)
+    above, below, zero = crossings(columns, threshold)
+    signals = np.zeros(columns.shape, dtype=np.int64)
+    positions = np.zeros(columns.shape, dtype=np.int64)
+
+    for column in range(columns.shape[1]):
+        _column_signals(
+            above[:, column],
+            below[:, column],
+            zero[:, column],
+            signals[:, column],
+            positions[:, column],
+        )
+
+    return signals.reshape(zscore.shape), positions.reshape(zscore.shape)
+
+
+class Backtest(NamedTuple):
+    """Per-bar state of `backtest_positions`, plus the closed trades."""
+
+    position: np.ndarray
+    equity: np.ndarray
+    returns: np.ndarray
+    unrealized_pnl: np.ndarray
+    active_qty1: np.ndarray
+    active_qty2: np.ndarray
+    trades: list[dict]
+
+
+def backtest_positions(
+    index: pd.Index,
+    price1: np.ndarray,
+    price2: np.ndarray,
+    hedge_ratio: float,
+    signals: np.ndarray,
+    config: dict,
+) -> Backtest:
+    """
+    The notebook's `backtest_pair_strategy` loop: enter on a 1 or -1 signal when
+    flat, sizing the first leg at `position_size_pct` of realized equity and
+    the second at `hedge_ratio` times that, and hold until the P&L reaches
+    `-stop_loss_pct` or `take_profit_pct` of realized equity. Like the loop,
+    the exit signals do not close positions.
+    """
+    bars = len(signals)
+    position = np.zeros(bars, dtype=np.int32)
+    unrealized = np.zeros(bars)
+    qty1 = np.zeros(bars)
+    qty2 = np.zeros(bars)
+    # realized equity after each bar
+    realized = np.empty(bars)
+    trades = []
+
+    running_equity = config["initial_capital"]
+    candidates = np.flatnonzero((signals == LONG_ENTRY) | (signals == SHORT_ENTRY))
+    done = 0  # bars before this are filled in
+
+    k = 0
+    while k < len(candidates):
+        entry = candidates[k]
+        k += 1
+        p1 = price1[entry]
+        p2 = price2[entry]
+        if p1 <= 0 or p2 <= 0 or hedge_ratio is None or hedge_ratio <= 0:
+            continue
+
+        position_size = running_equity * config["position_size_pct"]
+        active_qty1 = position_size / p1
+        attempted_qty2 = (position_size * hedge_ratio) / p2
+        if attempted_qty2 > 1e6:
+            print("Attempted qty2 too large, skipping trade.")
+            continue
+        active_qty2 = attempted_qty2
+
+        realized[done:entry] = running_equity
+        total_cost = (abs(active_qty1 * p1) + abs(active_qty2 * p2)) * config[
+            "transaction_cost"
+        ]
+        running_equity -= total_cost
+        side = 1 if signals[entry] == LONG_ENTRY else -1
+        realized[entry] = running_equity
+        position[entry] = side
+        qty1[entry] = active_qty1
+        qty2[entry] = active_qty2
+
+        exit_bar = None
+        for begin in range(entry + 1, bars, EXIT_SEARCH):
+            end = min(begin + EXIT_SEARCH, bars)
+            delta1 = price1[begin:end] - p1
+            delta2 = price2[begin:end] - p2
+            if side == 1:
+                pnl = (active_qty1 * delta1) - (active_qty2 * delta2)
+            else:
+                pnl = (-active_qty1 * delta1) + (active_qty2 * delta2)
+            if running_equity != 0:
+                pnl_pct = pnl / running_equity
+            else:
+                pnl_pct = np.zeros_like(pnl)
+            hit = np.flatnonzero(
+                (pnl_pct <= -config["stop_loss_pct"])
+                | (pnl_pct >= config["take_profit_pct"])
+            )
+            held = end if not len(hit) else begin + hit[0]
+            unrealized[begin:held] = pnl[: held - begin]
+            position[begin:held] = side
+            qty1[begin:held] = active_qty1
+            qty2[begin:held] = active_qty2
+            realized[begin:held] = running_equity
+            if len(hit):
+                exit_bar = held
+                exit_pnl = pnl[hit[0]]
+                exit_pct = pnl_pct[hit[0]]
+                break
+
+        if exit_bar is None:
+            done = bars
+            break
+
+        exit1 = price1[exit_bar]
+        exit2 = price2[exit_bar]
+        total_cost = (abs(active_qty1 * exit1) + abs(active_qty2 * exit2)) * config[
+            "transaction_cost"
+        ]
+        trade_return = exit_pnl - total_cost
+        running_equity += trade_return
+        realized[exit_bar] = running_equity
+        trades.append(
+            {
+                "date": index[exit_bar],
+                "entry_date": index[entry],
+                "signal": (
+                    "stop_loss"
+                    if exit_pct <= -config["stop_loss_pct"]
+                    else "take_profit"
+                ),
+                "entry_price1": p1,
+                "entry_price2": p2,
+                "exit_price1": exit1,
+                "exit_price2": exit2,
+                "qty1": active_qty1,
+                "qty2": active_qty2,
+                "return": trade_return,
+                "costs": total_cost,
+                "position": side,
+                "pnl_pct": exit_pct * 100,
+            }
+        )
+
+        done = exit_bar + 1
+        # entries while the position was open were ignored
+        k = np.searchsorted(candidates, exit_bar, "right")
+
+    realized[done:] = running_equity
+    equity = realized + unrealized
+    previous = np.concatenate([[config["initial_capital"]], equity[:-1]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(previous != 0, (equity / previous) - 1, 0.0)
+
+    return Backtest(position, equity, returns, unrealized, qty1, qty2, trades)
@@ -0,0 +1,168 @@
+"""
+Rolling OLS, R² and correlation for many pairs at once from cumulative sums.
+
+Every rolling statistic here is built from window sums of x, y, x², y² and xy,
+and each window sum is a difference of two cumulative sums, so a series of any
+length costs a few passes over the data whatever the window. Inputs are
+`(bars,)` or `(bars, pairs)` arrays; each column is independent.
+
+A window containing a NaN in either input gives NaN, like pandas' rolling with
+the default `min_periods`.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# pairs handled per block by `pair_regressions`, to bound memory on long series
+PAIR_BLOCK = 512
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum of each `window` rows ending at every row (NaN for the first ones)."""
+    sums = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return sums
+    cumulative = np.cumsum(values, axis=0)
+    sums[window - 1] = cumulative[window - 1]
+    sums[window:] = cumulative[window:] - cumulative[:-window]
+    return sums
+
+
+def nan_rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """`rolling_sum`, but NaN for any window that contains a NaN."""
+    valid = np.isfinite(values)
+    sums = rolling_sum(np.where(valid, values, 0.0), window)
+    sums[rolling_sum(valid.astype(np.float64), window) < window] = np.nan
+    return sums
+
+
+def valid_mean(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    return np.where(valid, values, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+
+
+class WindowSums(NamedTuple):
+    """
+    Window sums of x, y and their products, taken after subtracting each
+    column's mean (`x_mean`, `y_mean`) so the cumulative sums stay small and
+    their differences accurate on long series.
+    """
+
+    x_mean: np.ndarray
+    y_mean: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    xx: np.ndarray
+    yy: np.ndarray
+    xy: np.ndarray
+
+
+def window_sums(y: np.ndarray, x: np.ndarray, window: int) -> WindowSums:
+    valid = np.isfinite(y) & np.isfinite(x)
+    x_mean = valid_mean(x, valid)
+    y_mean = valid_mean(y, valid)
+    x = np.where(valid, x - x_mean, 0.0)
+    y = np.where(valid, y - y_mean, 0.0)
+
+    full = rolling_sum(valid.astype(np.float64), window) == window
+    return WindowSums(
+        x_mean,
+        y_mean,
+        *(
+            np.where(full, rolling_sum(values, window), np.nan)
+            for values in (x, y, x * x, y * y, x * y)
+        ),
+    )
+
+
+def rolling_correlation(a, b, window: int) -> np.ndarray:
+    """Pearson correlation of `a` and `b` over each `window` rows."""
+    s = window_sums(
+        np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64), window
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (s.xy - s.x * s.y / window) / np.sqrt(
+            (s.xx - s.x * s.x / window) * (s.yy - s.y * s.y / window)
+        )
+
+
+class RollingRegression(NamedTuple):
+    """
+    OLS of y on x over each window ending at a row. `spread` is y less its
+    fitted value from that row's own window, and `r_squared` is computed the
+    way the pairs notebook's `test_cointegration` does: one less the sum of
+    the last `window` squared spreads over the sum of the last `window` squared
+    deviations of y from its rolling mean.
+    """
+
+    beta: np.ndarray
+    intercept: np.ndarray
+    spread: np.ndarray
+    r_squared: np.ndarray
+    correlation: np.ndarray
+
+
+def rolling_regression(y, x, window: int) -> RollingRegression:
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    s = window_sums(y, x, window)
+
+    sxx = s.xx - s.x * s.x / window
+    syy = s.yy - s.y * s.y / window
+    sxy = s.xy - s.x * s.y / window
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = sxy / sxx
+        correlation = sxy / np.sqrt(sxx * syy)
+    intercept = (s.y_mean + s.y / window) - beta * (s.x_mean + s.x / window)
+    spread = y - (beta * x + intercept)
+
+    centred = y - s.y_mean
+    deviation = centred - nan_rolling_sum(centred, window) / window
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_squared = 1 - nan_rolling_sum(spread**2, window) / nan_rolling_sum(
+            deviation**2, window
+        )
+
+    return RollingRegression(beta, intercept, spread, r_squared, correlation)
+
+
+def pair_regressions(
+    wide: pd.DataFrame,
+    pairs: list[tuple[str, str]],
+    window: int,
+    log: bool = True,
+    block: int = PAIR_BLOCK,
+) -> dict[str, pd.DataFrame]:
+    """
+    `rolling_regression` of the first column of each pair in `pairs` on the
+    second, for a wide frame of prices with one column per instrument (see
+    `pair_scan.wide_prices`), on log prices unless `log` is false.
+
+    Returns each `RollingRegression` field as a frame on `wide`'s index with a
+    `"pair1/pair2"` column per pair.
+    """
+    prices = wide.to_numpy(dtype=np.float64)
+    if log:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            prices = np.log(prices)
+    column = {name: i for i, name in enumerate(wide.columns)}
+    names = [f"{pair1}/{pair2}" for pair1, pair2 in pairs]
+
+    blocks = {field: [] for field in RollingRegression._fields}
+    for start in range(0, len(pairs), block):
+        chunk = pairs[start : start + block]
+        y = prices[:, [column[pair1] for pair1, _ in chunk]]
+        x = prices[:, [column[pair2] for _, pair2 in chunk]]
+        regression = rolling_regression(y, x, window)
+        for field, values in zip(RollingRegression._fields, regression):
+            blocks[field].append(values)
+
+    return {
+        field: pd.DataFrame(
+            np.concatenate(values, axis=1) if values else np.empty((len(wide), 0)),
+            index=wide.index,
+            columns=names,
+        )
+        for field, values in blocks.items()
+    }
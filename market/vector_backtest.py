@@ -0,0 +1,405 @@
+"""
+Vectorized backtests of the long-only BTC strategies in the backtrader scripts.
+
+Every script enters on an indicator condition (a MACD cross with a falling SMA,
+or RSI below 30, mostly with the close under the stock-to-flow line) and exits
+on a percent or ATR trailing stop. Here the indicators are computed as arrays
+the way backtrader computes them, the entry condition becomes one boolean mask,
+and a loop steps from trade to trade, finding each exit by computing the
+trailing stop a block of bars at a time. Fills follow backtrader's default
+broker: market orders fill at the next bar's open and are rejected when the
+cash does not cover them, and stops fill at the open if it gaps through the
+stop, otherwise at the stop.
+
+`STRATEGIES` maps each script to the function that backtests its `Strategy`,
+taking the same params, and a `start` bar before which the bars only warm the
+indicators up.
+"""
+
+import math
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+# the scripts' `icap` and `PercSize`
+CASH = 100000
+PERCENTS = 100
+
+# bars of trailing stop computed at a time while looking for an exit; doubled
+# for every block a trade outlasts
+EXIT_SEARCH = 64
+
+
+def first_valid(values: np.ndarray) -> int:
+    """Index of the first finite value, or the length if there is none."""
+    finite = np.isfinite(values)
+    return int(np.argmax(finite)) if finite.any() else len(values)
+
+
+def sma(values: np.ndarray, period: int) -> np.ndarray:
+    return pd.Series(values).rolling(period).mean().to_numpy()
+
+
+def exponential_smoothing(
+    values: np.ndarray, period: int, alpha: Optional[float] = None
+) -> np.ndarray:
+    """
+    backtrader's `ExponentialSmoothing`: seeded with the mean of the first
+    `period` values, then `previous * (1 - alpha) + value * alpha`, where
+    `alpha` is `2 / (1 + period)` (an EMA) unless given.
+    """
+    alpha = 2.0 / (1.0 + period) if alpha is None else alpha
+    result = np.full(len(values), np.nan)
+    first = first_valid(values)
+    seed = first + period - 1
+    if seed >= len(values):
+        return result
+
+    seeded = values[seed:].copy()
+    seeded[0] = math.fsum(values[first : seed + 1]) / period
+    result[seed:] = pd.Series(seeded).ewm(alpha=alpha, adjust=False).mean()
+    return result
+
+
+def macd(close: np.ndarray, fast: int, slow: int, signal: int):
+    """MACD line and signal line."""
+    line = exponential_smoothing(close, fast) - exponential_smoothing(close, slow)
+    return line, exponential_smoothing(line, signal)
+
+
+def crossover(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    backtrader's `CrossOver`: 1 where `a` crosses above `b`, -1 where it
+    crosses below, else 0, compared with the last bar where they differed;
+    NaN until both have a previous bar.
+    """
+    difference = a - b
+    first = first_valid(difference)
+    nonzero = (difference != 0) | (np.arange(len(difference)) == first)
+    last_difference = pd.Series(np.where(nonzero, difference, np.nan)).ffill()
+    previous = last_difference.shift(1).to_numpy()
+
+    up = (previous < 0) & (a > b)
+    down = (previous > 0) & (a < b)
+    return np.where(np.isfinite(previous), up.astype(float) - down, np.nan)
+
+
+def rsi_sma(close: np.ndarray, period: int) -> np.ndarray:
+    """backtrader's `RSI_SMA`: RSI with simple moving averages of the moves."""
+    change = np.concatenate([[np.nan], close[1:] - close[:-1]])
+    with np.errstate(invalid="ignore"):
+        up = np.where(np.isnan(change), np.nan, np.maximum(change, 0.0))
+        down = np.where(np.isnan(change), np.nan, np.maximum(-change, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100.0 - 100.0 / (1.0 + sma(up, period) / sma(down, period))
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int):
+    """backtrader's `ATR`: Wilder's smoothing of the true range."""
+    previous = np.concatenate([[np.nan], close[:-1]])
+    true_range = np.fmax(high, previous) - np.fmin(low, previous)
+    true_range[0] = np.nan
+    return exponential_smoothing(true_range, period, alpha=1.0 / period)
+
+
+def ready(*lines: np.ndarray) -> np.ndarray:
+    """
+    Bars where a strategy's `next` runs: from the bar every one of its
+    indicators has a value.
+    """
+    start = max(first_valid(line) for line in lines)
+    return np.arange(len(lines[0])) >= start
+
+
+def macd_sma_entries(
+    frame: pd.DataFrame,
+    macd1: int = 12,
+    macd2: int = 26,
+    macdsig: int = 9,
+    smaperiod: int = 30,
+    dirperiod: int = 10,
+    stf: bool = True,
+    *indicators: np.ndarray,
+) -> np.ndarray:
+    """
+    The MACD scripts' entry: MACD crossing above its signal while the SMA is
+    below its value `dirperiod` bars earlier, and, with `stf`, the close below
+    the stock-to-flow line. `indicators` are the strategy's other indicators,
+    which delay its first bar.
+    """
+    close = frame["close"].to_numpy(dtype=np.float64)
+    line, signal = macd(close, macd1, macd2, macdsig)
+    cross = crossover(line, signal)
+    average = sma(close, smaperiod)
+    direction = (
+        average - np.concatenate([np.full(dirperiod, np.nan), average])[: len(average)]
+    )
+
+    with np.errstate(invalid="ignore"):
+        entries = (cross > 0) & (direction < 0)
+        if stf:
+            entries &= close < frame["stf"].to_numpy(dtype=np.float64)
+    return entries & ready(line, signal, cross, average, direction, *indicators)
+
+
+def rsi_stf_entries(
+    frame: pd.DataFrame, period: int = 21, level: float = 30, *indicators
+) -> np.ndarray:
+    """The RSI scripts' entry: close below the stock-to-flow line, RSI below 30."""
+    close = frame["close"].to_numpy(dtype=np.float64)
+    rsi = rsi_sma(close, period)
+    with np.errstate(invalid="ignore"):
+        entries = (close < frame["stf"].to_numpy(dtype=np.float64)) & (rsi < level)
+    return entries & ready(rsi, *indicators)
+
+
+class Backtest(NamedTuple):
+    # executions, as backtrader's `Transactions` analyzer records them
+    transactions: pd.DataFrame
+    # one row per trade; the last may still be open, with no exit
+    trades: pd.DataFrame
+    # broker value at each bar's close
+    value: pd.Series
+
+
+def _blocks(start: int, bars: int):
+    size = EXIT_SEARCH
+    while start < bars:
+        yield start, min(start + size, bars)
+        start += size
+        size *= 2
+
+
+def _percent_exit(open_, low, trail, fill: int):
+    """
+    Bar and price at which a sell `StopTrail` placed at the close of `fill`
+    executes, or None; `trail` is each close less the trail percent of it.
+    """
+    level = trail[fill]
+    for begin, end in _blocks(fill + 1, len(trail)):
+        # the stop each bar is checked against: before that bar's close adjusts it
+        levels = np.maximum.accumulate(np.concatenate([[level], trail[begin:end]]))
+        stops = levels[:-1]
+        hit = np.flatnonzero((open_[begin:end] <= stops) | (low[begin:end] <= stops))
+        if len(hit):
+            k = hit[0]
+            price = open_[begin + k] if open_[begin + k] <= stops[k] else stops[k]
+            return begin + k, price
+        level = levels[-1]
+    return None
+
+
+def _atr_exit(open_, close, trail, stop: float, fill: int):
+    """
+    Bar and price at which the ATR scripts' `close()` executes: the open after
+    the first close below the stop, which starts at `stop` and is raised to
+    `trail` (the close less the ATR distance) at every close above it.
+    """
+    level = stop
+    for begin, end in _blocks(fill, len(trail)):
+        levels = np.maximum.accumulate(np.concatenate([[level], trail[begin:end]]))
+        hit = np.flatnonzero(close[begin:end] < levels[:-1])
+        if len(hit):
+            exit_bar = begin + hit[0] + 1
+            if exit_bar >= len(close):
+                return None
+            return exit_bar, open_[exit_bar]
+        level = levels[-1]
+    return None
+
+
+def simulate(
+    frame: pd.DataFrame,
+    entries: np.ndarray,
+    trailpercent: Optional[float] = None,
+    atr_stop: Optional[np.ndarray] = None,
+    cash: float = CASH,
+    percents: float = PERCENTS,
+    start: int = 0,
+) -> Backtest:
+    """
+    Buys with `percents` of the cash at the open after each entry bar from
+    `start` while flat, and sells on a `trailpercent` trailing stop order, or,
+    given `atr_stop` (the close less the ATR distance at each bar), on the ATR
+    scripts' trailing stop.
+    """
+    open_ = frame["open"].to_numpy(dtype=np.float64)
+    low = frame["low"].to_numpy(dtype=np.float64)
+    close = frame["close"].to_numpy(dtype=np.float64)
+    bars = len(close)
+    if atr_stop is None:
+        trail = close - close * trailpercent
+
+    candidates = np.flatnonzero(entries[start:]) + start
+    position = np.zeros(bars)
+    cash_after = np.empty(bars)
+    # bar, price and size of each entry, and bar and price of each exit
+    entry_bars, entry_prices, sizes = [], [], []
+    exit_bars, exit_prices = [], []
+    done = 0  # bars before this have their cash filled in
+
+    k = 0
+    while k < len(candidates):
+        signal = candidates[k]
+        fill = signal + 1
+        if fill >= bars:
+            break
+        # sized on the signal bar's close, checked at submission against that
+        # close and filled at the next open if the cash still covers it
+        size = cash / close[signal] * (percents / 100)
+        if cash - abs(size) * close[signal] < 0.0 or cash - size * open_[fill] < 0.0:
+            # rejected for margin; the strategy looks for an entry again
+            k = np.searchsorted(candidates, fill, "left")
+            continue
+
+        entry_price = open_[fill]
+        cash_after[done:fill] = cash
+        cash -= size * entry_price
+        entry_bars.append(fill)
+        entry_prices.append(entry_price)
+        sizes.append(size)
+
+        if atr_stop is None:
+            exit = _percent_exit(open_, low, trail, fill)
+        else:
+            exit = _atr_exit(open_, close, atr_stop, atr_stop[signal], fill)
+
+        if exit is None:
+            position[fill:] = size
+            cash_after[fill:] = cash
+            done = bars
+            break
+
+        exit_bar, exit_price = exit
+        position[fill:exit_bar] = size
+        cash_after[fill:exit_bar] = cash
+        cash += size * entry_price + size * (exit_price - entry_price)
+        done = exit_bar
+        exit_bars.append(exit_bar)
+        exit_prices.append(exit_price)
+        # the strategy is flat again from the bar the exit fills
+        k = np.searchsorted(candidates, exit_bar, "left")
+
+    cash_after[done:] = cash
+    return Backtest(
+        _transactions(
+            frame.index, entry_bars, entry_prices, sizes, exit_bars, exit_prices
+        ),
+        _trades(frame.index, entry_bars, entry_prices, sizes, exit_bars, exit_prices),
+        pd.Series(cash_after + position * close, index=frame.index),
+    )
+
+
+def _transactions(index, entry_bars, entry_prices, sizes, exit_bars, exit_prices):
+    sizes = np.asarray(sizes, dtype=np.float64)
+    bars = np.concatenate([entry_bars, exit_bars]).astype(np.int64)
+    amounts = np.concatenate([sizes, -sizes[: len(exit_bars)]])
+    prices = np.concatenate([entry_prices, exit_prices]).astype(np.float64)
+    order = np.argsort(bars, kind="stable")
+    return pd.DataFrame(
+        {
+            "amount": amounts[order],
+            "price": prices[order],
+            "value": -amounts[order] * prices[order],
+        },
+        index=index[bars[order]].rename("date"),
+    )
+
+
+def _trades(index, entry_bars, entry_prices, sizes, exit_bars, exit_prices):
+    # a trade still open at the end has no exit
+    missing = len(entry_bars) - len(exit_bars)
+    exit_bars = np.asarray(exit_bars + [-1] * missing, dtype=np.int64)
+    exit_prices = np.asarray(exit_prices + [np.nan] * missing, dtype=np.float64)
+    entry_prices = np.asarray(entry_prices, dtype=np.float64)
+    sizes = np.asarray(sizes, dtype=np.float64)
+    exit_dates = index[exit_bars] if len(exit_bars) else index[:0]
+    return pd.DataFrame(
+        {
+            "entry_date": index[np.asarray(entry_bars, dtype=np.int64)],
+            "entry_price": entry_prices,
+            "exit_date": exit_dates.where(exit_bars >= 0),
+            "exit_price": exit_prices,
+            "size": sizes,
+            "pnl": sizes * (exit_prices - entry_prices),
+        }
+    )
+
+
+def mcd_sma_stf_percent(
+    frame: pd.DataFrame,
+    macd1: int = 12,
+    macd2: int = 26,
+    macdsig: int = 9,
+    trailpercent: float = 0.40,
+    smaperiod: int = 30,
+    dirperiod: int = 10,
+    start: int = 0,
+) -> Backtest:
+    entries = macd_sma_entries(frame, macd1, macd2, macdsig, smaperiod, dirperiod)
+    return simulate(frame, entries, trailpercent, start=start)
+
+
+def mcd_sma_percent(
+    frame: pd.DataFrame,
+    macd1: int = 12,
+    macd2: int = 26,
+    macdsig: int = 9,
+    trailpercent: float = 0.20,
+    smaperiod: int = 30,
+    dirperiod: int = 10,
+    start: int = 0,
+) -> Backtest:
+    entries = macd_sma_entries(
+        frame, macd1, macd2, macdsig, smaperiod, dirperiod, False
+    )
+    return simulate(frame, entries, trailpercent, start=start)
+
+
+def _atr_stop(frame: pd.DataFrame, period: int, multiple: float) -> np.ndarray:
+    close = frame["close"].to_numpy(dtype=np.float64)
+    high = frame["high"].to_numpy(dtype=np.float64)
+    low = frame["low"].to_numpy(dtype=np.float64)
+    return close - atr(high, low, close, period) * multiple
+
+
+def mcd_sma_stf_atr(
+    frame: pd.DataFrame,
+    macd1: int = 12,
+    macd2: int = 26,
+    macdsig: int = 9,
+    atrperiod: int = 21,
+    atrdist: float = 3.0,
+    smaperiod: int = 30,
+    dirperiod: int = 10,
+    start: int = 0,
+) -> Backtest:
+    stop = _atr_stop(frame, atrperiod, atrdist)
+    entries = macd_sma_entries(
+        frame, macd1, macd2, macdsig, smaperiod, dirperiod, True, stop
+    )
+    return simulate(frame, entries, atr_stop=stop, start=start)
+
+
+def stf_rsi_atr(
+    frame: pd.DataFrame, atrperiod: int = 21, atrmultiple: float = 4.0, start: int = 0
+) -> Backtest:
+    stop = _atr_stop(frame, atrperiod, atrmultiple)
+    entries = rsi_stf_entries(frame, 21, 30, stop)
+    return simulate(frame, entries, atr_stop=stop, start=start)
+
+
+def stf_rsi_percent(
+    frame: pd.DataFrame, trailpercent: float = 0.40, start: int = 0
+) -> Backtest:
+    return simulate(frame, rsi_stf_entries(frame), trailpercent, start=start)
+
+
+STRATEGIES = {
+    "Backtest BTC_LO_MCD_SMA_STF_Perct_TS.py": mcd_sma_stf_percent,
+    "Backtest_BTC_LO_MCD_SMA_Perct_TS.py": mcd_sma_percent,
+    "Backtest_BTC_LO_MCD_SMA_STF_ATR_TS.py": mcd_sma_stf_atr,
+    "Backtest_BTC_LO_STF_RSI_4ATR_TS.py": stf_rsi_atr,
+    "Backtest_BTC_LO_STF_RSI_Perct_TS.py": stf_rsi_percent,
+}
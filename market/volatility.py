@@ -0,0 +1,147 @@
+"""
+Range-based and close-to-close volatility estimators for OHLC bars.
+
+The per-bar estimators are plain NumPy arithmetic, so they take Series,
+columns of a frame, or `(bars, instruments)` arrays alike and never loop in
+Python. Each returns a variance per bar; average it over a sample and take the
+square root for a volatility in the bar's units (hourly bars give an hourly
+volatility).
+
+`dispersion_tables` turns a long frame of bars for many instruments into
+hour-of-day and day-of-week volatility tables for every estimator, from a single
+groupby over (instrument, day of week, hour).
+"""
+
+import numpy as np
+import pandas as pd
+
+GARMAN_KLASS_CLOSE = 2 * np.log(2) - 1
+PARKINSON_SCALE = 1 / (4 * np.log(2))
+ESTIMATORS = (
+    "close_to_close",
+    "parkinson",
+    "garman_klass",
+    "rogers_satchell",
+    "yang_zhang",
+)
+
+
+def parkinson(high, low):
+    """Parkinson (1980) variance from the high-low range."""
+    return PARKINSON_SCALE * np.log(high / low) ** 2
+
+
+def garman_klass(open, high, low, close):
+    """Garman-Klass (1980) variance from the range and the open-close move."""
+    return (
+        0.5 * np.log(high / low) ** 2 - GARMAN_KLASS_CLOSE * np.log(close / open) ** 2
+    )
+
+
+def rogers_satchell(open, high, low, close):
+    """Rogers-Satchell (1991) variance, which is unbiased under drift."""
+    return np.log(high / close) * np.log(high / open) + np.log(low / close) * np.log(
+        low / open
+    )
+
+
+def yang_zhang_k(n):
+    """Yang-Zhang (2000) weight of the open-close variance for `n` bars."""
+    return 0.34 / (1.34 + (n + 1) / (n - 1))
+
+
+def bar_components(bars: pd.DataFrame, instrument: str = "instrument") -> pd.DataFrame:
+    """
+    The per-bar pieces every estimator is built from, for a frame of `open`,
+    `high`, `low` and `close` indexed by time. If the frame has an `instrument`
+    column, previous closes are taken within each instrument; rows must be in
+    time order within each.
+
+    The first bar of each instrument has no previous close, so its
+    `close_to_close` and `overnight` are NaN.
+    """
+    if instrument in bars.columns:
+        previous_close = bars.groupby(instrument, sort=False)["close"].shift(1)
+    else:
+        previous_close = bars["close"].shift(1)
+
+    open, high, low, close = (bars[c] for c in ("open", "high", "low", "close"))
+    return pd.DataFrame(
+        {
+            "close_to_close": np.log(close / previous_close),
+            "overnight": np.log(open / previous_close),
+            "open_to_close": np.log(close / open),
+            "parkinson": parkinson(high, low),
+            "garman_klass": garman_klass(open, high, low, close),
+            "rogers_satchell": rogers_satchell(open, high, low, close),
+        },
+        index=bars.index,
+    )
+
+
+# bar components whose variance is used, and those whose mean is
+VARIANCE_OF = ("close_to_close", "overnight", "open_to_close")
+MEAN_OF = ("parkinson", "garman_klass", "rogers_satchell")
+
+
+def moments(components: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """Count, sum and (for returns) sum of squares of each component per key."""
+    columns = components[list(VARIANCE_OF + MEAN_OF)].copy()
+    for name in VARIANCE_OF:
+        columns[f"{name}_sq"] = columns[name] ** 2
+
+    grouped = columns.groupby(keys).agg(["count", "sum"])
+    grouped.columns = [f"{name}_{stat}" for name, stat in grouped.columns]
+    return grouped.drop(columns=[f"{name}_sq_count" for name in VARIANCE_OF])
+
+
+def volatility_from_moments(totals: pd.DataFrame) -> pd.DataFrame:
+    """Every estimator's volatility from the output of `moments`, summed to any key."""
+
+    def variance(name):
+        n = totals[f"{name}_count"]
+        total = totals[f"{name}_sum"]
+        return (totals[f"{name}_sq_sum"] - total**2 / n) / (n - 1)
+
+    def mean(name):
+        return totals[f"{name}_sum"] / totals[f"{name}_count"]
+
+    k = yang_zhang_k(totals["open_to_close_count"])
+    variances = pd.DataFrame(
+        {
+            "close_to_close": variance("close_to_close"),
+            "parkinson": mean("parkinson"),
+            "garman_klass": mean("garman_klass"),
+            "rogers_satchell": mean("rogers_satchell"),
+            "yang_zhang": variance("overnight")
+            + k * variance("open_to_close")
+            + (1 - k) * mean("rogers_satchell"),
+        },
+        index=totals.index,
+    )
+    # rounding can leave a variance a hair below zero for flat groups
+    return np.sqrt(variances.clip(lower=0))
+
+
+def dispersion_tables(
+    bars: pd.DataFrame, instrument: str = "instrument"
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Volatility by hour of day and by day of week (0 is Monday) for each
+    estimator, from a frame of OHLC bars with a `DatetimeIndex` (and an
+    `instrument` column for several instruments).
+
+    Returns `(hourly, daily)`, each indexed by instrument (if any) and hour or
+    weekday, with one column per estimator in `ESTIMATORS`.
+    """
+    components = bar_components(bars, instrument)
+    keys = [bars.index.dayofweek.rename("weekday"), bars.index.hour.rename("hour")]
+    by = []
+    if instrument in bars.columns:
+        keys.insert(0, bars[instrument])
+        by = [instrument]
+
+    totals = moments(components, keys)
+    hourly = volatility_from_moments(totals.groupby(by + ["hour"]).sum())
+    daily = volatility_from_moments(totals.groupby(by + ["weekday"]).sum())
+    return hourly, daily
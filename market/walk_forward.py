@@ -0,0 +1,216 @@
+"""
+Walk-forward backtests of the backtrader scripts' strategies.
+
+Instead of one fixed `start_date`/`end_date` window, the bars are split into
+folds: each fold picks the best of a set of `Strategy` params on `train` bars
+in sample, then trades that winner on the `test` bars after them, out of
+sample. The next fold moves forward by `test` bars (or, `anchored`, keeps its
+first in-sample bar and grows), so the out-of-sample windows follow each other
+and their equity curves are chained into one.
+
+Folds are backtested with `vector_backtest`, which makes the same fills as the
+scripts' backtrader `Strategy`, and run across a process pool. The frame is
+handed to every worker once when it starts (see `worker_pool`), and each
+fold works on positional slices of it, which are views of the same columns
+rather than a new frame per fold. An out-of-sample run is fed its in-sample
+bars too, so its indicators start from the same history, and may only enter
+from its first out-of-sample bar. A position still open at the end of a fold
+is valued at the last close, and the next fold starts flat with that value.
+
+    python -m walk_forward "Backtest BTC_LO_MCD_SMA_STF_Perct_TS.py" \\
+        trailpercent=0.1,0.2,0.3,0.4 smaperiod=10,20,30,50 \\
+        --train 730 --test 180 --output walk_forward.csv
+"""
+
+import argparse
+import os
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest_sweep import grid, load_script, parse_space, random_search, script_frame
+from vector_backtest import CASH, STRATEGIES, Backtest
+from worker_pool import set_state, state, worker_pool
+
+METRIC = "sharpe"
+METRICS = ("return", "sharpe")
+# daily bars, traded every day of the year
+PERIODS = 365
+
+
+class Fold(NamedTuple):
+    number: int
+    # positions in the frame: in sample `train_start:test_start`, out of
+    # sample `test_start:test_end`
+    train_start: int
+    test_start: int
+    test_end: int
+
+
+def folds(bars: int, train: int, test: int, anchored: bool = False) -> list[Fold]:
+    """
+    Folds of `train` in-sample bars followed by `test` out-of-sample bars,
+    moving forward `test` bars at a time until `bars` runs out; the last fold
+    tests on whatever is left.
+    """
+    if train < 1 or test < 1:
+        raise ValueError(f"train and test need at least one bar: {train}, {test}")
+    result = []
+    for number, test_start in enumerate(range(train, bars, test)):
+        train_start = 0 if anchored else test_start - train
+        result.append(
+            Fold(number, train_start, test_start, min(test_start + test, bars))
+        )
+    return result
+
+
+def performance(value: pd.Series, periods: int = PERIODS) -> dict:
+    """Return, annualized Sharpe ratio and max drawdown of an equity curve."""
+    values = value.to_numpy()
+    returns = values[1:] / values[:-1] - 1
+    deviation = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    return {
+        "return": values[-1] / values[0] - 1,
+        "sharpe": (
+            returns.mean() / deviation * np.sqrt(periods) if deviation > 0 else np.nan
+        ),
+        "max_drawdown": 1 - (values / np.maximum.accumulate(values)).min(),
+    }
+
+
+def _score(backtest: Backtest, start: int, periods: int) -> dict:
+    trades = backtest.trades
+    return {
+        **performance(backtest.value.iloc[start:], periods),
+        "trades": int((trades["entry_date"] >= backtest.value.index[start]).sum()),
+    }
+
+
+class WalkForward(NamedTuple):
+    # one row per fold: its dates, the params it picked, the winner's
+    # in-sample `is_*` and out-of-sample `oos_*` performance
+    folds: pd.DataFrame
+    # the out-of-sample equity curves chained from `CASH`
+    equity: pd.Series
+
+
+def _run_fold(task: tuple[Fold, list[dict], str, int]) -> tuple[dict, pd.Series]:
+    fold, candidates, metric, periods = task
+    strategy, frame = state["strategy"], state["frame"]
+    train = frame.iloc[fold.train_start : fold.test_start]
+    rows = [
+        {**params, **_score(strategy(train, **params), 0, periods)}
+        for params in candidates
+    ]
+    # params that never trade have no Sharpe ratio
+    scores = pd.Series([row[metric] for row in rows], dtype=np.float64)
+    best = rows[scores.idxmax()] if scores.notna().any() else rows[0]
+    params = {name: best[name] for name in candidates[0]}
+
+    history = frame.iloc[fold.train_start : fold.test_end]
+    start = fold.test_start - fold.train_start
+    oos = strategy(history, start=start, **params)
+    result = {
+        "fold": fold.number,
+        "train_start": frame.index[fold.train_start],
+        "test_start": frame.index[fold.test_start],
+        "test_end": frame.index[fold.test_end - 1],
+        **params,
+        **{f"is_{name}": value for name, value in best.items() if name not in params},
+        **{f"oos_{name}": value for name, value in _score(oos, start, periods).items()},
+    }
+    return result, oos.value.iloc[start:]
+
+
+def walk_forward(
+    strategy: Callable[..., Backtest],
+    frame: pd.DataFrame,
+    candidates: list[dict],
+    train: int,
+    test: int,
+    anchored: bool = False,
+    metric: str = METRIC,
+    periods: int = PERIODS,
+    max_workers: Optional[int] = None,
+) -> WalkForward:
+    """
+    Walk-forward backtest of a `vector_backtest` strategy on `frame`, picking
+    the parameter set in `candidates` with the highest in-sample `metric` (one
+    of `METRICS`) in every fold. `max_workers=1` runs the folds in this
+    process.
+    """
+    if not candidates:
+        raise ValueError("no candidate params to pick from")
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}, not {metric!r}")
+    schedule = folds(len(frame), train, test, anchored)
+    if not schedule:
+        raise ValueError(f"{len(frame)} bars leave nothing after {train} in sample")
+    # one float64 copy up front; every fold slices views of it
+    frame = frame.astype(np.float64)
+    tasks = [(fold, candidates, metric, periods) for fold in schedule]
+
+    values = {"strategy": strategy, "frame": frame}
+    if max_workers == 1:
+        set_state(values)
+        results = [_run_fold(task) for task in tasks]
+    else:
+        with worker_pool(max_workers, values) as pool:
+            results = list(pool.map(_run_fold, tasks))
+
+    rows = [row for row, _ in results]
+    # each fold starts from `CASH`; chain them by their returns
+    returns = pd.concat(
+        [value / value.shift(1, fill_value=value.iloc[0]) for _, value in results]
+    )
+    return WalkForward(pd.DataFrame(rows), (returns.cumprod() * CASH).rename("equity"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("script", help="one of vector_backtest.STRATEGIES")
+    parser.add_argument("space", nargs="+", help="name=a,b,c or name=low:high")
+    parser.add_argument("--train", type=int, default=730, help="in-sample bars")
+    parser.add_argument("--test", type=int, default=180, help="out-of-sample bars")
+    parser.add_argument("--anchored", action="store_true")
+    parser.add_argument("--samples", type=int, help="random params; default grid")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--metric", default=METRIC, choices=METRICS)
+    parser.add_argument("--max-workers", type=int)
+    parser.add_argument("--output", help="write the stitched equity curve as CSV")
+    args = parser.parse_args()
+
+    name = os.path.basename(args.script)
+    if name not in STRATEGIES:
+        parser.error(f"no vectorized strategy for {name}")
+    frame = script_frame(load_script(args.script))
+    space = parse_space(args.space)
+    candidates = (
+        grid(space)
+        if args.samples is None
+        else random_search(space, args.samples, args.seed)
+    )
+
+    result = walk_forward(
+        STRATEGIES[name],
+        frame,
+        candidates,
+        args.train,
+        args.test,
+        args.anchored,
+        args.metric,
+        max_workers=args.max_workers,
+    )
+    print(result.folds.to_string(index=False))
+    overall = performance(result.equity)
+    print(
+        f"\nout of sample: {overall['return']:.2%} return, "
+        f"Sharpe {overall['sharpe']:.2f}, {overall['max_drawdown']:.2%} max drawdown"
+    )
+    if args.output:
+        result.equity.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
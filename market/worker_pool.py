@@ -0,0 +1,39 @@
+"""
+Process pools whose workers all start from the same read-only inputs.
+
+`pair_scan`, `backtest_sweep` and `walk_forward` each hand their price frame
+(and whatever evaluates it) to every worker once, through the pool
+initializer, and then only send small tasks naming what to compute. Workers
+read those inputs from `state`.
+
+The inputs are not put in `multiprocessing.shared_memory`: they are daily bars
+or one close matrix per exchange, a few MB at most. A forked worker inherits
+them copy-on-write without any pickling, and a spawned one unpickles them once
+when it starts, which costs less than a single backtest. Shared memory would
+also only hold the float columns, not the index, the instrument names or the
+functions that go with them.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+from typing import Any, Optional
+
+# the running job's inputs, set in each worker by `set_state`
+state: dict[str, Any] = {}
+
+
+def set_state(values: dict[str, Any]):
+    """Make `values` the inputs that tasks read from `state`."""
+    state.clear()
+    state.update(values)
+
+
+def worker_pool(
+    max_workers: Optional[int],
+    values: dict[str, Any],
+    mp_context: Optional[BaseContext] = None,
+) -> ProcessPoolExecutor:
+    """A process pool whose workers each start with `state` set to `values`."""
+    return ProcessPoolExecutor(
+        max_workers, mp_context=mp_context, initializer=set_state, initargs=(values,)
+    )